@@ -0,0 +1,99 @@
+"""
+Micro-benchmark: attribute access during a full Interrogation pass.
+
+Compares probes installed as descriptors by the metaclass against the
+original Interrogation.__getattribute__ override, which looked up every
+attribute (methods and internal fields included) in the probe collection
+first. Also counts how many attribute lookups the override intercepted.
+
+A pass creates a session, resets it, sets and validates every probe,
+reads every value back, and reads a few properties.
+
+    python benchmarks/interrogation_access.py [probes] [passes]
+
+Run it with crushinator.framework importable (e.g. with the buildout's
+bin/python, or PYTHONPATH=.).
+"""
+import sys, timeit
+
+from crushinator.framework.interrogation import Interrogation
+from crushinator.framework.probe import Probe
+
+# attribute lookups seen by the legacy override, see count_pass()
+_intercepted = [0]
+
+class LegacyAccess(object):
+    """
+    The original __getattribute__ override, for comparison.
+    """
+    __slots__ = ()
+
+    def __getattribute__(self, key):
+        definition = object.__getattribute__(self, '_definition')
+
+        if key in definition.probes:
+            return definition.bind(key, self)
+        else:
+            return object.__getattribute__(self, key)
+
+class CountingAccess(LegacyAccess):
+    """
+    LegacyAccess, counting every lookup.
+    """
+    __slots__ = ()
+
+    def __getattribute__(self, key):
+        _intercepted[0] += 1
+        return LegacyAccess.__getattribute__(self, key)
+
+def make_interrogation(nprobes, *mixins):
+    attrs = dict(('probe%s' % i, Probe(label='Probe %s' % i, default='value%s' % i))
+                 for i in range(nprobes))
+    attrs['__properties__'] = {'title': 'Benchmark'}
+
+    return type('Benchmark', mixins + (Interrogation,), attrs)
+
+def full_pass(cls, names):
+    session = cls('benchmark')
+    session.reset()
+
+    for name in names:
+        probe = getattr(session, name)
+        probe.value = ' answer '
+        probe.validate()
+
+    values = [getattr(session, name).value for name in names]
+
+    session.get('title')
+    session.get('name')
+    session.probes
+
+    return values
+
+def main(nprobes=20, passes=2000):
+    descriptors = make_interrogation(nprobes)
+    legacy = make_interrogation(nprobes, LegacyAccess)
+    counting = make_interrogation(nprobes, CountingAccess)
+    names = list(descriptors._definition.order)
+
+    assert full_pass(descriptors, names) == full_pass(legacy, names)
+
+    _intercepted[0] = 0
+    full_pass(counting, names)
+    intercepted = _intercepted[0]
+
+    def run(cls):
+        for i in xrange(passes):
+            full_pass(cls, names)
+
+    legacy_time = min(timeit.repeat(lambda: run(legacy), number=1, repeat=5))
+    descriptor_time = min(timeit.repeat(lambda: run(descriptors), number=1, repeat=5))
+
+    print "%s passes, %s probes" % (passes, nprobes)
+    print "  lookups through __getattribute__ per pass: %s" % intercepted
+    print "  __getattribute__ override: %.4fs" % legacy_time
+    print "  probe descriptors:         %.4fs" % descriptor_time
+    print "  speedup:                   %.1fx" % (legacy_time / descriptor_time)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark: Skeleton.render_path() with many params.
+
+Compares the compiled, single-pass PathPlan against the original approach of
+calling str.replace() once per param for every path.
+
+    python benchmarks/render_path.py [params] [paths]
+
+Run it with crushinator.framework importable (e.g. with the buildout's
+bin/python, or PYTHONPATH=.).
+"""
+import os, sys, timeit
+
+from crushinator.framework.skeleton import Skeleton
+
+def legacy_render_path(skeleton, path):
+    """
+    The original render_path() implementation, for comparison.
+    """
+    translated = path
+    for key, val in skeleton.params.iteritems():
+        translated = translated.replace(skeleton.pathmatch % (key), val)
+    
+    template_stripped = translated.rpartition(skeleton.templatematch)
+    if template_stripped[:2] == ('',''):
+        return translated
+    else:
+        return template_stripped[0]
+
+def make_paths(count, params):
+    """
+    Build count paths spread over a few levels of directories, some of them
+    using placeholders.
+    """
+    names = sorted(params)
+    paths = []
+    
+    for i in range(count):
+        paths.append(os.path.join(
+            '/dest', 
+            '+%s+' % names[0], 
+            'pkg%s' % (i % 10),
+            '+%s+' % names[i % len(names)],
+            'module_%s_+%s+.py_tmpl' % (i, names[(i * 7) % len(names)]),
+        ))
+    
+    return paths
+
+def main(nparams=50, npaths=5000):
+    params = dict(('param%s' % i, 'value%s' % i) for i in range(nparams))
+    paths = make_paths(npaths, params)
+    
+    skeleton = Skeleton(params=params)
+    
+    assert [skeleton.render_path(p) for p in paths] == \
+           [legacy_render_path(skeleton, p) for p in paths]
+    
+    def legacy():
+        for p in paths:
+            legacy_render_path(skeleton, p)
+    
+    def compiled():
+        for p in paths:
+            skeleton.render_path(p)
+    
+    legacy_time = min(timeit.repeat(legacy, number=1, repeat=5))
+    compiled_time = min(timeit.repeat(compiled, number=1, repeat=5))
+    
+    print "%s paths, %s params" % (npaths, nparams)
+    print "  str.replace per param: %.4fs" % legacy_time
+    print "  compiled PathPlan:     %.4fs" % compiled_time
+    print "  speedup:               %.1fx" % (legacy_time / compiled_time)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: Skeleton.render_template() on the test skeleton.
+
+Compares the default SegmentEngine, which splits each template into literal
+chunks and placeholder slots once, against string.Template, which scans the
+template text with its regex on every render. Both whole render_template()
+calls (including the template cache lookup) and the engine's part alone are
+timed.
+
+    python benchmarks/render_template.py [renders]
+
+Run it with crushinator.framework importable (e.g. with the buildout's
+bin/python, or PYTHONPATH=.).
+"""
+import os, sys, timeit
+
+from crushinator.framework.skeleton import Skeleton
+from crushinator.framework.engine import SegmentEngine, StringTemplateEngine
+from crushinator.framework.templatecache import TemplateCache
+
+import crushinator.framework.tests
+
+SOURCE = os.path.join(os.path.dirname(crushinator.framework.tests.__file__),
+                      'data', 'skeleton_templates')
+
+def main(renders=2000):
+    params = {'bar':'myname', 'foo':'dddd', 'baz':'1234'}
+
+    # separate caches, so each Skeleton keeps its own compiled templates
+    plain = Skeleton(source=SOURCE, params=params, engine=StringTemplateEngine(),
+                     template_cache=TemplateCache())
+    segments = Skeleton(source=SOURCE, params=params, engine=SegmentEngine(),
+                        template_cache=TemplateCache())
+
+    paths = [entry.path for entry in plain.get_index().templates]
+
+    assert [plain.render_template(p) for p in paths] == \
+           [segments.render_template(p) for p in paths]
+
+    def render_template(skeleton):
+        for i in xrange(renders):
+            for p in paths:
+                skeleton.render_template(p)
+
+    def render(skeleton):
+        templates = [skeleton.compile_template(p) for p in paths]
+        engine = skeleton.engine
+        for i in xrange(renders):
+            for t in templates:
+                engine.render(t, params)
+
+    print "%s templates, %s renders each" % (len(paths), renders)
+
+    for label, func in [('render_template()', render_template), ('engine.render()', render)]:
+        plain_time = min(timeit.repeat(lambda: func(plain), number=1, repeat=5))
+        segment_time = min(timeit.repeat(lambda: func(segments), number=1, repeat=5))
+
+        print label
+        print "  string.Template: %.4fs" % plain_time
+        print "  segment plan:    %.4fs" % segment_time
+        print "  speedup:         %.1fx" % (plain_time / segment_time)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
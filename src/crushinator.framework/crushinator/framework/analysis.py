@@ -0,0 +1,109 @@
+"""
+crushinator.framework.analysis - find out which params each path and template
+in a skeleton refers to, without rendering anything.
+"""
+import os, re, threading
+
+from collections import namedtuple
+
+from crushinator.framework.conditions import IDPATTERN
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+# the params referred to by a single source path, as frozensets of names:
+#   path: placeholders in the path (e.g. +name+), which must be set
+#   conditions: params in condition and fan-out markers (e.g. +?name+),
+#               which may be missing
+#   template: placeholders in the template text, including any partials it
+#             includes; None if the path isn't a template
+EntryAnalysis = namedtuple('EntryAnalysis', 'path conditions template')
+
+class SkeletonAnalysis(object):
+    """
+    Per-path analysis of a skeleton source directory, computed once per path
+    and kept for as long as the SkeletonIndex it was made for, or until the
+    path's entry is refreshed (see SkeletonIndex.refresh()).
+
+    Used to check that params are complete before a run starts (see
+    Skeleton.missing_params()), and to find the params a template's
+    fingerprint depends on (see Skeleton.fingerprint()).
+    """
+
+    def __init__(self, index, pathmatch, template_names):
+        """
+        @param index: the SkeletonIndex being analyzed
+        @param pathmatch: string format for placeholders, see Skeleton.pathmatch
+        @param template_names: callable returning the set of params a
+                               template file refers to, given its path
+        """
+        self.index = index
+        self.pathmatch = pathmatch
+        self.template_names = template_names
+
+        prefix, sep, suffix = pathmatch.partition('%s')
+        self._pattern = re.compile('%s([?!*]?)(%s)%s' % (re.escape(prefix), IDPATTERN,
+                                                         re.escape(suffix)))
+
+        # path: (IndexEntry, EntryAnalysis)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _analyze(self, path, entry):
+        relpath = entry is not None and entry.relpath or os.path.relpath(path, self.index.root)
+
+        names, conditions = set(), set()
+        for op, name in self._pattern.findall(relpath):
+            if op:
+                conditions.add(name)
+            else:
+                names.add(name)
+
+        template = None
+        if entry is not None and entry.template:
+            template = frozenset(self.template_names(path))
+
+        return EntryAnalysis(frozenset(names), frozenset(conditions), template)
+
+    def get(self, path):
+        """
+        Return the EntryAnalysis for a source path.
+        """
+        entry = self.index.get(path)
+        cached = self._entries.get(path)
+
+        if cached is not None and cached[0] is entry:
+            return cached[1]
+
+        analysis = self._analyze(path, entry)
+        with self._lock:
+            self._entries[path] = (entry, analysis)
+
+        return analysis
+
+    def analyze(self):
+        """
+        Analyze every path in the index that hasn't been yet, in one pass.
+        Returns self.
+        """
+        for entry in self.index:
+            self.get(entry.path)
+
+        return self
+
+    def names(self, path):
+        """
+        Return the set of every param the output of path depends on.
+        """
+        analysis = self.get(path)
+        return analysis.path | analysis.conditions | (analysis.template or frozenset())
+
+    def required(self, path):
+        """
+        Return the set of params that must be set to generate path.
+        """
+        analysis = self.get(path)
+        return analysis.path | (analysis.template or frozenset())
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,242 @@
+"""
+crushinator.framework.archive - write Skeleton output straight into a tar or 
+zip archive, without touching the local filesystem.
+"""
+import os, stat, time, threading, tarfile, zipfile
+
+from cStringIO import StringIO
+
+from crushinator.framework.filesystem import Filesystem, LocalFilesystem
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+DEFAULT_DIR_MODE = 0o755
+DEFAULT_FILE_MODE = 0o644
+
+class _ArchiveMember(object):
+    """
+    Writable file-like object that adds its contents to an archive when it is
+    closed. 
+    
+    Archive formats need to know a member's size before its data, so the
+    contents are buffered in memory.
+    """
+    def __init__(self, archive, name, perms):
+        self._archive = archive
+        self._name = name
+        self._perms = perms
+        self._buffer = StringIO()
+        self.closed = False
+    
+    def write(self, data):
+        self._buffer.write(data)
+    
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._archive._add_data(self._name, self._buffer.getvalue(), self._perms)
+            self._buffer.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class ArchiveFilesystem(Filesystem):
+    """
+    Base class for write-only archive destinations.
+    
+    Member names are the destination paths, relative to root (or with any
+    leading separator removed, if root isn't given). Parent directories get 
+    their own entries, so empty directories and directory modes survive.
+    
+    Safe to share between threads (e.g. with Skeleton.process()).
+    """
+    
+    def __init__(self, root=None):
+        """
+        @param root: string, destination path that corresponds to the top of
+                     the archive. Usually the Skeleton's dest.
+        """
+        self.root = root
+        self._sizes = {}
+        self._dirs = set()
+        self._lock = threading.Lock()
+        self._mtime = time.time()
+    
+    def _name(self, path):
+        if self.root:
+            path = os.path.relpath(path, self.root)
+        
+        name = os.path.normpath(path).replace(os.sep, '/').lstrip('/')
+        
+        return name != '.' and name or ''
+    
+    def exists(self, path):
+        name = self._name(path)
+        return name in self._sizes or name in self._dirs or name == ''
+    
+    def getsize(self, path):
+        name = self._name(path)
+        
+        if name not in self._sizes:
+            raise OSError(2, 'No such file in archive', path)
+        
+        return self._sizes[name]
+    
+    def makedirs(self, path, mode=None):
+        name = self._name(path)
+        
+        with self._lock:
+            self._add_parents(name)
+            self._add_dir(name, mode)
+    
+    def _add_parents(self, name):
+        """
+        Add entries for any parent directories of name that are missing.
+        Caller must hold the lock.
+        """
+        parts = name.split('/')[:-1]
+        
+        for i in range(1, len(parts) + 1):
+            self._add_dir('/'.join(parts[:i]), None)
+    
+    def _add_dir(self, name, mode):
+        """
+        Add a directory entry, if it doesn't already exist. Caller must hold 
+        the lock.
+        """
+        if not name or name in self._dirs:
+            return
+        
+        self._dirs.add(name)
+        self._write_dir(name, mode is None and DEFAULT_DIR_MODE or stat.S_IMODE(mode))
+    
+    def _add_data(self, name, data, perms):
+        """
+        Add a file entry from a string.
+        """
+        perms = perms is None and DEFAULT_FILE_MODE or stat.S_IMODE(perms)
+        
+        with self._lock:
+            self._add_parents(name)
+            self._write_file(name, data, perms)
+            self._sizes[name] = len(data)
+    
+    def open(self, path, mode='rb', perms=None):
+        if 'w' not in mode:
+            raise IOError("%s is write-only" % (self.__class__.__name__))
+        
+        return _ArchiveMember(self, self._name(path), perms)
+    
+    def copyfile(self, source, path, perms=None, strategies=('copy',), sourcefs=None):
+        if sourcefs is not None and not isinstance(sourcefs, LocalFilesystem):
+            # not on disk, so it has to be read into memory
+            return Filesystem.copyfile(self, source, path, perms, strategies, sourcefs)
+        
+        name = self._name(path)
+        
+        if perms is None:
+            perms = os.stat(source).st_mode
+        perms = stat.S_IMODE(perms)
+        
+        with self._lock:
+            self._add_parents(name)
+            self._write_path(name, source, perms)
+            self._sizes[name] = os.path.getsize(source)
+        
+        return 'copy'
+    
+    # implemented by subclasses
+    def _write_dir(self, name, perms):
+        raise NotImplementedError
+    
+    def _write_file(self, name, data, perms):
+        raise NotImplementedError
+    
+    def _write_path(self, name, source, perms):
+        raise NotImplementedError
+
+class TarFilesystem(ArchiveFilesystem):
+    """
+    Writes a tar archive, in streaming mode: fileobj only needs a write() 
+    method, so it can be a socket, a pipe, or sys.stdout.
+    """
+    def __init__(self, fileobj, compression='', root=None):
+        """
+        @param fileobj: file-like object to write the archive to
+        @param compression: string, '', 'gz', or 'bz2'
+        @param root: see ArchiveFilesystem
+        """
+        ArchiveFilesystem.__init__(self, root)
+        self._tar = tarfile.open(fileobj=fileobj, mode='w|%s' % (compression))
+    
+    def _info(self, name, perms):
+        info = tarfile.TarInfo(name)
+        info.mode = perms
+        info.mtime = self._mtime
+        return info
+    
+    def _write_dir(self, name, perms):
+        info = self._info(name, perms)
+        info.type = tarfile.DIRTYPE
+        self._tar.addfile(info)
+    
+    def _write_file(self, name, data, perms):
+        info = self._info(name, perms)
+        info.size = len(data)
+        self._tar.addfile(info, StringIO(data))
+    
+    def _write_path(self, name, source, perms):
+        info = self._info(name, perms)
+        
+        f = open(source, 'rb')
+        try:
+            info.size = os.fstat(f.fileno()).st_size
+            self._tar.addfile(info, f)
+        finally:
+            f.close()
+    
+    def close(self):
+        with self._lock:
+            self._tar.close()
+
+class ZipFilesystem(ArchiveFilesystem):
+    """
+    Writes a zip archive. The zip format needs fileobj to support tell(), so
+    use a real file or a StringIO rather than a pipe.
+    """
+    def __init__(self, fileobj, compression=zipfile.ZIP_DEFLATED, root=None):
+        """
+        @param fileobj: file-like object to write the archive to
+        @param compression: zipfile.ZIP_DEFLATED or zipfile.ZIP_STORED
+        @param root: see ArchiveFilesystem
+        """
+        ArchiveFilesystem.__init__(self, root)
+        self._zip = zipfile.ZipFile(fileobj, 'w', compression)
+    
+    def _info(self, name, perms, kind):
+        info = zipfile.ZipInfo(name, time.localtime(self._mtime)[:6])
+        info.compress_type = self._zip.compression
+        info.create_system = 3  # unix, so external_attr holds the mode
+        info.external_attr = (kind | perms) << 16
+        return info
+    
+    def _write_dir(self, name, perms):
+        info = self._info(name + '/', perms, stat.S_IFDIR)
+        # MS-DOS directory flag
+        info.external_attr |= 0x10
+        self._zip.writestr(info, '')
+    
+    def _write_file(self, name, data, perms):
+        self._zip.writestr(self._info(name, perms, stat.S_IFREG), data)
+    
+    def _write_path(self, name, source, perms):
+        # zipfile takes the mode from the source file itself
+        self._zip.write(source, name)
+    
+    def close(self):
+        with self._lock:
+            self._zip.close()
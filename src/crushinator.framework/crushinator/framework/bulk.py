@@ -0,0 +1,219 @@
+"""
+crushinator.framework.bulk - validate answer files against an Interrogation
+without a user interface.
+
+Answer files hold one record per line (JSON Lines), or per row (CSV with a
+header row), mapping probe names to answers:
+
+    {"author": "Me", "email": "me@example.com"}
+
+    author,email
+    Me,me@example.com
+
+Records are read, validated and reported one batch at a time, so answer
+files of any size can be checked:
+
+    for result in validate_records(PackageMeta, read_jsonl(open('answers.jsonl'))):
+        if result.errors:
+            print result.line, result.errors
+"""
+import csv, json, multiprocessing
+
+from collections import deque, namedtuple
+from itertools import islice
+
+from crushinator.framework.exceptions import ValidationError, ProbeNotFound, \
+                                             InterrogationCycleError
+from crushinator.framework.interrogation import Interrogation
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+# the outcome of validating one record with validate_records()
+#   line: line number of the record in its file (or its position, see
+#         validate_records())
+#   values: dictionary of probe name: coerced value for the probes that were
+#           asked, None if there were errors
+#   errors: dictionary of probe name: message. Errors that don't belong to
+#           a single probe (an unreadable record, an Interrogation-level
+#           validation error) are under None.
+BulkResult = namedtuple('BulkResult', 'line values errors')
+
+def read_jsonl(infile):
+    """
+    Generator; yield (line number, record) two-tuples for each line of a
+    JSON Lines file. Blank lines are skipped. A line that isn't valid JSON
+    yields its ValueError in place of the record, so it's reported along
+    with the other records instead of stopping the whole file.
+
+    @param infile: file-like object, opened for reading
+    """
+    for line, text in enumerate(infile, 1):
+        if not text.strip():
+            continue
+
+        try:
+            yield line, json.loads(text)
+        except ValueError, e:
+            yield line, e
+
+def read_csv(infile, **kwargs):
+    """
+    Generator; yield (line number, record) two-tuples for each row of a CSV
+    file whose first row holds the probe names. Empty cells are left out of
+    the record, so the probe keeps its default.
+
+    @param infile: file-like object, opened for reading
+    @param kwargs: passed to csv.DictReader (e.g. delimiter)
+    """
+    reader = csv.DictReader(infile, **kwargs)
+
+    for row in reader:
+        record = dict((k, v) for k, v in row.iteritems() if k is not None and v not in (None, ''))
+        yield reader.line_num, record
+
+def validate_record(interrogation, record, line=None, name=None):
+    """
+    Answer a new session of an Interrogation with a record, probe by probe
+    in the order the Interrogation asks them, and validate it.
+
+    Every probe is validated, so all of a record's errors are reported at
+    once. If they all pass and the Interrogation overrides validate(), that
+    is called too, for checks across probes.
+
+    Probes of nested Interrogations are answered from the same record. If
+    stepping from one probe to the next fails (a validation error from the
+    probe's next(), a jump to a missing probe, or a cycle), the error is
+    reported and the rest of the record isn't checked.
+
+    @param interrogation: Interrogation class
+    @param record: dictionary of probe name: answer. Answers that aren't
+                   strings are converted to unicode first, as if they had
+                   been typed in.
+    @param line: passed through to the BulkResult
+    @param name: name of the session, defaults to the class's name
+    @return: BulkResult
+    """
+    if not isinstance(record, dict):
+        return BulkResult(line, None, {None: 'Not a record: %s' % (record)})
+
+    session = interrogation(name or interrogation.__name__)
+    errors = {}
+    asked = []
+    walk = iter(session)
+
+    while True:
+        try:
+            probe = walk.next()
+        except StopIteration:
+            break
+        except ValidationError, e:
+            # from the last probe's next()
+            errors.setdefault(asked and asked[-1].name or None, str(e))
+            break
+        except (ProbeNotFound, InterrogationCycleError), e:
+            errors[None] = str(e)
+            break
+
+        asked.append(probe)
+
+        if probe.name in record:
+            answer = record[probe.name]
+            if not isinstance(answer, basestring):
+                answer = unicode(answer)
+            probe.value = answer
+
+        try:
+            probe.validate()
+        except ValidationError, e:
+            errors[probe.name] = str(e)
+
+    if not errors:
+        # probes of nested Interrogations are only known once they're asked
+        names = set(probe.name for probe in asked)
+        names.update(interrogation._definition.accessors)
+
+        for key in record:
+            if key not in names:
+                errors[key] = 'No such probe'
+
+    # the default validate() only validates each probe again
+    if not errors and type(session).validate.im_func is not Interrogation.validate.im_func:
+        try:
+            session.validate()
+        except ValidationError, e:
+            errors[None] = str(e)
+
+    if errors:
+        return BulkResult(line, None, errors)
+
+    try:
+        values = dict((probe.name, probe.value) for probe in asked)
+    except ValueError, e:
+        return BulkResult(line, None, {None: str(e)})
+
+    return BulkResult(line, values, {})
+
+def _validate_batch(args):
+    """
+    Validate a batch of (line, record) pairs, in a worker process.
+    """
+    interrogation, batch, name = args
+    return [validate_record(interrogation, record, line, name) for line, record in batch]
+
+def batches(records, size):
+    """
+    Generator; yield lists of up to size items from records, reading no
+    further ahead than the current batch.
+    """
+    records = iter(records)
+
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+def validate_records(interrogation, records, batch_size=100, processes=None, name=None):
+    """
+    Generator; validate a stream of records against an Interrogation (see
+    validate_record()), yielding a BulkResult for each one, in order.
+
+    Records are read batch_size at a time. With a process pool, each batch
+    is validated by a worker, and only a few batches per worker are read
+    ahead, so memory use doesn't depend on the size of the input.
+
+    @param interrogation: Interrogation class. With processes, it must be
+                          importable by the workers (i.e. defined at the top
+                          of a module).
+    @param records: iterable of (line number, record) two-tuples, e.g. from
+                    read_jsonl() or read_csv(). For plain records, use
+                    enumerate(records, 1).
+    @param batch_size: integer, records per batch
+    @param processes: integer, if more than 1, batches are validated in a
+                      pool of this many processes
+    @param name: name for the sessions, see validate_record()
+    """
+    if processes is None or processes <= 1:
+        for batch in batches(records, batch_size):
+            for result in _validate_batch((interrogation, batch, name)):
+                yield result
+        return
+
+    pool = multiprocessing.Pool(processes)
+    pending = deque()
+
+    try:
+        for batch in batches(records, batch_size):
+            pending.append(pool.apply_async(_validate_batch, ((interrogation, batch, name),)))
+
+            # keep a couple of batches per worker in flight
+            if len(pending) >= processes * 2:
+                for result in pending.popleft().get():
+                    yield result
+
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+    finally:
+        pool.terminate()
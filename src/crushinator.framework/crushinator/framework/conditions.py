@@ -0,0 +1,102 @@
+"""
+crushinator.framework.conditions - include files and directories in a
+skeleton's output only when a param is set.
+
+A condition is a marker in a file or directory name, next to the usual
+placeholders:
+
+    docs+?with_docs+/          only when params['with_docs'] is true
+    buildout.cfg+!no_buildout+ only when params['no_buildout'] is false
+
+Missing params count as false. A name can carry several markers; all of them
+have to hold. The markers are removed from the destination path (see
+crushinator.framework.pathplan), so a name that is nothing but a marker
+puts its contents straight into the parent directory.
+
+A file or directory can also fan out over a list-valued param:
+
+    +*resources+/              once per item in params['resources']
+    +*resources+.py_tmpl
+
+The file, or the directory and everything in it, is generated once for each
+item, with the item bound to the same param name (so +*resources+ and 
++resources+ render as the item). See Skeleton.fanout_workers.
+"""
+import re
+
+# what a param name in a marker looks like
+IDPATTERN = r'[_a-zA-Z][_a-zA-Z0-9]*'
+
+def marker_pattern(pathmatch='+%s+', operators='?!*'):
+    """
+    Return the regular expression source for a marker, given the placeholder
+    format (see Skeleton.pathmatch). Group 1 is the operator, group 2 is the
+    param name.
+
+    @param operators: string, the operators to match: ? and ! for conditions,
+                      * for fan-out
+    """
+    prefix, sep, suffix = pathmatch.partition('%s')
+
+    return '%s([%s])(%s)%s' % (re.escape(prefix), re.escape(operators), IDPATTERN, 
+                               re.escape(suffix))
+
+class PathConditions(object):
+    """
+    Finds and evaluates the markers in names. Parsed names are remembered, 
+    so each name is only scanned once.
+
+    Calling a PathConditions with a name returns True if the name has any 
+    markers, i.e. whether a directory by that name should be walked only once
+    it's needed (see SkeletonIndex.expand()).
+    """
+
+    def __init__(self, pathmatch='+%s+'):
+        """
+        @param pathmatch: string format for placeholders, see Skeleton.pathmatch
+        """
+        self.pathmatch = pathmatch
+        self._pattern = re.compile(marker_pattern(pathmatch))
+        self._parsed = {}
+
+    def _markers(self, name):
+        """
+        Return a tuple of (operator, param) two-tuples for the markers in name.
+        """
+        markers = self._parsed.get(name)
+
+        if markers is None:
+            markers = self._parsed[name] = tuple(self._pattern.findall(name))
+
+        return markers
+
+    def parse(self, name):
+        """
+        Return a tuple of (param, negate) two-tuples for the conditions in name.
+        Empty if name is unconditional.
+        """
+        return tuple((param, op == '!') for op, param in self._markers(name) if op != '*')
+
+    def fanout(self, name):
+        """
+        Return the name of the list param a file or directory fans out over, or
+        None.
+        """
+        for op, param in self._markers(name):
+            if op == '*':
+                return param
+
+        return None
+
+    def __call__(self, name):
+        return bool(self._markers(name))
+
+    def included(self, name, params):
+        """
+        Return True if all of the conditions in name hold for params.
+        """
+        for param, negate in self.parse(name):
+            if bool(params.get(param)) == negate:
+                return False
+
+        return True
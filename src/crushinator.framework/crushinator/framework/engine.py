@@ -0,0 +1,373 @@
+"""
+crushinator.framework.engine - template engines.
+
+A Skeleton renders its templates with a TemplateEngine (see Skeleton.engine).
+The framework includes three, all implementing PEP 292 (string.Template)
+syntax:
+
+    StringTemplateEngine - string.Template itself
+    SegmentEngine - splits each template once into literal text and
+                    placeholders, so rendering is a join; the default
+    CompiledEngine - turns each template into a python function, and keeps
+                     the compiled functions in an on-disk cache, so separate
+                     runs don't parse the same templates again
+
+Engines for other template languages belong in crushinator.toolkit.
+"""
+import os, sys, errno, hashlib, marshal, tempfile, threading
+
+from string import Template
+
+from crushinator.framework.streaming import stream_substitute
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+class TemplateEngine(object):
+    """
+    Base class for template engines.
+
+    Compiled templates must have a template attribute holding the template
+    text, and a substitute(params) method that renders them, like
+    string.Template.
+    """
+
+    def compile(self, text):
+        """
+        Compile template text.
+
+        @param text: string, the contents of a template file
+        @return: compiled template
+        """
+        raise NotImplementedError
+
+    def render(self, compiled, params):
+        """
+        Render a compiled template.
+
+        @param compiled: the result of compile()
+        @param params: dictionary of template variables
+        @return: string
+        """
+        return compiled.substitute(params)
+
+    def stream(self, infile, outfile, params):
+        """
+        Render the template text in infile into outfile. The default
+        implementation reads the whole template into memory; engines that
+        can render a piece at a time should override it.
+
+        @param infile: file-like object, opened for reading
+        @param outfile: file-like object, opened for writing
+        @param params: dictionary of template variables
+        """
+        outfile.write(self.render(self.compile(infile.read()), params))
+
+class StringTemplateEngine(TemplateEngine):
+    """
+    PEP 292 templates, with string.Template.
+
+    @see: PEP 292 http://www.python.org/dev/peps/pep-0292/ for template syntax.
+    """
+
+    # string.Template or a subclass with a different delimiter or idpattern
+    template_class = Template
+
+    def __init__(self, template_class=None):
+        if template_class is not None:
+            self.template_class = template_class
+
+    def compile(self, text):
+        return self.template_class(text)
+
+    def stream(self, infile, outfile, params):
+        stream_substitute(infile, outfile, params, self.template_class)
+
+def _mapping(args, kws):
+    """
+    The mapping string.Template.substitute() would use for its arguments.
+    """
+    if len(args) > 1:
+        raise TypeError('Too many positional arguments')
+
+    if not args:
+        return kws
+    elif kws:
+        mapping = dict(args[0])
+        mapping.update(kws)
+        return mapping
+    else:
+        return args[0]
+
+class SegmentTemplate(object):
+    """
+    A template split into a segment plan by SegmentEngine: a list of chunks
+    of literal text, with slots for the placeholders in between. Quacks like
+    a string.Template.
+    """
+
+    def __init__(self, template, template_class=Template):
+        self.template = template
+        self.delimiter = template_class.delimiter
+        self.idpattern = template_class.idpattern
+        self.pattern = template_class.pattern
+        self._template_class = template_class
+
+        # literal text, with a None at each slot
+        self._chunks = []
+        # (index in _chunks, placeholder name or None if invalid)
+        self._slots = []
+        # index in _chunks: ValueError message, for invalid placeholders
+        self._invalid = {}
+
+        literal = []
+        pos = 0
+
+        for match in self.pattern.finditer(template):
+            literal.append(template[pos:match.start()])
+            pos = match.end()
+
+            if match.group('escaped') is not None:
+                literal.append(self.delimiter)
+                continue
+
+            if ''.join(literal):
+                self._chunks.append(''.join(literal))
+            literal = []
+
+            name = match.group('named') or match.group('braced')
+
+            if name is None:
+                self._invalid[len(self._chunks)] = _invalid_message(template, match.start('invalid'))
+
+            self._slots.append((len(self._chunks), name))
+            self._chunks.append(None)
+
+        literal.append(template[pos:])
+        if ''.join(literal):
+            self._chunks.append(''.join(literal))
+
+    def substitute(self, *args, **kws):
+        mapping = _mapping(args, kws)
+
+        chunks = self._chunks[:]
+        for i, name in self._slots:
+            if name is None:
+                raise ValueError(self._invalid[i])
+            chunks[i] = '%s' % (mapping[name],)
+
+        return self.template[:0].join(chunks)
+
+    def safe_substitute(self, *args, **kws):
+        return self._template_class(self.template).safe_substitute(*args, **kws)
+
+class SegmentEngine(StringTemplateEngine):
+    """
+    PEP 292 templates, split into segment plans (see SegmentTemplate) when
+    they're compiled. Rendering doesn't scan the template text again, so
+    it's faster than string.Template for templates rendered more than once.
+    """
+
+    def compile(self, text):
+        return SegmentTemplate(text, self.template_class)
+
+class CompiledTemplate(object):
+    """
+    A template compiled to a python function by CompiledEngine. Quacks like
+    a string.Template.
+    """
+    # so the template can be analyzed like a string.Template
+    delimiter = Template.delimiter
+    idpattern = Template.idpattern
+    pattern = Template.pattern
+
+    def __init__(self, template, function):
+        self.template = template
+        self._function = function
+
+    def substitute(self, *args, **kws):
+        return self._function(_mapping(args, kws))
+
+    def safe_substitute(self, *args, **kws):
+        return Template(self.template).safe_substitute(*args, **kws)
+
+def _invalid(message):
+    """
+    Called by generated code in place of an invalid placeholder.
+    """
+    raise ValueError(message)
+
+def _invalid_message(text, i):
+    """
+    The error string.Template raises for an invalid placeholder at i.
+    """
+    lines = text[:i].splitlines(True)
+
+    if not lines:
+        colno, lineno = 1, 1
+    else:
+        colno = i - len(''.join(lines[:-1]))
+        lineno = len(lines)
+
+    return 'Invalid placeholder in string: line %d, col %d' % (lineno, colno)
+
+def generate_source(text):
+    """
+    Return the python source for a function, render(mapping), that renders
+    the PEP 292 template text exactly like string.Template.substitute():
+    values are converted with '%s', missing keys raise KeyError, and invalid
+    placeholders raise ValueError, in the order they appear in the text.
+    """
+    parts = []
+    literal = []
+    pos = 0
+
+    for match in Template.pattern.finditer(text):
+        literal.append(text[pos:match.start()])
+        pos = match.end()
+
+        if match.group('escaped') is not None:
+            literal.append(Template.delimiter)
+            continue
+
+        if literal and ''.join(literal):
+            parts.append(repr(''.join(literal)))
+        literal = []
+
+        name = match.group('named') or match.group('braced')
+
+        if name is not None:
+            parts.append("'%%s' %% (mapping[%r],)" % (name))
+        else:
+            parts.append('_invalid(%r)' % (_invalid_message(text, match.start('invalid'))))
+
+    literal.append(text[pos:])
+    if ''.join(literal):
+        parts.append(repr(''.join(literal)))
+
+    return 'def render(mapping):\n    return %r.join((%s))\n' % (text[:0], ''.join(p + ', ' for p in parts))
+
+class CompiledEngine(StringTemplateEngine):
+    """
+    PEP 292 templates, compiled to python functions. Rendering doesn't scan
+    the template text at all.
+
+    Compiled code is cached in memory, and on disk (as marshal'ed code
+    objects, keyed by a hash of the template text), so later runs of the
+    same templates skip parsing and code generation.
+
+    @ivar cache_dir: string, directory for the on-disk cache, or None to only
+                     cache in memory. Defaults to $CRUSHINATOR_CACHE, or
+                     ~/.cache/crushinator/templates.
+    @ivar hits: integer, templates loaded from the on-disk cache
+    @ivar misses: integer, templates that had to be compiled
+    """
+
+    # bumped whenever the generated code changes
+    VERSION = 1
+
+    def __init__(self, cache_dir=False):
+        if cache_dir is False:
+            cache_dir = os.environ.get('CRUSHINATOR_CACHE') or \
+                        os.path.join(os.path.expanduser('~'), '.cache', 'crushinator', 'templates')
+
+        self.cache_dir = cache_dir
+
+        # digest: function
+        self._functions = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, text):
+        digest = hashlib.sha1()
+        # marshal's format depends on the python version
+        digest.update('%s\0%s\0' % (self.VERSION, sys.version))
+        digest.update(text.encode('utf-8') if isinstance(text, unicode) else text)
+        return digest.hexdigest()
+
+    def _function(self, code):
+        namespace = {'_invalid': _invalid}
+        exec code in namespace
+        return namespace['render']
+
+    def _load(self, path):
+        """
+        Return the code object cached at path, or None.
+        """
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+
+        try:
+            try:
+                return marshal.loads(f.read())
+            except (EOFError, ValueError, TypeError), e:
+                logger.debug('Ignoring corrupt cache file %s: %s' % (path, e))
+                return None
+        finally:
+            f.close()
+
+    def _save(self, path, code):
+        """
+        Write a code object to the cache. Failures are logged, not raised;
+        the cache is only an optimization. The temporary file is removed if
+        it can't be put into place.
+        """
+        try:
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            fd, partial = tempfile.mkstemp(dir=self.cache_dir)
+            try:
+                try:
+                    os.write(fd, marshal.dumps(code))
+                finally:
+                    os.close(fd)
+                os.rename(partial, path)
+            except:
+                exc_type, exc_value, exc_tb = sys.exc_info()
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+                raise exc_type, exc_value, exc_tb
+        except (IOError, OSError), e:
+            logger.debug('Unable to cache compiled template in %s: %s' % (self.cache_dir, e))
+
+    def compile(self, text):
+        digest = self._digest(text)
+
+        function = self._functions.get(digest)
+        if function is not None:
+            return CompiledTemplate(text, function)
+
+        path = self.cache_dir and os.path.join(self.cache_dir, digest)
+        code = path and self._load(path)
+
+        if code is not None:
+            with self._lock:
+                self.hits += 1
+        else:
+            code = compile(generate_source(text), '<template %s>' % (digest[:8]), 'exec')
+            with self._lock:
+                self.misses += 1
+            if path:
+                self._save(path, code)
+
+        function = self._functions[digest] = self._function(code)
+        return CompiledTemplate(text, function)
+
+    def clear(self):
+        """
+        Forget the in-memory cache (the on-disk cache is left alone).
+        """
+        self._functions.clear()
+
+# used by Skeletons unless they specify another engine
+default_engine = SegmentEngine()
@@ -30,8 +30,49 @@ class ProbeNotFound(Exception):
     """
     Raised when a probe is being located, and it does not exist.
     """
+
+class InterrogationCycleError(Exception):
+    """
+    Raised when an Interrogation's probes lead back to themselves, see
+    crushinator.framework.flow.
+    
+    @ivar cycle: list of the probe names in the cycle, starting and ending 
+                 with the same one
+    """
+    def __init__(self, cycle):
+        self.cycle = cycle
+        Exception.__init__(self, "Probes form a cycle: %s" % (' -> '.join(cycle)))
     
 class SkeletonFileExists(Exception):
     """
     Raised when a file already exists.
     """
+
+class SkeletonJournalError(Exception):
+    """
+    Raised when a Skeleton run can't be resumed from its journal.
+    """
+
+class SkeletonPackError(Exception):
+    """
+    Raised when a packed skeleton can't be read.
+    """
+
+class SkeletonIncludeError(Exception):
+    """
+    Raised when a template includes a partial that doesn't exist, or partials
+    include each other in a loop.
+    """
+
+class SkeletonMissingParams(KeyError):
+    """
+    Raised before a Skeleton is processed, when templates or paths refer to
+    params that aren't set.
+    
+    @ivar missing: dictionary of param name: list of the source paths that 
+                   use it
+    """
+    def __init__(self, missing):
+        self.missing = missing
+        KeyError.__init__(self, "Missing params: %s" % (', '.join(
+            "%s (used by %s)" % (name, ', '.join(paths)) for name, paths in sorted(missing.items()))))
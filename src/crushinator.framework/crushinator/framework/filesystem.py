@@ -0,0 +1,410 @@
+"""
+crushinator.framework.filesystem - where a Skeleton reads its templates from,
+and writes its output to.
+"""
+import os, errno, stat, shutil, time, threading
+
+from collections import OrderedDict
+from StringIO import StringIO
+
+from crushinator.framework.materialize import materialize
+from crushinator.framework.util import fileobj_digest, iterdir
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+class Filesystem(object):
+    """
+    Base class defining the operations a Skeleton performs on its source
+    (Skeleton.sourcefs) and destination (Skeleton.destfs).
+    
+    Paths are the source paths, and the destination paths the Skeleton 
+    computes (see Skeleton.destpath() and Skeleton.render_path()).
+    
+    Modes are permission bits (e.g. 0o644), taken from the source file or 
+    directory. Implementations may ignore them.
+    """
+    
+    # True if paths are paths on the local disk (or a mounted network 
+    # filesystem), so a Skeleton can keep plain files next to its output 
+    # (the journal, the incremental manifest).
+    is_local = False
+    
+    def exists(self, path):
+        """
+        Return True if something exists at path.
+        """
+        raise NotImplementedError
+    
+    def isdir(self, path):
+        """
+        Return True if path is a directory.
+        """
+        raise NotImplementedError
+    
+    def isfile(self, path):
+        """
+        Return True if path is a regular file.
+        """
+        raise NotImplementedError
+    
+    def stat(self, path):
+        """
+        Return an object with st_mode, st_size, and st_mtime attributes for 
+        path. Raises OSError if it doesn't exist.
+        """
+        raise NotImplementedError
+    
+    def getsize(self, path):
+        """
+        Return the size of the file at path. Raises OSError if it doesn't exist.
+        """
+        return self.stat(path).st_size
+    
+    def scandir(self, path):
+        """
+        Return an iterator of os.DirEntry-like objects (name, path, is_dir(),
+        is_symlink(), stat()) for the contents of the directory at path.
+        """
+        raise NotImplementedError
+    
+    def makedirs(self, path, mode=None):
+        """
+        Create the directory at path, and any missing parent directories.
+        """
+        raise NotImplementedError
+    
+    def open(self, path, mode='rb', perms=None):
+        """
+        Open a file, returning a file-like object. 
+        
+        @param mode: 'rb' or 'wb'
+        @param perms: permission bits for a file created by opening it for writing
+        """
+        raise NotImplementedError
+    
+    def copyfile(self, source, path, perms=None, strategies=('copy',), sourcefs=None):
+        """
+        Put a copy of the file source at path. 
+        
+        The default implementation reads source and writes it with open().
+        
+        @param strategies: preferred copy strategies, see 
+                           crushinator.framework.materialize
+        @param sourcefs: the Filesystem source is on, defaults to the local 
+                         disk.
+        @return: string, the name of the strategy used
+        """
+        sourcefs = sourcefs or local_filesystem
+        
+        src = sourcefs.open(source, 'rb')
+        try:
+            dst = self.open(path, 'wb', perms)
+            try:
+                shutil.copyfileobj(src, dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        
+        return 'copy'
+    
+    def digest(self, path):
+        """
+        Return the SHA-1 hex digest of the file at path.
+        """
+        f = self.open(path, 'rb')
+        try:
+            return fileobj_digest(f)
+        finally:
+            f.close()
+    
+    def close(self):
+        """
+        Finish writing, if the implementation needs to (e.g. archives).
+        """
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class LocalFilesystem(Filesystem):
+    """
+    The local disk.
+    
+    @ivar preserve_modes: boolean, if True, permission bits are applied to the 
+                          files and directories that are created. Off by 
+                          default, since skeletons installed as eggs are often
+                          read-only.
+    """
+    is_local = True
+    
+    def __init__(self, preserve_modes=False):
+        self.preserve_modes = preserve_modes
+    
+    def exists(self, path):
+        return os.path.exists(path)
+    
+    def isdir(self, path):
+        return os.path.isdir(path)
+    
+    def isfile(self, path):
+        return os.path.isfile(path)
+    
+    def stat(self, path):
+        return os.stat(path)
+    
+    def getsize(self, path):
+        return os.path.getsize(path)
+    
+    def scandir(self, path):
+        return iterdir(path)
+    
+    def makedirs(self, path, mode=None):
+        os.makedirs(path)
+        
+        if self.preserve_modes and mode is not None:
+            os.chmod(path, mode)
+    
+    def open(self, path, mode='rb', perms=None):
+        f = open(path, mode)
+        
+        if self.preserve_modes and perms is not None and 'w' in mode:
+            os.chmod(path, perms)
+        
+        return f
+    
+    def copyfile(self, source, path, perms=None, strategies=('copy',), sourcefs=None):
+        if sourcefs is not None and not isinstance(sourcefs, LocalFilesystem):
+            return Filesystem.copyfile(self, source, path, perms, strategies, sourcefs)
+        
+        used = materialize(source, path, strategies)
+        
+        # links share the source's permissions
+        if self.preserve_modes and perms is not None and used not in ('symlink', 'hardlink'):
+            os.chmod(path, perms)
+        
+        return used
+
+class _MemoryStat(object):
+    """
+    stat() result for a MemoryFilesystem path.
+    """
+    def __init__(self, mode, size, mtime):
+        self.st_mode = mode
+        self.st_size = size
+        self.st_mtime = mtime
+
+class _MemoryEntry(object):
+    """
+    os.DirEntry-like object for MemoryFilesystem.scandir().
+    """
+    def __init__(self, fs, dirpath, name):
+        self._fs = fs
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+    
+    def is_dir(self, follow_symlinks=True):
+        return self._fs.isdir(self.path)
+    
+    def is_file(self, follow_symlinks=True):
+        return self._fs.isfile(self.path)
+    
+    def is_symlink(self):
+        return False
+    
+    def stat(self, follow_symlinks=True):
+        return self._fs.stat(self.path)
+
+class _MemoryFile(StringIO):
+    """
+    Writable file for MemoryFilesystem. The contents are stored when the file
+    is closed.
+    """
+    def __init__(self, fs, path, perms):
+        StringIO.__init__(self)
+        self._fs = fs
+        self._path = path
+        self._perms = perms
+    
+    def close(self):
+        if not self.closed:
+            self._fs._store(self._path, self.getvalue(), self._perms)
+        StringIO.close(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class MemoryFilesystem(Filesystem):
+    """
+    A filesystem that lives entirely in memory. 
+    
+    Can be used as a Skeleton's destination, to render a preview (or to check
+    that a Skeleton renders at all) without touching the disk, and commit() 
+    the result later. It can also be used as a source, by filling it with 
+    add_file().
+    
+    Directories list their contents in the order they were created.
+    """
+    def __init__(self):
+        # path: [data, mode, mtime]
+        self._files = {}
+        # path: [OrderedDict of child names, mode, mtime]
+        self._dirs = {}
+        self._lock = threading.RLock()
+    
+    def _norm(self, path):
+        return os.path.normpath(path)
+    
+    def _parent(self, path):
+        parent = os.path.dirname(path)
+        
+        if parent == path:
+            return None
+        
+        return parent or os.curdir
+    
+    def _is_root(self, path):
+        return self._parent(path) is None or path == os.curdir
+    
+    def _missing(self, path):
+        return OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    
+    def exists(self, path):
+        path = self._norm(path)
+        return path in self._files or path in self._dirs or self._is_root(path)
+    
+    def isdir(self, path):
+        path = self._norm(path)
+        return path in self._dirs or self._is_root(path)
+    
+    def isfile(self, path):
+        return self._norm(path) in self._files
+    
+    def stat(self, path):
+        path = self._norm(path)
+        
+        if path in self._files:
+            data, mode, mtime = self._files[path]
+            return _MemoryStat(stat.S_IFREG | mode, len(data), mtime)
+        elif path in self._dirs:
+            children, mode, mtime = self._dirs[path]
+            return _MemoryStat(stat.S_IFDIR | mode, 0, mtime)
+        elif self._is_root(path):
+            return _MemoryStat(stat.S_IFDIR | 0o755, 0, 0)
+        
+        raise self._missing(path)
+    
+    def scandir(self, path):
+        path = self._norm(path)
+        
+        if path in self._dirs:
+            names = list(self._dirs[path][0])
+        elif self._is_root(path):
+            names = [os.path.basename(p) for p in self._dirs.keys() + self._files.keys()
+                     if self._parent(p) == path]
+        else:
+            raise self._missing(path)
+        
+        return iter([_MemoryEntry(self, path, name) for name in names])
+    
+    def _link(self, path):
+        """
+        Add path to its parent's list of children. Caller must hold the lock.
+        """
+        parent = self._parent(path)
+        if parent in self._dirs:
+            self._dirs[parent][0][os.path.basename(path)] = True
+    
+    def makedirs(self, path, mode=None):
+        path = self._norm(path)
+        
+        with self._lock:
+            if self.exists(path):
+                raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+            
+            missing = []
+            current = path
+            while not self.exists(current):
+                missing.append(current)
+                current = self._parent(current)
+            
+            for directory in reversed(missing):
+                perms = (directory == path and mode is not None) and stat.S_IMODE(mode) or 0o755
+                self._dirs[directory] = [OrderedDict(), perms, time.time()]
+                self._link(directory)
+    
+    def _store(self, path, data, perms):
+        with self._lock:
+            if not self.isdir(self._parent(path)):
+                raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+            
+            perms = perms is not None and stat.S_IMODE(perms) or 0o644
+            self._files[path] = [data, perms, time.time()]
+            self._link(path)
+    
+    def open(self, path, mode='rb', perms=None):
+        path = self._norm(path)
+        
+        if 'w' in mode:
+            if not self.isdir(self._parent(path)):
+                raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+            return _MemoryFile(self, path, perms)
+        
+        if path not in self._files:
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        
+        return StringIO(self._files[path][0])
+    
+    def add_file(self, path, data, perms=None):
+        """
+        Create a file with the given contents, and any missing parent 
+        directories.
+        """
+        path = self._norm(path)
+        parent = self._parent(path)
+        
+        with self._lock:
+            if not self.exists(parent):
+                self.makedirs(parent)
+            self._store(path, data, perms)
+    
+    def read(self, path):
+        """
+        Return the contents of the file at path.
+        """
+        path = self._norm(path)
+        
+        if path not in self._files:
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        
+        return self._files[path][0]
+    
+    def commit(self, target=None):
+        """
+        Write everything in this filesystem to another one, at the same paths.
+        Directories that already exist are left alone; files are overwritten.
+        
+        @param target: a Filesystem, defaults to the local disk
+        """
+        target = target or local_filesystem
+        
+        # shorter paths first, so parents come before their children
+        for path in sorted(self._dirs, key=len):
+            if not target.exists(path):
+                target.makedirs(path, self._dirs[path][1])
+        
+        for path, (data, mode, mtime) in self._files.items():
+            f = target.open(path, 'wb', mode)
+            try:
+                f.write(data)
+            finally:
+                f.close()
+
+# used by Skeletons unless they specify another source or destination
+local_filesystem = LocalFilesystem()
@@ -0,0 +1,204 @@
+"""
+crushinator.framework.flow - the order an Interrogation's probes are asked in.
+
+After a probe is answered, its next() decides what comes next:
+
+    None            the next probe, in the order they were declared
+    'name'          the probe called name
+    Interrogation   all of that Interrogation's probes, then the next probe
+    StopIteration   (raised) nothing, the Interrogation is done
+
+A FlowGraph is built once per Interrogation class. It compiles the declared
+order and each probe's next() for the probes' initial values into a graph,
+and refuses graphs with cycles. While an Interrogation is stepped through,
+transitions are remembered per probe and value, so each step is a dictionary
+lookup once a value has been seen before, and a probe that comes up a second
+time (e.g. a jump back for some answers) is refused too.
+"""
+import copy, threading
+
+from crushinator.framework.exceptions import InterrogationCycleError, ProbeNotFound, \
+                                             ValidationError
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+# transition target for the end of an Interrogation
+END = None
+
+class FlowGraph(object):
+    """
+    The flow of an Interrogation class's probes, shared by all of its
+    sessions (instances).
+
+    Transitions are memoized on the probe's name and raw value, so next()
+    must only depend on the probe's own value; probes whose next() looks at
+    anything else should set Probe.memoize_next to False. Transitions to
+    another Interrogation aren't memoized either, since the Interrogation
+    returned belongs to the session.
+
+    @ivar order: tuple of probe names, as declared
+    @ivar start: name of the first probe, or END
+    @ivar fallthrough: dictionary of probe name: name of the probe declared
+                       after it, or END
+    @ivar hits: integer, transitions found in the memo
+    @ivar misses: integer, transitions that called next()
+    """
+
+    def __init__(self, definition):
+        """
+        @param definition: crushinator.framework.interrogation.InterrogationDefinition
+        """
+        self.definition = definition
+        self.order = definition.order
+        self.start = self.order and self.order[0] or END
+        self.fallthrough = dict(zip(self.order, self.order[1:] + (END,)))
+
+        # (probe name, value): target
+        self._transitions = {}
+        self._compiled = False
+        self._lock = threading.Lock()
+        self._compiling = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _next(self, probe):
+        """
+        Ask a bound probe what comes after it, resolved to a probe name, an
+        Interrogation, or END.
+        """
+        try:
+            target = probe.next()
+        except StopIteration:
+            return END
+
+        if target is None:
+            return self.fallthrough[probe.name]
+
+        if isinstance(target, basestring):
+            if target not in self.fallthrough:
+                raise ProbeNotFound("%s jumps to %s, which doesn't exist" % (probe.name, target))
+            return target
+
+        return target
+
+    def transition(self, session, name):
+        """
+        Return what comes after the probe called name, given its value in
+        session: a probe name, an Interrogation, or END.
+        """
+        probe = getattr(session, name)
+
+        if not probe.memoize_next:
+            return self._next(probe)
+
+        key = (name, probe._value)
+
+        try:
+            target = self._transitions[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable value
+            return self._next(probe)
+        else:
+            with self._lock:
+                self.hits += 1
+            return target
+
+        with self._lock:
+            self.misses += 1
+        target = self._next(probe)
+
+        if target is END or isinstance(target, basestring):
+            self._transitions[key] = target
+
+        return target
+
+    def compile(self, session):
+        """
+        Resolve (and memoize) every probe's transition for session's values,
+        and check the resulting graph for cycles. Done once per class, on
+        the first walk(), with the probes' initial values (see reset()).
+
+        A probe whose next() raises a validation error for its initial value
+        is taken to continue with the next probe declared.
+
+        Raises InterrogationCycleError if the probes lead back to themselves.
+        """
+        edges = {}
+
+        for name in self.order:
+            try:
+                target = self.transition(session, name)
+            except ValidationError, e:
+                logger.debug("%s can't be compiled with its initial value: %s" % (name, e))
+                target = self.fallthrough[name]
+            if target is not END and not isinstance(target, basestring):
+                # continues after the nested Interrogation
+                target = self.fallthrough[name]
+            edges[name] = target
+
+        # follow the edges from each probe, looking for one already on the path
+        done = set()
+        for name in self.order:
+            path = []
+            while name is not END and name not in done:
+                if name in path:
+                    cycle = path[path.index(name):] + [name]
+                    raise InterrogationCycleError(cycle)
+                path.append(name)
+                name = edges[name]
+            done.update(path)
+
+        return edges
+
+    def walk(self, session):
+        """
+        Generator; yield session's probes (bound, see
+        InterrogationDefinition.bind()) in the order they should be asked.
+        Each transition is taken after the previous probe is yielded, so it
+        sees the value given to it in the meantime.
+
+        Raises InterrogationCycleError if the values given lead back to a
+        probe that was already asked.
+        """
+        if not self._compiled:
+            with self._compiling:
+                if not self._compiled:
+                    prototype = copy.copy(session)
+                    prototype.reset()
+                    self.compile(prototype)
+                    self._compiled = True
+
+        name = self.start
+        asked = []
+        seen = set()
+
+        while name is not END:
+            if name in seen:
+                raise InterrogationCycleError(asked[asked.index(name):] + [name])
+            asked.append(name)
+            seen.add(name)
+
+            yield getattr(session, name)
+
+            target = self.transition(session, name)
+
+            if target is END or isinstance(target, basestring):
+                name = target
+            else:
+                logger.debug("%s continues with %s" % (name, type(target).__name__))
+                for probe in target._definition.flow.walk(target):
+                    yield probe
+                name = self.fallthrough[name]
+
+    def clear(self):
+        """
+        Forget memoized transitions (and compile again on the next walk()).
+        """
+        with self._lock:
+            self._transitions.clear()
+            self._compiled = False
+            self.hits = self.misses = 0
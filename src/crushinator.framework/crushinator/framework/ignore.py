@@ -0,0 +1,168 @@
+"""
+crushinator.framework.ignore - gitignore-style rules for leaving files out of
+a skeleton.
+"""
+import os, re
+
+from crushinator.framework.filesystem import local_filesystem
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+# name of the file, at the top of a skeleton source directory, that holds
+# extra ignore patterns for that skeleton
+IGNORE_FILE = '.crushignore'
+
+# version control metadata, compiled python, and editor droppings
+DEFAULT_IGNORE = (
+    '.svn/',
+    '.git/',
+    '.hg/',
+    '.bzr/',
+    'CVS/',
+    '__pycache__/',
+    '*.pyc',
+    '*.pyo',
+    '*.swp',
+    '*.swo',
+    '*~',
+    '.DS_Store',
+    IGNORE_FILE,
+)
+
+def _translate(pattern):
+    """
+    Convert a glob pattern to a regular expression. * and ? don't match /,
+    ** matches any number of directories.
+    """
+    i, n = 0, len(pattern)
+    out = []
+
+    while i < n:
+        c = pattern[i]
+
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        elif c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[%s]' % (body.replace('\\', '\\\\')))
+                i = end
+        else:
+            out.append(re.escape(c))
+
+        i += 1
+
+    return ''.join(out)
+
+class IgnoreRules(object):
+    """
+    A compiled list of gitignore-style patterns:
+
+        - blank lines and lines starting with # are skipped
+        - a pattern ending in / only matches directories
+        - a pattern starting with ! re-includes what an earlier pattern
+          excluded
+        - a pattern containing a / (other than at the end) is matched against
+          the path relative to the top of the skeleton; otherwise it is
+          matched against the file or directory name alone
+        - *, ? and [...] work as in the shell, ** matches across directories
+
+    As with git, the last matching pattern wins. A file inside an ignored
+    directory can't be re-included, because the directory is never walked.
+    """
+
+    def __init__(self, patterns=()):
+        """
+        @param patterns: sequence of pattern strings
+        """
+        self.patterns = []
+        self._rules = []
+
+        self.extend(patterns)
+
+    def extend(self, patterns):
+        """
+        Compile and add more patterns.
+        """
+        for pattern in patterns:
+            pattern = pattern.strip()
+
+            if not pattern or pattern.startswith('#'):
+                continue
+
+            self.patterns.append(pattern)
+
+            negate = pattern.startswith('!')
+            if negate:
+                pattern = pattern[1:]
+
+            dironly = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+
+            anchored = '/' in pattern
+            pattern = pattern.lstrip('/')
+
+            regex = re.compile(_translate(pattern) + r'\Z')
+
+            self._rules.append((regex, negate, dironly, anchored))
+
+    @classmethod
+    def load(cls, root, patterns=DEFAULT_IGNORE, filename=IGNORE_FILE, fs=None):
+        """
+        Build the rules for a skeleton: patterns, followed by the contents of
+        filename in the top of the skeleton, if it exists.
+
+        @param fs: the Filesystem root is on, defaults to the local disk
+        """
+        rules = cls(patterns)
+        fs = fs or local_filesystem
+
+        if filename:
+            path = os.path.join(root, filename)
+
+            if fs.isfile(path):
+                f = fs.open(path, 'rb')
+                try:
+                    rules.extend(f.read().splitlines())
+                finally:
+                    f.close()
+
+        return rules
+
+    def match(self, relpath, isdir=False):
+        """
+        Return True if relpath (relative to the top of the skeleton) should be
+        ignored.
+        """
+        relpath = relpath.replace(os.sep, '/')
+        name = relpath.rpartition('/')[2]
+
+        ignored = False
+
+        for regex, negate, dironly, anchored in self._rules:
+            if dironly and not isdir:
+                continue
+
+            if regex.match(anchored and relpath or name):
+                ignored = not negate
+
+        return ignored
+
+    def __len__(self):
+        return len(self._rules)
@@ -0,0 +1,325 @@
+"""
+crushinator.framework.index - an in-memory index of a Skeleton's source tree.
+"""
+import os, threading
+
+from collections import namedtuple
+
+from crushinator.framework.util import iterdir
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+# a single file or directory in the source tree.
+#   path: absolute (or source-relative, if source is) path
+#   relpath: path relative to the root of the index
+#   isdir: boolean, True for directories
+#   size, mode, mtime: from stat()
+#   template: boolean, True for template files
+IndexEntry = namedtuple('IndexEntry', 'path relpath isdir size mode mtime template')
+
+def is_template_name(path, templatematch):
+    """
+    Return True if path contains templatematch. See Skeleton.is_template().
+    """
+    return path.rpartition(templatematch)[:2] != ('', '')
+
+class SkeletonIndex(object):
+    """
+    A snapshot of a skeleton source directory, built with a single scandir()
+    walk. 
+    
+    Each entry is stat'ed exactly once, so the type, size, and template/static
+    split can be looked up later without touching the filesystem again.
+    
+    Entries are kept in the same order os.walk() (and listpaths()) would 
+    produce: each directory's subdirectories, then its files, then the 
+    contents of each subdirectory.
+    
+    Conditional directories (see crushinator.framework.conditions) are 
+    indexed, but their contents are not, until expand() is called. Expanded
+    entries are added to the end, after everything else.
+    """
+    
+    def __init__(self, root, templatematch='_tmpl', fs=None, ignore=None, conditional=None):
+        """
+        @param root: string, path to the skeleton source directory
+        @param templatematch: string, see Skeleton.templatematch
+        @param fs: the Filesystem root is on, defaults to the local disk (see
+                   Skeleton.sourcefs)
+        @param ignore: crushinator.framework.ignore.IgnoreRules. Ignored files
+                       are left out, and ignored directories are not walked.
+        @param conditional: callable that returns true for the name of a 
+                            conditional directory (e.g. a PathConditions)
+        """
+        self.root = root
+        self.templatematch = templatematch
+        self.fs = fs
+        self.ignore = ignore
+        self.conditional = conditional
+        
+        # conditional directories that haven't been walked yet
+        self.deferred = set()
+        self._lock = threading.Lock()
+        
+        self.entries = []
+        self._bypath = {}
+        # directory path: its entries, in index order
+        self._children = {}
+        
+        self._build()
+        
+        # files refresh() has already checked (here, all of them), see 
+        # revalidate()
+        self._checked = set(self._bypath)
+    
+    @classmethod
+    def from_entries(cls, root, entries, templatematch='_tmpl'):
+        """
+        Build an index from an already-known list of IndexEntry tuples, 
+        without touching the filesystem (see crushinator.framework.journal).
+        """
+        index = cls.__new__(cls)
+        index.root = root
+        index.templatematch = templatematch
+        index.fs = None
+        index.ignore = None
+        index.conditional = None
+        index.deferred = set()
+        index._lock = threading.Lock()
+        index.entries = []
+        index._bypath = {}
+        index._children = {}
+        index._checked = set()
+        
+        for entry in entries:
+            index._add(entry)
+        
+        return index
+    
+    def _scan(self, dirpath):
+        """
+        Return two lists of entries, (directories, files), for dirpath. 
+        
+        Symlinks to directories are listed as directories, but are not 
+        descended into (again, like os.walk()).
+        """
+        dirs, files = [], []
+        
+        try:
+            if self.fs is None:
+                scanned = list(iterdir(dirpath))
+            else:
+                scanned = list(self.fs.scandir(dirpath))
+        except OSError, e:
+            logger.debug("Unable to list %s: %s" % (dirpath, e))
+            return dirs, files
+        
+        for entry in scanned:
+            isdir = entry.is_dir()
+            relpath = os.path.relpath(entry.path, self.root)
+            
+            # checked before stat(), so ignored paths cost nothing more
+            if self.ignore is not None and self.ignore.match(relpath, isdir):
+                logger.debug("Ignoring %s" % (entry.path))
+                continue
+            
+            try:
+                info = entry.stat()
+            except OSError:
+                # dangling symlink
+                logger.debug("Unable to stat %s" % (entry.path))
+                continue
+            
+            indexed = IndexEntry(
+                path=entry.path, 
+                relpath=relpath,
+                isdir=isdir,
+                size=info.st_size,
+                mode=info.st_mode,
+                mtime=info.st_mtime,
+                template=(not isdir) and is_template_name(entry.path, self.templatematch),
+            )
+            
+            if isdir:
+                dirs.append((indexed, entry.is_symlink()))
+            else:
+                files.append(indexed)
+        
+        return dirs, files
+    
+    def _build(self):
+        self._walk(self.root)
+        logger.debug("Indexed %s entries in %s" % (len(self.entries), self.root))
+    
+    def _walk(self, top):
+        """
+        Walk the tree under top, top down.
+        """
+        pending = [top]
+        
+        while pending:
+            dirpath = pending.pop()
+            dirs, files = self._scan(dirpath)
+            
+            walk = []
+            for entry, symlink in dirs:
+                self._add(entry)
+                
+                if symlink:
+                    continue
+                
+                if self.conditional is not None and self.conditional(os.path.basename(entry.path)):
+                    self.deferred.add(entry.path)
+                else:
+                    walk.append(entry.path)
+            
+            for entry in files:
+                self._add(entry)
+            
+            # pending is a stack, so reverse to keep os.walk() order
+            pending.extend(reversed(walk))
+    
+    def expand(self, path):
+        """
+        Walk a deferred conditional directory, adding its contents to the end
+        of the index. Does nothing if path isn't deferred. 
+        
+        Safe to call while iterating over the index: the new entries will be 
+        included.
+        """
+        with self._lock:
+            if path not in self.deferred:
+                return
+            
+            self.deferred.discard(path)
+            before = len(self.entries)
+            self._walk(path)
+            self._checked.update(e.path for e in self.entries[before:])
+
+        logger.debug("Expanded %s, %s entries" % (path, len(self.entries) - before))
+    
+    def defer_unexpanded(self, conditional):
+        """
+        Mark conditional directories that have no indexed contents as 
+        deferred (e.g. for an index rebuilt by from_entries()).
+        """
+        self.conditional = conditional
+        
+        parents = set(os.path.dirname(e.path) for e in self.entries)
+        
+        for entry in self.entries:
+            if entry.isdir and entry.path not in parents \
+               and conditional(os.path.basename(entry.path)):
+                self.deferred.add(entry.path)
+    
+    def _add(self, entry):
+        self.entries.append(entry)
+        self._bypath[entry.path] = entry
+        self._children.setdefault(os.path.dirname(entry.path), []).append(entry)
+    
+    def get(self, path, default=None):
+        """
+        Return the IndexEntry for path, or default if it isn't indexed.
+        """
+        return self._bypath.get(path, default)
+    
+    def refresh(self, path):
+        """
+        Stat an indexed file again, and replace its entry if its size or 
+        modification time changed (e.g. a template edited since the index was
+        built). Returns the current entry, or None if path isn't indexed.
+        
+        Each file is only stat'ed the first time it's refreshed after 
+        revalidate() (i.e. once per Skeleton run); until then, the entry is
+        returned as it is.
+        
+        If the file can't be stat'ed any more, the old entry is returned.
+        """
+        entry = self._bypath.get(path)
+        
+        if entry is None or entry.isdir or path in self._checked:
+            return entry
+        
+        self._checked.add(path)
+        
+        try:
+            if self.fs is None:
+                info = os.stat(path)
+            else:
+                info = self.fs.stat(path)
+        except OSError:
+            return entry
+        
+        if (info.st_mtime, info.st_size) == (entry.mtime, entry.size):
+            return entry
+        
+        with self._lock:
+            current = self._bypath.get(path)
+            fresh = current._replace(size=info.st_size, mode=info.st_mode, mtime=info.st_mtime)
+            self.entries[self.entries.index(current)] = fresh
+            self._bypath[path] = fresh
+            siblings = self._children[os.path.dirname(path)]
+            siblings[siblings.index(current)] = fresh
+        
+        logger.debug("%s changed since it was indexed" % (path))
+        return fresh
+    
+    def revalidate(self):
+        """
+        Have refresh() stat each file again, the next time it's refreshed.
+        """
+        self._checked = set()
+    
+    def subtree(self, path):
+        """
+        Generator; the entry for path, then the entries under it, top down:
+        each directory's entries, then the contents of each subdirectory. 
+        Only the entries in the subtree are visited.
+        
+        Like iterating over the index, directories expanded in the meantime
+        (see expand()) are included, as long as they're expanded before the 
+        iteration reaches their contents.
+        """
+        entry = self._bypath.get(path)
+        if entry is None:
+            return
+        
+        yield entry
+        
+        pending = entry.isdir and [path] or []
+        
+        while pending:
+            dirpath = pending.pop()
+            
+            walk = []
+            for child in list(self._children.get(dirpath, ())):
+                yield child
+                if child.isdir:
+                    walk.append(child.path)
+            
+            # pending is a stack, so reverse to keep the same order
+            pending.extend(reversed(walk))
+    
+    @property
+    def templates(self):
+        """
+        List of the template file entries.
+        """
+        return [e for e in self.entries if e.template]
+    
+    @property
+    def static(self):
+        """
+        List of the non-template file entries.
+        """
+        return [e for e in self.entries if not e.isdir and not e.template]
+    
+    def __contains__(self, path):
+        return path in self._bypath
+    
+    def __iter__(self):
+        return iter(self.entries)
+    
+    def __len__(self):
+        return len(self.entries)
@@ -1,14 +1,124 @@
 """
 interrogation.py - base classes for building Interrogators (collections of questions, or 
 _Probes_)
+
+The probes, their order and the class's __properties__ make up an 
+InterrogationDefinition, built once per class and never changed afterwards. 
+Each Interrogation instance is a session: it holds its own property 
+overrides, one value per probe, and its own bound copy of each probe, so a
+single definition can back any number of concurrent sessions.
+
+Probes are reached as attributes of an Interrogation (interrogation.email)
+through a ProbeAccessor the metaclass installs for each probe, so looking up
+anything else on an Interrogation costs what it does on any object.
 """
 
 from collections import OrderedDict
 from crushinator.framework.probe import Probe
+from crushinator.framework.flow import FlowGraph
 
 import logging
 logger = logging.getLogger('crushinator.framework')
 
+def bound_probe_class(probe, index):
+    """
+    Return a subclass of the probe's class for binding the probe to sessions.
+    
+    The probe's settings (name, label, ...) become class attributes, so bound 
+    probes share them, and _value reads and writes the session's value for 
+    the probe at index. Probe methods and properties (value, coerce(), 
+    validate(), ...) work unchanged, and any other attributes they set are
+    kept on the bound probe, which belongs to one session.
+    """
+    def get_value(self):
+        return self._session._values[index]
+    
+    def set_value(self, value):
+        self._session._values[index] = value
+    
+    def del_value(self):
+        self._session._values[index] = type(probe)._value
+    
+    attrs = dict(vars(probe))
+    attrs.update({
+        '_value': property(get_value, set_value, del_value),
+        'interrogation': property(lambda self: self._session),
+        '_spec': probe,
+    })
+    
+    return type('Bound%s' % (type(probe).__name__), (type(probe),), attrs)
+
+class ProbeAccessor(object):
+    """
+    Descriptor for a probe on an Interrogation class. On an instance 
+    (session), returns the probe bound to it, created the first time it's
+    needed and kept by the session; on the class, returns the probe as 
+    declared. Probes can't be replaced through an instance.
+    """
+    __slots__ = ('probe', 'bound_class', 'index')
+    
+    def __init__(self, probe, bound_class, index):
+        self.probe = probe
+        self.bound_class = bound_class
+        self.index = index
+    
+    def __get__(self, session, owner):
+        if session is None:
+            return self.probe
+        
+        bound = session._bound[self.index]
+        
+        if bound is None:
+            bound = self.bound_class.__new__(self.bound_class)
+            bound._session = session
+            session._bound[self.index] = bound
+        
+        return bound
+    
+    def __set__(self, session, value):
+        raise AttributeError("Probe %s is read-only" % (self.probe.name))
+
+class InterrogationDefinition(object):
+    """
+    The immutable part of an Interrogation class: its probes, in order, and 
+    its properties. Shared by every instance (session) of the class.
+    
+    @ivar probes: OrderedDict of probe name: Probe, the probes as declared
+    @ivar order: tuple of probe names
+    @ivar properties: dictionary, the class's __properties__
+    @ivar initial: tuple of each probe's value before anything is entered
+    @ivar accessors: OrderedDict of probe name: ProbeAccessor
+    @ivar flow: the FlowGraph for stepping through the probes
+    """
+    
+    def __init__(self, probes, properties):
+        self.probes = probes
+        self.order = tuple(probes)
+        self.properties = dict(properties)
+        self.initial = tuple(probe._value for probe in probes.itervalues())
+        
+        self.accessors = OrderedDict((name, ProbeAccessor(probe, bound_probe_class(probe, i), i))
+                                     for i, (name, probe) in enumerate(probes.iteritems()))
+        
+        # probe name: position of its value in a session
+        self._index = dict((name, i) for i, name in enumerate(self.order))
+        
+        self.flow = FlowGraph(self)
+    
+    def index(self, name):
+        """
+        Return the position of the named probe's value in a session.
+        """
+        return self._index[name]
+    
+    def bind(self, name, session):
+        """
+        Return the named probe, bound to session (an Interrogation instance).
+        The session keeps its bound probes, so the same object is returned 
+        every time.
+        """
+        return self.accessors[name].__get__(session, type(session))
+
 class __interrogation_meta__(type):
     """
     Metaclass for translating properties (probes) into a sequence
@@ -22,6 +132,11 @@ class __interrogation_meta__(type):
         Sets the 'name' property of the probe to the name of the attribute if 
         it's not already set
         
+        Builds the class's InterrogationDefinition, and installs a 
+        ProbeAccessor for each probe (inherited ones too, bound to this class's
+        definition). Sessions of classes that declare __slots__ = () have no
+        instance dictionary; other classes can set attributes as usual.
+        
         @TODO: is it safe/smart to let the developer name the probe *and* provide it
                as an Interrogation attribute?
         @TODO: a way to change just a setting or two on a inherited probe? maybe pass
@@ -34,7 +149,8 @@ class __interrogation_meta__(type):
             if getattr(base, '_probes', False):
                 probes.update(base._probes)
                 
-        for k, v in dct.iteritems():
+        # in the order they were declared
+        for k, v in sorted(dct.iteritems(), key=lambda item: getattr(item[1], '_order', -1)):
             if isinstance(v, Probe):
                 if not v.name:
                     v.name = k
@@ -44,7 +160,14 @@ class __interrogation_meta__(type):
         
         newdct['_probes'] = probes
         
-        return type.__new__(cls, name, bases, newdct)
+        klass = type.__new__(cls, name, bases, newdct)
+        definition = klass._definition = InterrogationDefinition(probes, 
+                                                        getattr(klass, '__properties__', {}))
+        
+        for probe_name, accessor in definition.accessors.iteritems():
+            setattr(klass, probe_name, accessor)
+        
+        return klass
         
 
 class Interrogation(object):
@@ -56,32 +179,63 @@ class Interrogation(object):
     
     @note: there is no inherent or gaurenteed order here. The probe is left to 
            decide, given its value (or a suggested value) what comes next.
+    
+    Each instance is a session with its own probe values and properties; the
+    class-level probes and __properties__ are never changed. Probes accessed
+    through an instance are bound to it (see InterrogationDefinition.bind()).
     """
     __metaclass__ = __interrogation_meta__
     __properties__ = {}
     
+    # _properties: this session's properties, on top of the class's
+    # _values: list of probe values, in the order of _definition.order
+    # _bound: list of probes bound to this session, in the same order, None
+    #         until each is first used
+    __slots__ = ('_properties', '_values', '_processed', '_bound')
+    
     def __init__(self, name, **kwargs):
-        self.__properties__['name'] = name
+        self._properties = dict(kwargs, name=name)
+        self._values = list(self._definition.initial)
+        self._processed = []
+        self._bound = [None] * len(self._values)
         
-        for k,v in kwargs.iteritems():
-            self.__properties__[k] = v
-            
-        if self.__properties__.get('defaults') is None:
-            self.__properties__['defaults'] = {}
+        if self.get('defaults', None) is None:
+            self._properties['defaults'] = {}
+    
+    def __copy__(self):
+        """
+        Return a new session with this session's properties, values and 
+        instance attributes, and probes of its own (their attributes other 
+        than the value aren't copied).
+        """
+        session = type(self).__new__(type(self))
+        session._properties = dict(self._properties)
+        session._values = list(self._values)
+        session._processed = list(self._processed)
+        session._bound = [None] * len(self._values)
+        
+        if hasattr(self, '__dict__'):
+            session.__dict__.update(self.__dict__)
+        
+        return session
     
     def get(self, propkey, default=""):
         """
-        Easy grab of a __properties__ value, returns an empty string if
-        it isn't set.
+        Easy grab of a property, from this session or the class's 
+        __properties__. Returns an empty string if it isn't set.
         """
-        return self.__properties__.get(propkey, default)
+        try:
+            return self._properties[propkey]
+        except KeyError:
+            return self._definition.properties.get(propkey, default)
     
     @property
     def probes(self):
         """
-        Getter - returns a list of probes
+        Getter - returns a list of probes, bound to this Interrogation
         """
-        return self._probes
+        cls = type(self)
+        return [accessor.__get__(self, cls) for accessor in self._definition.accessors.itervalues()]
     
     def reset(self):
         """
@@ -90,7 +244,7 @@ class Interrogation(object):
         """
         self._processed = []
         
-        for probe in self:
+        for probe in self.probes:
             probe.reset()
     
     def validate(self):
@@ -114,44 +268,10 @@ class Interrogation(object):
             
     def __iter__(self):
         """
-        Generator; yield the next probe (or the next probe from another interrogation
-        """
-        for probe in self.probes:
-            next = probe.next()
-            
-            if isinstance(next, Interrogation):
-                for probe in next.probes:
-                    yield probe
-            elif isinstance(next, str):
-                yield getattr(self, next)
-            else:
-                raise StopIteration
-                
-            yield probe
-           
-    
-    def __getattribute__(self, key):
-        """
-        Override __getattr__ to try probe access first.
-        
-        This way you can do interrogation.probename to access a specific
-        probe directly.
-        
-        Essentially makes the probe collection read-only
-        
-        @TODO: should probes be read-write?
+        Generator; yield the next probe (or the next probe from another interrogation),
+        following each probe's next(). See crushinator.framework.flow.
         """
-        probes = object.__getattribute__(self, '_probes')
-        
-        probe = probes.get(key, False)
-        
-        if probe:
-            return probe
-        else:
-            try:
-                return object.__getattribute__(self, key)
-            except:
-                raise
+        return self._definition.flow.walk(self)
 
 class InterrogationMixin(object):
     """
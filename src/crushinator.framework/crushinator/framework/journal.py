@@ -0,0 +1,121 @@
+"""
+crushinator.framework.journal - append-only record of a Skeleton run, so an
+interrupted run can be resumed.
+"""
+import os, json
+
+from crushinator.framework.index import SkeletonIndex, IndexEntry
+from crushinator.framework.exceptions import SkeletonJournalError
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+class Journal(object):
+    """
+    A journal is a text file with one JSON record per line:
+
+        ["start", source, dest]
+        ["entry", relpath, isdir, size, mode, mtime, template]  (one per index entry)
+        ["done", relpath]                                       (one per finished path)
+        ["end"]
+
+    The start and entry records are written before any work is done, so a
+    resumed run can rebuild the SkeletonIndex without walking the source
+    directory again. Each done record is flushed as soon as it is written.
+    """
+
+    def __init__(self, path):
+        """
+        @param path: string, path to the journal file
+        """
+        self.path = path
+        self._file = None
+
+    def _write(self, *record):
+        self._file.write(json.dumps(record) + '\n')
+
+    def start(self, source, dest, index):
+        """
+        Begin a new journal, replacing any existing one.
+
+        @param source: string, the Skeleton's source directory
+        @param dest: string, the Skeleton's destination directory
+        @param index: SkeletonIndex of the source directory
+        """
+        self.close()
+        self._file = open(self.path, 'w')
+
+        self._write('start', source, dest)
+        for entry in index:
+            self._write('entry', *entry[1:])
+
+        self._file.flush()
+
+    def load(self, source, dest, templatematch='_tmpl'):
+        """
+        Read an existing journal, and open it to append further records.
+
+        @return: (index, done, finished) three-tuple: the SkeletonIndex that
+                 was recorded, a list of relative paths that were completed,
+                 and True if the run completed.
+
+        Raises SkeletonJournalError if the journal doesn't exist, or was
+        written for a different source or destination.
+        """
+        if not os.path.exists(self.path):
+            raise SkeletonJournalError("No journal found at %s" % (self.path))
+
+        entries, done, finished = [], [], False
+
+        journal = open(self.path, 'r')
+        try:
+            for lineno, line in enumerate(journal):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a partially-written last line from an interrupted run
+                    logger.debug("Ignoring malformed journal line %s" % (lineno + 1))
+                    continue
+
+                kind = record[0]
+
+                if kind == 'start':
+                    if (record[1], record[2]) != (source, dest):
+                        raise SkeletonJournalError("Journal %s was written for %s -> %s"
+                                                   % (self.path, record[1], record[2]))
+                elif kind == 'entry':
+                    relpath = record[1]
+                    entries.append(IndexEntry(os.path.join(source, relpath), *record[1:]))
+                elif kind == 'done':
+                    done.append(record[1])
+                elif kind == 'end':
+                    finished = True
+        finally:
+            journal.close()
+
+        index = SkeletonIndex.from_entries(source, entries, templatematch)
+
+        self.close()
+        self._file = open(self.path, 'a')
+
+        return index, done, finished
+
+    def record(self, relpath):
+        """
+        Note that relpath has been completed.
+        """
+        self._write('done', relpath)
+        self._file.flush()
+
+    def finish(self):
+        """
+        Note that the run has completed, and close the journal.
+        """
+        if self._file is not None:
+            self._write('end')
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,89 @@
+"""
+crushinator.framework.manifest - record of what a Skeleton generated, used for
+incremental regeneration.
+"""
+import os, json, threading
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+class Manifest(object):
+    """
+    A mapping of destination paths (relative to the Skeleton's destination
+    directory) to the fingerprint of the inputs that produced them, and the
+    digest of the output that was written (so files edited since can be told
+    apart from files left as they were generated).
+    
+    Stored as a JSON file. A missing or unreadable file is treated as an empty
+    manifest, so everything gets regenerated.
+    """
+    
+    def __init__(self, path):
+        """
+        @param path: string, path to the manifest file
+        """
+        self.path = path
+        self.fingerprints = {}
+        self._lock = threading.Lock()
+        
+        self.load()
+    
+    def load(self):
+        """
+        Read the manifest file, if it exists.
+        """
+        if not os.path.exists(self.path):
+            return
+        
+        try:
+            manifest = open(self.path, 'r')
+            try:
+                self.fingerprints = json.load(manifest)
+            finally:
+                manifest.close()
+        except ValueError:
+            logger.warn('Manifest %s is unreadable, ignoring it' % (self.path))
+            self.fingerprints = {}
+    
+    def save(self):
+        """
+        Write the manifest file. The file is replaced atomically, so an 
+        interrupted save doesn't leave a truncated manifest behind.
+        """
+        partial = self.path + '.partial'
+        
+        with self._lock:
+            manifest = open(partial, 'w')
+            try:
+                json.dump(self.fingerprints, manifest, indent=1, sort_keys=True)
+            finally:
+                manifest.close()
+        
+        os.rename(partial, self.path)
+    
+    def get(self, relpath):
+        """
+        Return the fingerprint recorded for relpath, or None.
+        """
+        record = self.fingerprints.get(relpath)
+        
+        if isinstance(record, list):
+            return record[0]
+        
+        return record
+    
+    def digest(self, relpath):
+        """
+        Return the SHA-1 hex digest of the output recorded for relpath, or None
+        if there isn't one (e.g. in a manifest written by an older version).
+        """
+        record = self.fingerprints.get(relpath)
+        
+        if isinstance(record, list):
+            return record[1]
+        
+        return None
+    
+    def set(self, relpath, fingerprint, digest=None):
+        with self._lock:
+            self.fingerprints[relpath] = [fingerprint, digest]
@@ -0,0 +1,110 @@
+"""
+crushinator.framework.materialize - strategies for putting non-template files
+into place.
+"""
+import os, shutil
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+# ioctl request to clone a file's extents (Linux, btrfs/xfs/etc)
+FICLONE = 0x40049409
+
+class StrategyUnavailable(Exception):
+    """
+    Raised by a copy strategy when it can't be used for a particular file
+    (e.g. it isn't supported by the platform or filesystem). The next
+    strategy will be tried.
+    """
+
+def copy_reflink(source, dest):
+    """
+    Clone source into dest, sharing the data blocks (copy-on-write). Only
+    works on filesystems that support it.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise StrategyUnavailable('fcntl is not available')
+
+    src = open(source, 'rb')
+    try:
+        dst = open(dest, 'wb')
+        try:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except (IOError, OSError), e:
+                raise StrategyUnavailable(str(e))
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+def copy_hardlink(source, dest):
+    """
+    Hard link dest to source. Changes to either file affect the other.
+    """
+    try:
+        os.link(source, dest)
+    except (AttributeError, OSError), e:
+        raise StrategyUnavailable(str(e))
+
+def copy_symlink(source, dest):
+    """
+    Make dest a symbolic link to (the absolute path of) source.
+    """
+    try:
+        os.symlink(os.path.abspath(source), dest)
+    except (AttributeError, OSError), e:
+        raise StrategyUnavailable(str(e))
+
+def copy_userspace(source, dest):
+    """
+    Plain copy, always available.
+    """
+    shutil.copyfile(source, dest)
+
+# all known strategies, by name
+strategies = {
+    'reflink': copy_reflink,
+    'hardlink': copy_hardlink,
+    'symlink': copy_symlink,
+    'copy': copy_userspace,
+}
+
+def materialize(source, dest, preferred=('copy',)):
+    """
+    Put a copy of source at dest, trying each of the preferred strategies in
+    order. A plain copy is always the last resort.
+
+    An existing dest is always removed first: the link strategies can't 
+    replace a file, and copying into a dest that a previous run hard or 
+    symbolically linked would write into the source.
+
+    @param source: string, path to the source file
+    @param dest: string, path to the destination file
+    @param preferred: sequence of strategy names (see strategies)
+    @return: string, the name of the strategy that was used
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+
+    for name in preferred:
+        if name not in strategies:
+            raise ValueError("Unknown copy strategy %r" % (name))
+
+        if name == 'copy':
+            break
+
+        try:
+            strategies[name](source, dest)
+        except StrategyUnavailable, e:
+            logger.debug('%s unavailable for %s: %s' % (name, dest, e))
+            if os.path.lexists(dest):
+                os.remove(dest)
+            continue
+
+        return name
+
+    copy_userspace(source, dest)
+    return 'copy'
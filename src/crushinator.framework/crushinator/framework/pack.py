@@ -0,0 +1,391 @@
+"""
+crushinator.framework.pack - pack a skeleton source directory into a single
+indexed file, and read skeletons back out of one.
+
+A packed skeleton is loaded with one open() and mmap(); the directory tree,
+file types, modes and sizes all come from its header, so a Skeleton can be
+processed from it without walking or stat'ing anything:
+
+    sourcefs = PackFilesystem('package.crushpack')
+    skeleton = Skeleton(source=sourcefs.root, sourcefs=sourcefs, ...)
+
+To build a pack:
+
+    python -m crushinator.framework.pack SOURCE DEST
+
+File layout:
+
+    MAGIC (8 bytes)
+    header length (4 bytes, big-endian unsigned)
+    header (JSON)
+    file data, concatenated
+
+The header is a dictionary:
+
+    {"templatematch": "_tmpl",
+     "entries": [[relpath, isdir, mode, mtime, offset, size], ...]}
+
+Entries are in os.walk() order. offset is relative to the start of the file
+data.
+"""
+import os, stat, mmap, json, struct
+
+from collections import namedtuple
+
+from crushinator.framework.filesystem import Filesystem
+from crushinator.framework.index import SkeletonIndex
+from crushinator.framework.ignore import IgnoreRules, DEFAULT_IGNORE
+from crushinator.framework.exceptions import SkeletonPackError
+from crushinator.framework.streaming import CHUNK_SIZE
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+MAGIC = 'CRUSHPK2'
+
+# header length
+_LENGTH = struct.Struct('>I')
+
+# file extension for packed skeletons
+EXTENSION = '.crushpack'
+
+def _copy_body(entry, packfile, blocksize=CHUNK_SIZE):
+    """
+    Copy the contents of an indexed file into packfile, a block at a time.
+    The header already holds the file's size, so a file that changed size
+    since it was indexed is an error.
+    """
+    remaining = entry.size
+
+    body = open(entry.path, 'rb')
+    try:
+        while remaining:
+            block = body.read(min(remaining, blocksize))
+            if not block:
+                break
+            packfile.write(block)
+            remaining -= len(block)
+
+        extra = body.read(1)
+    finally:
+        body.close()
+
+    if remaining or extra:
+        raise SkeletonPackError("%s changed while it was being packed" % (entry.path))
+
+def pack_skeleton(source, dest, templatematch='_tmpl', ignore=DEFAULT_IGNORE):
+    """
+    Pack the skeleton source directory at source into the file dest. File
+    contents are copied straight into the pack, so they're never all in
+    memory at once.
+
+    @param source: string, path to a skeleton source directory
+    @param dest: string, path to the pack file to write
+    @param templatematch: string, see Skeleton.templatematch
+    @param ignore: sequence of patterns for files to leave out, see 
+                   Skeleton.ignore. The skeleton's ignore file is also read.
+    @return: integer, the number of entries packed
+    """
+    index = SkeletonIndex(source, templatematch, ignore=IgnoreRules.load(source, ignore or ()))
+
+    entries = []
+    offset = 0
+
+    # sizes come from the index, so the header can be written first
+    for entry in index:
+        if entry.isdir:
+            entries.append([entry.relpath, True, entry.mode, entry.mtime, 0, 0])
+        else:
+            entries.append([entry.relpath, False, entry.mode, entry.mtime, offset, entry.size])
+            offset += entry.size
+
+    header = json.dumps({'templatematch': templatematch, 'entries': entries})
+
+    partial = dest + '.partial'
+    packfile = open(partial, 'wb')
+    try:
+        packfile.write(MAGIC)
+        packfile.write(_LENGTH.pack(len(header)))
+        packfile.write(header)
+        for entry in index:
+            if not entry.isdir:
+                _copy_body(entry, packfile)
+    except:
+        packfile.close()
+        os.remove(partial)
+        raise
+
+    packfile.close()
+    os.rename(partial, dest)
+
+    logger.debug("Packed %s entries from %s into %s" % (len(entries), source, dest))
+
+    return len(entries)
+
+# stat() result for a packed path
+PackStat = namedtuple('PackStat', 'st_mode st_size st_mtime')
+
+# a single file or directory in a pack, see the module docstring
+PackEntry = namedtuple('PackEntry', 'relpath isdir mode mtime offset size')
+
+class _PackDirEntry(object):
+    """
+    os.DirEntry-like object for PackFilesystem.scandir().
+    """
+    def __init__(self, fs, path, entry):
+        self._fs = fs
+        self._entry = entry
+        self.name = os.path.basename(entry.relpath)
+        self.path = path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.isdir
+
+    def is_file(self, follow_symlinks=True):
+        return not self._entry.isdir
+
+    def is_symlink(self):
+        return False
+
+    def stat(self, follow_symlinks=True):
+        return self._fs._stat(self._entry)
+
+class _PackFile(object):
+    """
+    Read-only file-like view of one file's contents in a pack's mapping. 
+    Nothing is copied until it's read, so large files can be read a piece
+    at a time.
+    """
+    def __init__(self, map, start, size):
+        self._map = map
+        self._start = start
+        self._end = start + size
+        self._pos = start
+        self.closed = False
+
+    def _check(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+
+    def read(self, size=-1):
+        self._check()
+
+        end = self._end
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+
+        data = self._map[self._pos:end]
+        self._pos = max(self._pos, end)
+        return data
+
+    def readline(self, size=-1):
+        self._check()
+
+        end = self._map.find('\n', self._pos, self._end)
+        end = end == -1 and self._end or end + 1
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+
+        data = self._map[self._pos:end]
+        self._pos = max(self._pos, end)
+        return data
+
+    def readlines(self):
+        return list(self)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def tell(self):
+        self._check()
+        return self._pos - self._start
+
+    def seek(self, offset, whence=0):
+        self._check()
+
+        if whence == 1:
+            offset += self.tell()
+        elif whence == 2:
+            offset += self._end - self._start
+
+        self._pos = self._start + max(0, offset)
+
+    def close(self):
+        self.closed = True
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class PackFilesystem(Filesystem):
+    """
+    Read-only Filesystem for a packed skeleton. Use as a Skeleton's sourcefs.
+
+    The pack is opened and mmap'ed once; after that, nothing touches the disk
+    except reading file contents out of the mapping.
+
+    @ivar root: the path that corresponds to the top of the skeleton, use it
+                as the Skeleton's source. Defaults to the path of the pack.
+    @ivar templatematch: the templatematch the pack was built with
+    """
+
+    def __init__(self, path, root=None):
+        """
+        @param path: string, path to a pack file
+        @param root: string, see root
+        """
+        self.path = path
+        self.root = root or path
+
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (mmap.error, ValueError), e:
+            self._file.close()
+            raise SkeletonPackError("Unable to map %s: %s" % (path, e))
+
+        try:
+            self._load()
+        except:
+            self.close()
+            raise
+
+    def _load(self):
+        """
+        Parse the header.
+        """
+        prefix = len(MAGIC) + _LENGTH.size
+
+        if self._map[:len(MAGIC)] != MAGIC or len(self._map) < prefix:
+            raise SkeletonPackError("%s is not a packed skeleton" % (self.path))
+
+        length = _LENGTH.unpack(self._map[len(MAGIC):prefix])[0]
+
+        try:
+            header = json.loads(self._map[prefix:prefix + length])
+        except ValueError, e:
+            raise SkeletonPackError("Corrupt header in %s: %s" % (self.path, e))
+
+        self._data = prefix + length
+        self.templatematch = header['templatematch']
+
+        # absolute path: PackEntry
+        self._entries = {}
+        # directory path: list of child paths, in pack order
+        self._children = {self._norm(self.root): []}
+
+        for record in header['entries']:
+            entry = PackEntry(*record)
+            path = self._norm(os.path.join(self.root, entry.relpath))
+
+            self._entries[path] = entry
+            self._children.setdefault(os.path.dirname(path), []).append(path)
+            if entry.isdir:
+                self._children.setdefault(path, [])
+
+    def _norm(self, path):
+        return os.path.normpath(path)
+
+    def _entry(self, path):
+        entry = self._entries.get(self._norm(path))
+        if entry is None:
+            raise OSError(2, 'No such file in pack', path)
+        return entry
+
+    def _stat(self, entry):
+        kind = entry.isdir and stat.S_IFDIR or stat.S_IFREG
+        return PackStat(kind | stat.S_IMODE(entry.mode), entry.size, entry.mtime)
+
+    def exists(self, path):
+        path = self._norm(path)
+        return path in self._entries or path in self._children
+
+    def isdir(self, path):
+        return self._norm(path) in self._children
+
+    def isfile(self, path):
+        entry = self._entries.get(self._norm(path))
+        return entry is not None and not entry.isdir
+
+    def stat(self, path):
+        path = self._norm(path)
+
+        if path == self._norm(self.root):
+            return PackStat(stat.S_IFDIR | 0o755, 0, 0)
+
+        return self._stat(self._entry(path))
+
+    def scandir(self, path):
+        path = self._norm(path)
+
+        if path not in self._children:
+            raise OSError(2, 'No such directory in pack', path)
+
+        return iter([_PackDirEntry(self, child, self._entries[child])
+                     for child in self._children[path]])
+
+    def _file_entry(self, path):
+        entry = self._entries.get(self._norm(path))
+
+        if entry is None or entry.isdir:
+            raise IOError(2, 'No such file in pack', path)
+
+        return entry
+
+    def read(self, path):
+        """
+        Return the contents of the file at path.
+        """
+        entry = self._file_entry(path)
+
+        start = self._data + entry.offset
+        return self._map[start:start + entry.size]
+
+    def open(self, path, mode='rb', perms=None):
+        """
+        Return a read-only file-like object reading straight out of the 
+        mapping, so the file isn't copied into memory whole.
+        """
+        if 'w' in mode or 'a' in mode:
+            raise IOError("%s is read-only" % (self.__class__.__name__))
+
+        entry = self._file_entry(path)
+        return _PackFile(self._map, self._data + entry.offset, entry.size)
+
+    def makedirs(self, path, mode=None):
+        raise IOError("%s is read-only" % (self.__class__.__name__))
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+def main(argv=None):
+    """
+    Command line entry point: pack SOURCE into DEST.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Pack a skeleton source directory into a %s file.' % (EXTENSION))
+    parser.add_argument('source', help='skeleton source directory')
+    parser.add_argument('dest', help='pack file to write')
+    parser.add_argument('--templatematch', default='_tmpl',
+                        help='string identifying template files (default: %(default)s)')
+
+    args = parser.parse_args(argv)
+
+    count = pack_skeleton(args.source, args.dest, args.templatematch)
+    print "Packed %s entries into %s" % (count, args.dest)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+crushinator.framework.partials - shared pieces of template text.
+
+A template can include a partial with ${>name}:
+
+    ${>license_header.txt}
+    from $package import core
+
+Partials live in a directory in the top of the skeleton (see
+Skeleton.partials), which is not copied to the destination. They are
+templates themselves, rendered with the same params, and can include other
+partials.
+
+As usual, $$ escapes the delimiter, so $${>name} is left alone.
+"""
+import re, threading
+
+from string import Template
+
+from crushinator.framework.templatecache import template_identifiers
+from crushinator.framework.exceptions import SkeletonIncludeError
+
+# matches an escaped delimiter, or an include
+INCLUDE_PATTERN = re.compile(r'\$(?:\$|\{>\s*(?P<include>[^}\s]+)\s*\})')
+
+def template_parts(template, compile=Template):
+    """
+    Split a compiled template at its includes.
+
+    Returns None if the template has no includes. Otherwise, returns a list
+    whose items are either compiled templates (the text between includes) or
+    partial names, in order. The result is kept on the template, so each
+    template is only split once.
+
+    @param template: string.Template instance, or a template compiled by a
+                     crushinator.framework.engine.TemplateEngine
+    @param compile: callable used to compile the text between includes
+    """
+    try:
+        return template._crushinator_parts
+    except AttributeError:
+        pass
+
+    text = template.template
+    parts = None
+
+    if '${>' in text:
+        parts, start = [], 0
+
+        for match in INCLUDE_PATTERN.finditer(text):
+            if match.group('include') is None:
+                continue
+
+            parts.append(compile(text[start:match.start()]))
+            parts.append(match.group('include'))
+            start = match.end()
+
+        if parts:
+            parts.append(compile(text[start:]))
+        else:
+            parts = None
+
+    template._crushinator_parts = parts
+    return parts
+
+class PartialCache(object):
+    """
+    Rendered partials, remembered per partial and per values of the params
+    the partial refers to, so a header included by every file in a skeleton
+    is rendered once.
+
+    Entries are tied to the compiled template they were rendered from; when
+    the template cache recompiles a partial because its file changed, the
+    old renderings are dropped.
+
+    Partials that include other partials aren't remembered themselves (the
+    partials they include are).
+    """
+
+    def __init__(self, maxvalues=64):
+        """
+        @param maxvalues: integer, how many different renderings to keep for
+                          each partial
+        """
+        self.maxvalues = maxvalues
+
+        # path: (template, names, {values: rendered})
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, template, params):
+        """
+        Return the rendering of template (the partial at path) for params, or
+        None if it hasn't been rendered yet.
+        """
+        entry = self._entries.get(path)
+
+        if entry is None or entry[0] is not template:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        rendered = entry[2].get(self._values(entry[1], params))
+
+        with self._lock:
+            if rendered is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return rendered
+
+    def set(self, path, template, params, rendered):
+        """
+        Remember the rendering of template for params.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+
+            if entry is None or entry[0] is not template:
+                names = tuple(sorted(template_identifiers(template)))
+                entry = self._entries[path] = (template, names, {})
+
+            renderings = entry[2]
+            if len(renderings) >= self.maxvalues:
+                renderings.clear()
+
+            renderings[self._values(entry[1], params)] = rendered
+
+    def _values(self, names, params):
+        return tuple(repr(params.get(name)) for name in names)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+def render_parts(parts, params, render_partial, stack=()):
+    """
+    Render the parts of a template (see template_parts()).
+
+    @param render_partial: callable taking a partial name and the stack of
+                           partial names being rendered, returning the
+                           rendered partial.
+    @param stack: tuple of the names of the partials being rendered, for
+                  detecting include loops.
+    """
+    rendered = []
+
+    for part in parts:
+        if isinstance(part, basestring):
+            if part in stack:
+                raise SkeletonIncludeError("Include loop: %s" % (' -> '.join(stack + (part,))))
+            rendered.append(render_partial(part, stack + (part,)))
+        else:
+            rendered.append(part.substitute(params))
+
+    return ''.join(rendered)
+
+# shared by all Skeletons
+partial_cache = PartialCache()
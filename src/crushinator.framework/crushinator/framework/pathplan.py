@@ -0,0 +1,81 @@
+"""
+crushinator.framework.pathplan - compiled placeholder substitution for paths.
+"""
+import os, re
+
+from crushinator.framework.conditions import marker_pattern
+
+class PathPlan(object):
+    """
+    Replaces every placeholder (e.g. +name+) in a path in a single pass, using
+    one regular expression built from a params dictionary. Condition markers
+    (e.g. +?name+, see crushinator.framework.conditions) are removed in the 
+    same pass.
+    
+    Rendered directory prefixes are remembered, so the files in a directory
+    only pay for their own names.
+    
+    A plan is only valid for the params dictionary it was built with, see 
+    matches(). Changes made to that dictionary in place afterwards aren't 
+    seen by the plan; current() finds them.
+    """
+    
+    def __init__(self, params, pathmatch='+%s+'):
+        """
+        @param params: dictionary of template variables
+        @param pathmatch: string format for placeholders, see Skeleton.pathmatch
+        """
+        # the dictionary the plan was built for, and a copy of its values
+        self.source = params
+        self.params = dict(params)
+        self.pathmatch = pathmatch
+        
+        self._tokens = dict((pathmatch % key, val) for key, val in self.params.iteritems())
+        
+        # fan-out markers (+*name+) render as the current item
+        self._tokens.update((pathmatch % ('*' + key), val) for key, val in self.params.iteritems())
+        
+        # longest first, so one placeholder can't shadow a longer one
+        ordered = sorted(self._tokens, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(['(?:%s)' % (marker_pattern(pathmatch, '?!'))] + 
+                                            [re.escape(t) for t in ordered]))
+        
+        # a placeholder containing a separator could span directories
+        self._memoize = not [t for t in self._tokens if os.sep in t]
+        self._dirs = {}
+    
+    def matches(self, params, pathmatch):
+        """
+        Return True if this plan was built for the params dictionary (the 
+        same object, not just an equal one) and pathmatch. 
+        
+        Comparing identities keeps this check cheap, since it's made for every
+        rendered path.
+        """
+        return params is self.source and pathmatch == self.pathmatch
+    
+    def current(self):
+        """
+        Return True if the params dictionary the plan was built for still has
+        the values it was built with.
+        """
+        return self.source == self.params
+    
+    def _substitute(self, path):
+        tokens = self._tokens
+        return self._pattern.sub(lambda match: tokens.get(match.group(0), ''), path)
+    
+    def render(self, path):
+        """
+        Return path with all placeholders replaced.
+        """
+        if not self._memoize:
+            return self._substitute(path)
+        
+        head, sep, tail = path.rpartition(os.sep)
+        
+        rendered = self._dirs.get(head)
+        if rendered is None:
+            rendered = self._dirs[head] = self._substitute(head)
+        
+        return rendered + sep + self._substitute(tail)
@@ -1,6 +1,11 @@
 """
 probes.py - base classes for building Probes
 """
+import itertools
+
+# numbers probes in the order they're created, so Interrogations can keep
+# them in the order they were declared
+_counter = itertools.count()
 
 class Probe(object):
     """
@@ -32,10 +37,16 @@ class Probe(object):
     description = None
     interrogation = None
     
+    # set to False if next() depends on anything but this probe's value, so
+    # the transition isn't remembered. See crushinator.framework.flow.
+    memoize_next = True
+    
     def __init__(self, **kwargs):
         """
         Constructor - initialize variables
         """
+        self._order = _counter.next()
+        
         for k,v in kwargs.iteritems():
             setattr(self, k, v)
         
@@ -46,6 +57,9 @@ class Probe(object):
         Return a probe name, or Interrogation, given a certain
         value
         
+        Returning None continues with the probe declared after this one. 
+        Unless memoize_next is False, this is only called once for each value.
+        
         May raise a ProbeValidationError if the value isn't valid.
         
         Must raise StopIteration to cease looping.
@@ -0,0 +1,369 @@
+"""
+crushinator.framework.queued - a destination Filesystem for high-latency
+mounts (NFS, FUSE, etc).
+
+Every exists(), makedirs(), open() and close() against a network filesystem
+is a round trip. QueuedFilesystem walks the existing destination tree once,
+answers existence checks from that snapshot, and hands file writes to a pool
+of worker threads through a bounded queue, so many round trips are in
+flight at once. fsync()s are done together when the filesystem is closed:
+
+    with QueuedFilesystem(dest) as destfs:
+        for pair in Skeleton(dest=dest, destfs=destfs, ...):
+            pass
+
+Errors from the workers are raised by flush() (or close()), and by the next
+write after the error.
+"""
+import os, errno, threading
+
+from Queue import Queue
+from StringIO import StringIO
+
+from crushinator.framework.filesystem import Filesystem, LocalFilesystem, local_filesystem
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+class _QueuedFile(StringIO):
+    """
+    Writable file for QueuedFilesystem. The contents are queued to be written
+    when the file is closed.
+    """
+    def __init__(self, fs, path, perms):
+        StringIO.__init__(self)
+        self._fs = fs
+        self._path = path
+        self._perms = perms
+
+    def close(self):
+        if not self.closed:
+            self._fs._write(self._path, self.getvalue(), self._perms)
+        StringIO.close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class QueuedFilesystem(Filesystem):
+    """
+    Wraps another destination Filesystem (the local disk by default),
+    snapshotting the tree under root and queueing writes.
+
+    Paths outside of root are passed straight through to the target.
+
+    @ivar root: string, the destination directory - usually the Skeleton's dest
+    @ivar target: the Filesystem the writes are made to
+    @ivar workers: integer, number of writer threads
+    @ivar depth: integer, the most writes that can be waiting in the queue.
+                 Writing blocks when the queue is full, which also bounds the
+                 memory used by queued file contents.
+    @ivar fsync: boolean, if True, fsync() every written file when the
+                 filesystem is flushed. Only applies to the local disk.
+    """
+
+    def __init__(self, root, target=None, workers=8, depth=64, fsync=True):
+        self.root = os.path.normpath(root)
+        self.target = target or local_filesystem
+        self.workers = workers
+        self.depth = depth
+        self.fsync = fsync
+
+        self._lock = threading.Condition()
+        self._snapshot = None
+        # path: number of queued writes not yet finished
+        self._pending = {}
+        # written paths, to fsync at flush()
+        self._written = []
+        self._errors = []
+
+        self._queue = None
+        self._threads = []
+
+    @property
+    def is_local(self):
+        return self.target.is_local
+
+    def _norm(self, path):
+        return os.path.normpath(path)
+
+    def _inside(self, path):
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def _take_snapshot(self):
+        """
+        Walk the existing destination tree once. Caller must hold the lock.
+
+        Returns a dictionary of path: True for directories, False for files.
+        """
+        if self._snapshot is not None:
+            return self._snapshot
+
+        snapshot = {}
+        pending = [self.root]
+
+        if self.target.isdir(self.root):
+            snapshot[self.root] = True
+        else:
+            pending = []
+
+        while pending:
+            dirpath = pending.pop()
+
+            try:
+                scanned = list(self.target.scandir(dirpath))
+            except OSError, e:
+                logger.debug("Unable to list %s: %s" % (dirpath, e))
+                continue
+
+            for entry in scanned:
+                isdir = entry.is_dir()
+                snapshot[entry.path] = isdir
+
+                if isdir and not entry.is_symlink():
+                    pending.append(entry.path)
+
+        logger.debug("Snapshot of %s has %s entries" % (self.root, len(snapshot)))
+
+        self._snapshot = snapshot
+        return snapshot
+
+    def _known(self, path):
+        """
+        Return True or False for a directory or file under root, or None if
+        nothing exists at path.
+        """
+        with self._lock:
+            return self._take_snapshot().get(path)
+
+    def _wait(self, path):
+        """
+        Block until there are no queued writes for path.
+        """
+        with self._lock:
+            while self._pending.get(path):
+                self._lock.wait()
+
+    def exists(self, path):
+        path = self._norm(path)
+
+        if not self._inside(path):
+            return self.target.exists(path)
+
+        return self._known(path) is not None
+
+    def isdir(self, path):
+        path = self._norm(path)
+
+        if not self._inside(path):
+            return self.target.isdir(path)
+
+        return self._known(path) is True
+
+    def isfile(self, path):
+        path = self._norm(path)
+
+        if not self._inside(path):
+            return self.target.isfile(path)
+
+        return self._known(path) is False
+
+    def stat(self, path):
+        path = self._norm(path)
+        self._wait(path)
+        return self.target.stat(path)
+
+    def getsize(self, path):
+        path = self._norm(path)
+        self._wait(path)
+        return self.target.getsize(path)
+
+    def digest(self, path):
+        path = self._norm(path)
+        self._wait(path)
+        return self.target.digest(path)
+
+    def scandir(self, path):
+        self.flush()
+        return self.target.scandir(path)
+
+    def makedirs(self, path, mode=None):
+        """
+        Directories are created right away (there are usually far fewer of
+        them than files), so files can be queued into them.
+        """
+        path = self._norm(path)
+
+        if not self._inside(path):
+            return self.target.makedirs(path, mode)
+
+        if self._known(path) is not None:
+            raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+
+        self.target.makedirs(path, mode)
+
+        with self._lock:
+            current = path
+            while self._inside(current) and current not in self._snapshot:
+                self._snapshot[current] = True
+                current = os.path.dirname(current)
+
+    def open(self, path, mode='rb', perms=None):
+        path = self._norm(path)
+
+        if 'w' not in mode or not self._inside(path):
+            self._wait(path)
+            return self.target.open(path, mode, perms)
+
+        return _QueuedFile(self, path, perms)
+
+    def copyfile(self, source, path, perms=None, strategies=('copy',), sourcefs=None):
+        """
+        The copy is queued, so the strategy actually used isn't known yet.
+        Returns 'queued'.
+        """
+        path = self._norm(path)
+
+        if not self._inside(path):
+            return self.target.copyfile(source, path, perms, strategies, sourcefs)
+
+        def copy():
+            used = self.target.copyfile(source, path, perms, strategies, sourcefs)
+            logger.debug('%s put into place with %s' % (path, used))
+            return used
+
+        self._submit(path, copy)
+        return 'queued'
+
+    def _write(self, path, data, perms):
+        """
+        Queue a file write.
+        """
+        def write():
+            f = self.target.open(path, 'wb', perms)
+            try:
+                f.write(data)
+            finally:
+                f.close()
+
+        self._submit(path, write)
+
+    def _submit(self, path, job, record=True):
+        """
+        Queue job, a callable that writes path. Blocks if the queue is full.
+
+        @param record: boolean, if True, path is fsync'ed by flush()
+        """
+        self._raise_errors()
+
+        with self._lock:
+            self._take_snapshot()[path] = False
+            self._pending[path] = self._pending.get(path, 0) + 1
+
+            if self._queue is None:
+                self._start()
+
+        self._queue.put((path, job, record))
+
+    def _start(self):
+        """
+        Start the writer threads. Caller must hold the lock.
+        """
+        self._queue = Queue(self.depth)
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name='crushinator-writer-%s' % (i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        """
+        Writer thread main loop.
+        """
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is None:
+                    return
+
+                path, job, record = item
+
+                try:
+                    job()
+                except Exception, e:
+                    logger.debug('Writing %s failed: %s' % (path, e))
+                    with self._lock:
+                        self._errors.append(e)
+                else:
+                    if record:
+                        with self._lock:
+                            self._written.append(path)
+                finally:
+                    with self._lock:
+                        self._pending[path] -= 1
+                        if not self._pending[path]:
+                            del self._pending[path]
+                        self._lock.notify_all()
+            finally:
+                self._queue.task_done()
+
+    def _raise_errors(self):
+        with self._lock:
+            if self._errors:
+                error = self._errors[0]
+                del self._errors[:]
+                raise error
+
+    def _sync(self, path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError, e:
+            # e.g. a symlink strategy pointing somewhere unreadable
+            logger.debug('Unable to fsync %s: %s' % (path, e))
+            return
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        """
+        Wait for all of the queued writes to finish, then fsync the written
+        files (several at a time). Raises the first error any write hit.
+        """
+        if self._queue is None:
+            return
+
+        self._queue.join()
+
+        with self._lock:
+            written, self._written = self._written, []
+
+        if self.fsync and isinstance(self.target, LocalFilesystem):
+            for path in written:
+                self._submit(path, lambda path=path: self._sync(path), False)
+            self._queue.join()
+
+        self._raise_errors()
+
+    def close(self):
+        """
+        Flush, stop the writer threads, and close the target.
+        """
+        try:
+            self.flush()
+        finally:
+            if self._queue is not None:
+                for thread in self._threads:
+                    self._queue.put(None)
+                for thread in self._threads:
+                    thread.join()
+                self._queue = None
+                self._threads = []
+
+            self.target.close()
@@ -1,16 +1,66 @@
 """
 crushinator.framework.skeleton - base class for processing template skeletons.
 """
-import os, shutil
+import os, sys, copy, hashlib, threading
+import multiprocessing
 
+from collections import namedtuple
+from itertools import izip, imap
+from multiprocessing.pool import ThreadPool
 from string import Template
 
-from crushinator.framework.util import listpaths
-from crushinator.framework.exceptions import SkeletonFileExists
+from crushinator.framework.index import SkeletonIndex, is_template_name
+from crushinator.framework.util import DigestWriter
+from crushinator.framework.exceptions import SkeletonFileExists, SkeletonJournalError, \
+                                             SkeletonIncludeError, SkeletonMissingParams
+from crushinator.framework.templatecache import template_cache, template_identifiers
+from crushinator.framework.journal import Journal
+from crushinator.framework.manifest import Manifest
+from crushinator.framework.filesystem import LocalFilesystem, local_filesystem
+from crushinator.framework.streaming import template_chunks
+from crushinator.framework.pathplan import PathPlan
+from crushinator.framework.ignore import IgnoreRules, DEFAULT_IGNORE, IGNORE_FILE
+from crushinator.framework.conditions import PathConditions
+from crushinator.framework.partials import partial_cache, template_parts, render_parts
+from crushinator.framework.engine import default_engine
+from crushinator.framework.analysis import SkeletonAnalysis
 
 import logging
 logger = logging.getLogger('crushinator.framework')
 
+# the Skeleton used by render workers in a process pool, see Skeleton.process()
+_worker_skeleton = None
+
+def _init_render_worker(skeleton):
+    """
+    Process pool initializer - hand the Skeleton to the worker once, so each
+    task only has to carry a path.
+    """
+    global _worker_skeleton
+    _worker_skeleton = skeleton
+
+def _render_in_worker(source):
+    """
+    Render a template inside of a process pool worker. Tracebacks can't cross
+    the process boundary, so only the exception type and value are returned.
+    """
+    content, error = _worker_skeleton._render_safely(source)
+    
+    if error is not None:
+        error = (error[0], error[1], None)
+    
+    return content, error
+
+# default name of the incremental mode manifest file
+MANIFEST_NAME = '.crushinator-manifest'
+
+# the outcome of rendering one parameter set with Skeleton.render_many()
+#   params: the parameter set
+#   dest: the destination directory it was rendered to
+#   processed: list of (source, dest) pairs that were handled
+#   error: None, or the exception that stopped this parameter set
+BatchResult = namedtuple('BatchResult', 'params dest processed error')
+
 class Skeleton(object):
     """
     A Skeleton object takes a directory of template files, a dictionary of template
@@ -24,7 +74,9 @@ class Skeleton(object):
     # destination directory
     dest = None
     
-    # parameters, dictionary of template variables from the Runner
+    # parameters, dictionary of template variables from the Runner. Rendered
+    # paths are planned once per dictionary (see render_path()); changes made
+    # to it in place are picked up at the start of the next run.
     params = None
     
     # set to True to prevent any actual files from being changed
@@ -41,16 +93,140 @@ class Skeleton(object):
     # default matches /my/file.py_tmpl
     templatematch = '_tmpl'
     
-    # list of already handled source, dest tuples
+    # cache of compiled templates, shared process-wide by default. Set to None
+    # to read and compile the template on every render.
+    template_cache = template_cache
+    
+    # the crushinator.framework.engine.TemplateEngine that compiles and 
+    # renders templates. Defaults to string.Template; CompiledEngine keeps
+    # compiled templates on disk between runs.
+    engine = default_engine
+    
+    # path to a journal file. If set, progress is recorded there as the 
+    # Skeleton is processed, so an interrupted run can be resume()'d. Only
+    # for destinations on the local disk (see destfs).
+    journal = None
+    
+    # set to True to only regenerate files whose inputs (the template, the 
+    # params the template uses, or the static source file) have changed since
+    # the last run. Fingerprints are kept in the manifest file. Only for 
+    # destinations on the local disk (see destfs).
+    incremental = False
+    
+    # path to the manifest used by incremental mode. Defaults to 
+    # MANIFEST_NAME inside of the destination directory.
+    manifest = None
+    
+    # how to put non-template files into place. A strategy name, or a sequence
+    # of them to try in order: 'reflink', 'hardlink', 'symlink', or 'copy'. A
+    # plain copy is always the fallback.
+    # @see: crushinator.framework.materialize
+    copy_strategy = 'copy'
+    
+    # dictionary of strategy name: number of files put into place with it
+    copy_stats = None
+    
+    # where the output is written, a crushinator.framework.filesystem.Filesystem.
+    # Defaults to the local disk. See crushinator.framework.archive for tar 
+    # and zip output, MemoryFilesystem to render without touching the disk, and
+    # crushinator.framework.queued for slow network mounts.
+    destfs = local_filesystem
+    
+    # where source is read from, also a Filesystem. Defaults to the local disk.
+    sourcefs = local_filesystem
+    
+    # gitignore-style patterns for source paths to leave out. Ignored 
+    # directories are not walked at all. 
+    # @see: crushinator.framework.ignore.IgnoreRules
+    ignore = DEFAULT_IGNORE
+    
+    # name of a file in the top of the source directory with more ignore 
+    # patterns, None to not look for one
+    ignorefile = IGNORE_FILE
+    
+    # name of the directory in the top of the source directory that holds 
+    # partials, included into templates with ${>name}. It is not copied to 
+    # the destination. None disables includes.
+    # @see: crushinator.framework.partials
+    partials = '_partials'
+    
+    # rendered partials, shared process-wide by default
+    partial_cache = partial_cache
+    
+    # templates larger than this many bytes are rendered a piece at a time,
+    # straight into the destination file, instead of being read into memory
+    # (and the template cache) whole. None disables streaming.
+    stream_threshold = 16 * 1024 * 1024
+    
+    # set to True to leave destination files alone if they already have 
+    # exactly the contents that would be written, so their modification times
+    # don't change. Such files aren't an error when overwrite is off, either.
+    skip_unchanged = False
+    
+    # set to False to skip checking that params has everything the templates
+    # refer to before anything is written. See missing_params().
+    check_params = True
+    
+    # set to True to also check the placeholders in paths (e.g. +name+). Off
+    # by default, since a path placeholder that isn't set is simply left in 
+    # the path.
+    check_path_params = False
+    
+    # number of threads to generate fan-out directories (e.g. +*resources+)
+    # with, one item at a time. None generates the items one after another.
+    # @see: crushinator.framework.conditions
+    fanout_workers = None
+    
+    # dictionary counting the files handled since the last reset():
+    #   written: files that were written
+    #   unchanged: files left alone because their contents were identical
+    #   skipped: files not written because of dryrun or incremental mode
+    write_stats = None
+    
+    # set of already handled source, dest tuples
     _processed = None
     
     # the last handled source, dest tuple
     _lastpair = None
     
+    # SkeletonIndex of the source directory, built on first use
+    _index = None
+    
+    # (key, IgnoreRules) two-tuple, see get_ignore_rules()
+    _ignore = None
+    
+    # PathConditions for the current pathmatch, see get_conditions()
+    _conditions = None
+    
+    # SkeletonAnalysis of the index, see get_analysis()
+    _analysis = None
+    
+    # for a Skeleton generating one item of a fan-out directory: the source
+    # path of the directory, and the directories already fanned out over
+    _subtree = None
+    _fanned = frozenset()
+    
+    # fan-out directories found by the last list_templates()
+    _fanouts = None
+    
+    # the open Journal, if the journal setting is used
+    _journal = None
+    
+    # the loaded Manifest, if the incremental setting is used
+    _manifest = None
+    
+    # PathPlan for the current params, built on first use
+    _pathplan = None
+    
+    # guards the statistics counters, which are updated by process() threads
+    _stats_lock = threading.Lock()
+    
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
         
-        self._processed = []
+        self._processed = set()
+        self.copy_stats = {}
+        self.write_stats = {'written': 0, 'unchanged': 0, 'skipped': 0}
     
     def render_template(self, template_path):
         """
@@ -69,11 +245,165 @@ class Skeleton(object):
         
         @see: PEP 292 http://www.python.org/dev/peps/pep-0292/ for template syntax.
         """
-        template_data = open(template_path, 'rb').read()
+        template = self.compile_template(template_path)
         
-        template = Template(template_data)
+        parts = self.partials and template_parts(template, self.engine.compile)
+        if not parts:
+            return self.engine.render(template, self.params)
         
-        return template.substitute(self.params)
+        return render_parts(parts, self.params, self.render_partial)
+    
+    def partial_path(self, name):
+        """
+        Return the path to a partial, given the name used to include it.
+        """
+        return os.path.join(self.source, self.partials, name)
+    
+    def render_partial(self, name, stack=()):
+        """
+        Return the partial called name, rendered with self.params. Partials 
+        without includes of their own are only rendered once for each set of 
+        values of the params they use.
+        
+        @param stack: tuple of the names of the partials being rendered, see
+                      crushinator.framework.partials.render_parts()
+        """
+        path = self.partial_path(name)
+        
+        try:
+            template = self.compile_template(path)
+        except (IOError, OSError), e:
+            raise SkeletonIncludeError("Unable to include %s: %s" % (name, e))
+        
+        parts = template_parts(template, self.engine.compile)
+        if parts:
+            return render_parts(parts, self.params, self.render_partial, stack or (name,))
+        
+        cache = self.partial_cache
+        
+        if cache is None:
+            return self.engine.render(template, self.params)
+        
+        rendered = cache.get(path, template, self.params)
+        if rendered is None:
+            rendered = self.engine.render(template, self.params)
+            cache.set(path, template, self.params, rendered)
+        
+        return rendered
+    
+    def compile_template(self, template_path):
+        """
+        Return a compiled template for a template file.
+        
+        @param template_path: a path to a template file
+        @return: the compiled template, from self.engine (a string.Template
+                 instance by default)
+        
+        @see: crushinator.framework.templatecache.TemplateCache
+        """
+        if self.template_cache is not None:
+            if self.template_cache.validate:
+                entry = self._current_entry(template_path)
+            else:
+                entry = self._index_entry(template_path)
+            if entry is not None:
+                return self.template_cache.get(template_path, (entry.mtime, entry.size), 
+                                               self.sourcefs, self.engine)
+            else:
+                return self.template_cache.get(template_path, fs=self.sourcefs, engine=self.engine)
+        
+        template_file = self.sourcefs.open(template_path, 'rb')
+        try:
+            return self.engine.compile(template_file.read())
+        finally:
+            template_file.close()
+    
+    def fingerprint(self, source):
+        """
+        Return a string identifying all of the inputs that go into the output
+        for the source file, used by incremental mode.
+        
+        For templates, this is the template text and the values of the params
+        the template refers to. For other files, it's the size and 
+        modification time of the file.
+        """
+        digest = hashlib.sha1()
+        
+        if self.is_template(source):
+            digest.update('template\0')
+            
+            # so the analysis is redone if the template changed
+            self._current_entry(source)
+            
+            if self.should_stream(source):
+                template_file = self.sourcefs.open(source, 'rb')
+                try:
+                    for piece in template_chunks(template_file):
+                        digest.update(piece)
+                finally:
+                    template_file.close()
+            else:
+                template = self.compile_template(source)
+                digest.update(template.template)
+                
+                # included partials are inputs too
+                for part in (self.partials and template_parts(template, self.engine.compile)) or ():
+                    if isinstance(part, basestring):
+                        digest.update('\0%s\0' % (part))
+                        digest.update(self.render_partial(part, (part,)))
+            
+            names = self.get_analysis().get(source).template
+            if names is None:
+                # not part of the source directory
+                names = self.template_names(source)
+            
+            for name in sorted(names):
+                digest.update('\0%s=%r' % (name, self.params.get(name)))
+        else:
+            entry = self._current_entry(source)
+            if entry is not None:
+                size, mtime = entry.size, entry.mtime
+            else:
+                info = self.sourcefs.stat(source)
+                size, mtime = info.st_size, info.st_mtime
+            
+            digest.update('static\0%s\0%r' % (size, mtime))
+        
+        return digest.hexdigest()
+    
+    def should_stream(self, template_path):
+        """
+        Return True if a template is big enough (see stream_threshold) that it
+        should be rendered with stream_template() rather than render_template().
+        """
+        if self.stream_threshold is None:
+            return False
+        
+        entry = self._index_entry(template_path)
+        if entry is not None:
+            size = entry.size
+        else:
+            size = self.sourcefs.getsize(template_path)
+        
+        return size > self.stream_threshold
+    
+    def stream_template(self, template_path, destfile):
+        """
+        Render a template file into destfile, a piece at a time. Peak memory
+        use doesn't depend on the size of the template (as long as the engine
+        supports streaming, as the built-in engines do).
+        
+        @param template_path: a path to a template file
+        @param destfile: file-like object, opened for writing
+        
+        @see: crushinator.framework.streaming
+        @see: crushinator.framework.engine.TemplateEngine.stream()
+        """
+        template_file = self.sourcefs.open(template_path, 'rb')
+        try:
+            self.engine.stream(template_file, destfile, self.params)
+        finally:
+            template_file.close()
     
     def is_template(self, path):
         """
@@ -82,25 +412,226 @@ class Skeleton(object):
         By default this means it's not a directory, and it ends with
         self.templatematch
         """
-        if os.path.isdir(path):
+        entry = self._index_entry(path)
+        if entry is not None:
+            return entry.template
+        
+        if self.sourcefs.isdir(path):
             return False
         
-        parts = path.rpartition(self.templatematch)
+        return is_template_name(path, self.templatematch)
+    
+    def get_index(self, refresh=False):
+        """
+        Return a SkeletonIndex of the source directory. The index is built the 
+        first time it's needed, and reused after that.
         
-        if parts[:2] == ('',''):
-            return False
-        else:
-            return True
+        @param refresh: boolean, if True, re-scan the source directory
+        """
+        index = self._index
+        fs = self._index_fs()
+        
+        if refresh:
+            self._ignore = None
+        
+        ignore = self.get_ignore_rules()
+        
+        conditions = self.get_conditions()
+        
+        if refresh or index is None or index.root != self.source \
+           or index.templatematch != self.templatematch or index.fs is not fs \
+           or index.ignore is not ignore or index.conditional is not conditions:
+            index = self._index = SkeletonIndex(self.source, self.templatematch, fs, 
+                                                ignore, conditions)
+        
+        return index
+    
+    def get_analysis(self):
+        """
+        Return the SkeletonAnalysis of the source directory: the params each
+        path and template refers to. Paths are analyzed when they're first 
+        asked about, and the results are kept until the index is rebuilt.
+        """
+        index = self.get_index()
+        analysis = self._analysis
+        
+        if analysis is None or analysis.index is not index or analysis.pathmatch != self.pathmatch:
+            analysis = self._analysis = SkeletonAnalysis(index, self.pathmatch, self.template_names)
+        
+        return analysis
+    
+    def template_names(self, template_path, stack=()):
+        """
+        Return the set of params a template refers to, including those of 
+        the partials it includes.
+        """
+        if self.should_stream(template_path):
+            names = set()
+            template_file = self.sourcefs.open(template_path, 'rb')
+            try:
+                for piece in template_chunks(template_file):
+                    names.update(template_identifiers(Template(piece)))
+            finally:
+                template_file.close()
+            return names
+        
+        template = self.compile_template(template_path)
+        names = template_identifiers(template)
+        
+        for part in (self.partials and template_parts(template, self.engine.compile)) or ():
+            if isinstance(part, basestring):
+                if part in stack:
+                    raise SkeletonIncludeError("Include loop: %s" % (' -> '.join(stack + (part,))))
+                try:
+                    names.update(self.template_names(self.partial_path(part), stack + (part,)))
+                except (IOError, OSError), e:
+                    raise SkeletonIncludeError("Unable to include %s: %s" % (part, e))
+        
+        return names
+    
+    def missing_params(self):
+        """
+        Return a dictionary of the params that the templates that would be 
+        generated refer to (and their paths, if check_path_params is set), but
+        that aren't set, mapped to a sorted list of the source paths that use
+        them. Empty if nothing is missing.
+        
+        Excluded conditional subtrees aren't checked (or walked); fan-outs 
+        are checked once per item.
+        """
+        analysis = self.get_analysis()
+        missing = {}
+        
+        for entry in self._included_entries():
+            if entry.template:
+                # re-analyzed if the template changed since it was indexed
+                self._current_entry(entry.path)
+            
+            if self.check_path_params:
+                required = analysis.required(entry.path)
+            else:
+                required = analysis.get(entry.path).template or ()
+            
+            for name in required:
+                if name not in self.params:
+                    missing.setdefault(name, set()).add(entry.path)
+        
+        for path in self._fanouts:
+            for child in self._fanout_children(path):
+                for name, paths in child.missing_params().iteritems():
+                    missing.setdefault(name, set()).update(paths)
+        
+        return dict((name, sorted(paths)) for name, paths in missing.iteritems())
+    
+    def check_missing_params(self):
+        """
+        Raise SkeletonMissingParams (a KeyError) if missing_params() finds 
+        anything.
+        """
+        missing = self.missing_params()
+        
+        if missing:
+            raise SkeletonMissingParams(missing)
+    
+    def get_conditions(self):
+        """
+        Return the PathConditions used to find conditional files and 
+        directories (e.g. docs+?with_docs+), built once per pathmatch.
+        
+        @see: crushinator.framework.conditions
+        """
+        conditions = self._conditions
+        
+        if conditions is None or conditions.pathmatch != self.pathmatch:
+            conditions = self._conditions = PathConditions(self.pathmatch)
+        
+        return conditions
+    
+    def get_ignore_rules(self):
+        """
+        Return the compiled IgnoreRules for ignore and ignorefile, or None if
+        there aren't any. The rules are compiled once, and reused until ignore,
+        ignorefile or the source change.
+        """
+        # the key holds on to sourcefs, so its id() can't be reused by another
+        key = (self.source, self.sourcefs, tuple(self.ignore or ()), self.ignorefile, 
+               self.partials)
+        
+        if self._ignore is None or self._ignore[0] != key:
+            patterns = list(self.ignore or ())
+            if self.partials:
+                patterns.append('/%s/' % (self.partials))
+            
+            if not patterns and not self.ignorefile:
+                rules = None
+            else:
+                rules = IgnoreRules.load(self.source, patterns, self.ignorefile, 
+                                         self._index_fs())
+            self._ignore = (key, rules)
+        
+        return self._ignore[1]
+    
+    def _index_fs(self):
+        """
+        The Filesystem to build the index with - None for the local disk.
+        """
+        if isinstance(self.sourcefs, LocalFilesystem):
+            return None
+        
+        return self.sourcefs
+    
+    def _index_entry(self, path):
+        """
+        Return the index entry for a source path, or None if the path isn't
+        part of the source directory (or the index hasn't been built yet).
+        """
+        if self._index is None:
+            return None
+        
+        return self._index.get(path)
+    
+    def _current_entry(self, path):
+        """
+        Like _index_entry(), but an entry for a file that changed since the 
+        index was built is brought up to date. Each file is stat'ed again once
+        per run, see SkeletonIndex.refresh().
+        """
+        if self._index is None:
+            return None
+        
+        return self._index.refresh(path)
+    
+    def source_type(self, source):
+        """
+        Return 'dir', 'file', or None if source is neither. Uses the index
+        when possible, so the source is not stat'ed again.
+        """
+        entry = self._index_entry(source)
+        
+        if entry is not None:
+            return entry.isdir and 'dir' or 'file'
+        elif self.sourcefs.isdir(source):
+            return 'dir'
+        elif self.sourcefs.isfile(source):
+            return 'file'
+        
+        return None
     
     def render_path(self, path):
         """
         Given a path, replace all variables. Return the result.
         
         This will do the substitution, and chop off the _tmpl bits.
+        
+        All of the placeholders are replaced in a single pass, by a PathPlan 
+        that is rebuilt when a different params dictionary is assigned, or 
+        (at the start of a run) when the values in params have changed.
         """
-        translated = path
-        for key, val in self.params.iteritems():
-            translated = translated.replace(self.pathmatch % (key), val)
+        plan = self._pathplan
+        if plan is None or not plan.matches(self.params, self.pathmatch):
+            plan = self._pathplan = PathPlan(self.params, self.pathmatch)
+        
+        translated = plan.render(path)
         
         template_stripped = translated.rpartition(self.templatematch)
         if template_stripped[:2] == ('',''):
@@ -126,26 +657,89 @@ class Skeleton(object):
         Note: variable substitution will happen in the process() method below -
         NOT HERE. This way errors in translation will be caught when they can
         be recovered from.
-        """
-        # this gets the base paths
-        paths = listpaths(self.source)
         
-        for s in paths:
+        Conditional paths (see crushinator.framework.conditions) are checked 
+        against params here. Excluded directories are skipped along with 
+        everything in them, and are only walked once a Skeleton needs them.
+        
+        Fan-out files and directories are skipped too, and generated 
+        afterwards, see _run_fanouts().
+        """
+        for entry in self._included_entries():
+            s = entry.path
             pair = (s, self.destpath(s))
             if pair not in self._processed:
                 yield pair
             else:
                 logger.debug("%s has already been processed" % (s))
     
+    def _included_entries(self):
+        """
+        Generator; the index entries this Skeleton generates with its current 
+        params, see list_templates(). Conditional directories that are 
+        included are walked as they're reached.
+        
+        Sets self._fanouts to the fan-out paths that were found.
+        """
+        index = self.get_index()
+        conditions = self.get_conditions()
+        excluded = []
+        self._fanouts = []
+        
+        if self._subtree is None:
+            entries = index
+        else:
+            entries = index.subtree(self._subtree)
+        
+        for entry in entries:
+            s = entry.path
+            
+            if excluded and [e for e in excluded if s.startswith(e)]:
+                continue
+            
+            name = os.path.basename(s)
+            
+            if not conditions.included(name, self.params):
+                logger.debug("Conditions for %s are not met" % (s))
+                if entry.isdir:
+                    excluded.append(s + os.sep)
+                continue
+            
+            if s not in self._fanned and conditions.fanout(name):
+                logger.debug("%s fans out, deferring" % (s))
+                self._fanouts.append(s)
+                if entry.isdir:
+                    excluded.append(s + os.sep)
+                continue
+            
+            if entry.isdir and s in index.deferred:
+                index.expand(s)
+            
+            yield entry
+    
     
-    def create_dest_dir(self, dest):
+    def _source_mode(self, source):
+        """
+        Return the st_mode of a source path, from the index if possible.
+        """
+        entry = self._index_entry(source)
+        if entry is not None:
+            return entry.mode
+        
+        return self.sourcefs.stat(source).st_mode
+    
+    def create_dest_dir(self, dest, mode=None):
         """
         Creates a destination directory. 
         
+        @param mode: permission bits for the new directory, if the destination
+                     filesystem supports them
         @return: boolean, true if the file is created, false if not (note that
                  a false return value may not mean an error condition)
         """
-        if os.path.exists(dest):
+        destfs = self.destfs
+        
+        if destfs.exists(dest):
             logger.debug('Directory %s already exists. Skipping' % (dest))
             return False
         else:
@@ -155,15 +749,15 @@ class Skeleton(object):
                 logger.warn('dryrun detected, %s not created' % (dest))
                 return False
             
-            os.makedirs(dest)
-            if os.path.exists(dest):
+            destfs.makedirs(dest, mode)
+            if destfs.exists(dest):
                 logger.debug('%s created successfully' % (dest))
                 return True
             
             return False
             
          
-    def _write_dest_file(self, source, dest):
+    def _write_dest_file(self, source, dest, content=None):
         """
         Helper method for write_dest_file(). Does the actual writing of the file.
         
@@ -171,22 +765,144 @@ class Skeleton(object):
         """
         if self.dryrun:
             logger.debug('DRYRUN: Skipping %s.' % (dest))
+            self._count(self.write_stats, 'skipped')
             return
         
         # if the source file ends in _tmpl, it needs to be processed.
         if self.is_template(source):
             logger.debug('Parsing %s as a template' % (source))
             logger.debug('Writing %s to %s' % (source, dest))
-            destfile = open(dest, 'wb')
-            destfile.write(self.render_template(dest))
+            if content is None and self.should_stream(source):
+                if self.skip_unchanged and self._unchanged_stream(source, dest):
+                    return
+                
+                logger.debug('Streaming %s' % (source))
+                destfile = self.destfs.open(dest, 'wb', self._source_mode(source))
+                try:
+                    self.stream_template(source, destfile)
+                finally:
+                    destfile.close()
+                self._count(self.write_stats, 'written')
+                return
+            
+            if content is None:
+                content = self.render_template(source)
+            
+            if self.skip_unchanged and self._unchanged_content(dest, content):
+                return
+            
+            destfile = self.destfs.open(dest, 'wb', self._source_mode(source))
+            destfile.write(content)
             destfile.close()
+            self._count(self.write_stats, 'written')
         # otherwise, just copy it.
         else:
             logger.debug('%s is not a template file.' % (source))
+            
+            if self.skip_unchanged and self._unchanged_file(source, dest):
+                return
+            
             logger.debug('Copying %s to %s' % (source, dest))
-            shutil.copyfile(source, dest)
+            
+            preferred = self.copy_strategy
+            if isinstance(preferred, basestring):
+                preferred = (preferred,)
+            
+            used = self.destfs.copyfile(source, dest, self._source_mode(source), tuple(preferred),
+                                        self.sourcefs)
+            logger.debug('%s put into place with %s' % (dest, used))
+            
+            self._count(self.copy_stats, used)
+            self._count(self.write_stats, 'written')
     
-    def write_dest_file(self, source, dest, overwrite=False):
+    def _existing_size(self, dest):
+        """
+        Return the size of dest, or None if it doesn't exist.
+        """
+        try:
+            return self.destfs.getsize(dest)
+        except OSError:
+            return None
+    
+    def _unchanged(self, dest, same):
+        """
+        Count and log dest as unchanged, if same is True. Returns same.
+        """
+        if same:
+            logger.debug('%s already has the same contents. Leaving it alone.' % (dest))
+            self._count(self.write_stats, 'unchanged')
+        return same
+    
+    def _unchanged_content(self, dest, content):
+        """
+        Return True if dest exists and contains exactly content. Compares sizes
+        first, so most changed files are caught without reading them.
+        """
+        if self._existing_size(dest) != len(content):
+            return False
+        
+        return self._unchanged(dest, self.destfs.digest(dest) == hashlib.sha1(content).hexdigest())
+    
+    def _unchanged_stream(self, source, dest):
+        """
+        Like _unchanged_content(), for a template that is streamed: the 
+        template is rendered into a digest, not into memory.
+        """
+        size = self._existing_size(dest)
+        if size is None:
+            return False
+        
+        rendered = DigestWriter()
+        self.stream_template(source, rendered)
+        
+        if rendered.size != size:
+            return False
+        
+        return self._unchanged(dest, self.destfs.digest(dest) == rendered.hexdigest())
+    
+    def _unchanged_file(self, source, dest):
+        """
+        Return True if dest exists and has the same contents as source.
+        """
+        size = self._existing_size(dest)
+        if size is None:
+            return False
+        
+        entry = self._index_entry(source)
+        if entry is not None:
+            source_size = entry.size
+        else:
+            source_size = self.sourcefs.getsize(source)
+        
+        if size != source_size:
+            return False
+        
+        return self._unchanged(dest, self.destfs.digest(dest) == self.sourcefs.digest(source))
+    
+    def _same_output(self, source, dest, content=None):
+        """
+        Return True (and count dest as unchanged) if dest already has exactly
+        the contents source would be written with. See skip_unchanged.
+        """
+        if not self.is_template(source):
+            return self._unchanged_file(source, dest)
+        
+        if content is None and self.should_stream(source):
+            return self._unchanged_stream(source, dest)
+        
+        if content is None:
+            content = self.render_template(source)
+        
+        return self._unchanged_content(dest, content)
+    
+    def _count(self, stats, key):
+        """
+        Increment a statistics counter.
+        """
+        with self._stats_lock:
+            stats[key] = stats.get(key, 0) + 1
+    
+    def write_dest_file(self, source, dest, overwrite=False, content=None, checked=None):
         """
         Parses a template file and puts its contents into place in the
         destination directory.
@@ -195,17 +911,89 @@ class Skeleton(object):
         
         @param source: string, path to a template
         @param dest: string, destination path
-        @param overwrite: boolean, if True, will overwrite an existing file. If false, raises SkeletonFileExists.
+        @param overwrite: boolean, if True, will overwrite an existing file. If false, raises SkeletonFileExists
+                          (unless skip_unchanged is set and the file is unchanged).
+        @param content: string, the already-rendered template, if it has been
+                        rendered elsewhere (see process()). Ignored for 
+                        non-template files.
+        @param checked: the result of _check_fingerprint() for source and dest,
+                        if it has already been called (see process())
         """
-        if os.path.exists(dest):
+        fingerprint = None
+        
+        if self.incremental:
+            if checked is None:
+                checked = self._check_fingerprint(source, dest)
+            unchanged, fingerprint, generated = checked
+            
+            if unchanged:
+                logger.debug('%s is unchanged since the last run. Skipping.' % (dest))
+                self._count(self.write_stats, 'skipped')
+                return
+            
+            # files we generated last time are ours to replace
+            overwrite = overwrite or generated
+        
+        if self.destfs.exists(dest):
             if overwrite:
                 logger.debug('Overwriting %s.' % (dest))
-                self._write_dest_file(source, dest)
+                self._write_dest_file(source, dest, content)
+            elif self.skip_unchanged and self._same_output(source, dest, content):
+                pass
             else:
                 logger.debug('Overwrite is False. Raising exception for %s.' % (dest))
                 raise SkeletonFileExists(dest)
         else:
-             self._write_dest_file(source, dest)   
+             self._write_dest_file(source, dest, content)
+        
+        if fingerprint is not None and not self.dryrun:
+            self.get_manifest().set(self._manifest_key(dest), fingerprint, 
+                                    self.destfs.digest(dest))
+    
+    def get_manifest(self):
+        """
+        Return the Manifest for incremental mode, loading it if needed.
+        """
+        if self._manifest is None:
+            path = self.manifest or os.path.join(self.dest, MANIFEST_NAME)
+            self._manifest = Manifest(path)
+        
+        return self._manifest
+    
+    def _manifest_key(self, dest):
+        return os.path.relpath(dest, self.dest)
+    
+    def _check_fingerprint(self, source, dest):
+        """
+        Compare the current fingerprint of source with the one recorded for
+        dest on the last run.
+        
+        A generated file that has been edited since (its contents no longer 
+        match the digest in the manifest) isn't counted as generated, so it 
+        isn't replaced unless overwrite is set.
+        
+        @return: (unchanged, fingerprint, generated) three-tuple: True if dest
+                 doesn't need to be written again, the current fingerprint, and
+                 True if dest was generated by an earlier run, still exists,
+                 and hasn't been edited.
+        """
+        fingerprint = self.fingerprint(source)
+        manifest = self.get_manifest()
+        key = self._manifest_key(dest)
+        previous = manifest.get(key)
+        
+        generated = previous is not None and self.destfs.exists(dest)
+        
+        if generated and previous == fingerprint:
+            return True, fingerprint, True
+        
+        if generated:
+            digest = manifest.digest(key)
+            if digest is not None and self.destfs.digest(dest) != digest:
+                logger.warn('%s was edited since it was generated. Not replacing it.' % (dest))
+                generated = False
+        
+        return False, fingerprint, generated
     
     def source_to_dest_path(self, source, dest, overwrite=False):
         """
@@ -222,28 +1010,495 @@ class Skeleton(object):
         
         dest = self.render_path(dest)
         
-        if os.path.isdir(source):
-            self.create_dest_dir(dest)
-        elif os.path.isfile(source):
+        kind = self.source_type(source)
+        
+        if kind == 'dir':
+            self.create_dest_dir(dest, self._source_mode(source))
+        elif kind == 'file':
             self.write_dest_file(source, dest, overwrite)
         else:
             logger.debug("%s is neither a file or directory" % (source))
     
 
     
+    def _begin(self, revalidate=True):
+        """
+        Called before processing any templates. Starts the journal, if one is
+        configured and it hasn't been started (or resumed) already.
+        
+        Checks params (see check_params) and the destination (see 
+        _check_local_dest()) before anything else is done.
+        
+        Starts a new run for the index, so source files edited since the 
+        last run are stat'ed again (once each) when they're used, unless 
+        revalidate is False (e.g. for each parameter set of render_many(), 
+        which starts one for the whole batch).
+        
+        Also creates the destination directory, since the first path written
+        isn't necessarily a directory (e.g. when a conditional directory is 
+        excluded, or a directory name is nothing but a condition marker).
+        """
+        self._check_local_dest()
+        
+        # templates changed since the last run are picked up once, here
+        if revalidate and self._index is not None:
+            self._index.revalidate()
+        
+        # params may have been changed in place since the plan was built
+        plan = self._pathplan
+        if plan is not None and not plan.current():
+            self._pathplan = None
+        
+        if self.check_params:
+            self.check_missing_params()
+        
+        if self.journal and self._journal is None:
+            self._journal = Journal(self.journal)
+            self._journal.start(self.source, self.dest, self.get_index())
+        
+        self.create_dest_dir(self.dest)
+    
+    def _check_local_dest(self):
+        """
+        Raise ValueError if the journal or incremental mode are used with a
+        destination that isn't on the local disk (see Filesystem.is_local). 
+        The journal and the manifest are plain files, kept next to the 
+        output, and resuming or comparing against an earlier run needs the 
+        earlier output to still be there.
+        """
+        if self.destfs.is_local:
+            return
+        
+        for setting in ('journal', 'incremental'):
+            if getattr(self, setting):
+                raise ValueError("%s can't be used with a %s destination, only the local disk"
+                                 % (setting, type(self.destfs).__name__))
+    
+    def _save_manifest(self):
+        """
+        Save the manifest, if incremental mode loaded one. Called whether or
+        not the run succeeded, so the files that were written are known to 
+        the next run.
+        """
+        if self._manifest is not None and not self.dryrun:
+            self._manifest.save()
+    
+    def _finish(self):
+        """
+        Called after all templates have been processed.
+        """
+        if self._journal is not None:
+            self._journal.finish()
+            self._journal = None
+    
+    def _mark_processed(self, pair):
+        """
+        Record that a source, dest pair has been handled.
+        """
+        self._processed.add(pair)
+        
+        if self._journal is not None:
+            entry = self._index_entry(pair[0])
+            if entry is not None:
+                relpath = entry.relpath
+            else:
+                relpath = os.path.relpath(pair[0], self.source)
+            self._journal.record(relpath)
+    
     def __iter__(self):
+        self._begin()
+        
+        try:
+            for source, dest in self.list_templates():
+                self._lastpair = (source, dest)
+                self.source_to_dest_path(source, dest)
+                self._mark_processed((source, dest))
+                yield (source, dest)
+            
+            for pair in self._run_fanouts():
+                yield pair
+        finally:
+            self._save_manifest()
+        
+        self._finish()
+    
+    def _fanout_children(self, path):
+        """
+        Generator; a Skeleton for each item of the list param that the 
+        file or directory at path fans out over. Each shares this Skeleton's index,
+        template cache, and destination.
+        """
+        name = self.get_conditions().fanout(os.path.basename(path))
+        
+        for item in self.params.get(name) or ():
+            params = dict(self.params)
+            params[name] = item
+            
+            child = self.clone(params=params, journal=None, _subtree=path, 
+                               _fanned=self._fanned | set([path]))
+            
+            if self.incremental:
+                child._manifest = self.get_manifest()
+            
+            yield child
+    
+    def _run_subtree(self, overwrite=False):
+        """
+        Generate the fan-out item this Skeleton was made for (see 
+        _fanout_children()), and any fan-outs nested in it. Returns the list 
+        of (source, dest) pairs.
+        """
+        pairs = []
+        
         for source, dest in self.list_templates():
             self._lastpair = (source, dest)
-            self.source_to_dest_path(source, dest)
-            self._processed.append((source, dest))
-            yield (source, dest)
+            self.source_to_dest_path(source, dest, overwrite)
+            self._mark_processed((source, dest))
+            pairs.append((source, dest))
+        
+        pairs.extend(self._run_fanouts(overwrite))
+        
+        return pairs
+    
+    def _run_fanouts(self, overwrite=False):
+        """
+        Generator; generate the fan-out files and directories found by the last
+        list_templates(), once per item, in a pool of fanout_workers threads
+        if it's set. Yields the (source, dest) pairs of every item; these 
+        repeat from item to item, since the source paths are the same.
+        
+        Once every item of a fan-out is done, its pairs are marked as processed
+        (and journaled) here, so resume() skips the whole fan-out. A fan-out 
+        that was interrupted part way through is generated again.
+        """
+        for path in self._fanouts or ():
+            if (path, self.destpath(path)) in self._processed:
+                logger.debug("%s has already been processed" % (path))
+                continue
+            
+            children = list(self._fanout_children(path))
+            run = lambda child: (child, child._run_subtree(overwrite))
+            
+            if self.fanout_workers and len(children) > 1:
+                pool = ThreadPool(self.fanout_workers)
+                try:
+                    results = list(pool.imap(run, children))
+                finally:
+                    pool.terminate()
+            else:
+                results = imap(run, children)
+            
+            done = []
+            for child, pairs in results:
+                self._merge_stats(child)
+                for pair in pairs:
+                    done.append(pair)
+                    yield pair
+            
+            for pair in done:
+                if pair not in self._processed:
+                    self._mark_processed(pair)
+    
+    def _merge_stats(self, child):
+        """
+        Add the statistics from a fan-out child to this Skeleton's.
+        """
+        with self._stats_lock:
+            for stats, more in ((self.copy_stats, child.copy_stats), 
+                                (self.write_stats, child.write_stats)):
+                for key, value in more.iteritems():
+                    stats[key] = stats.get(key, 0) + value
+    
+    def resume(self):
+        """
+        Continue a run that was interrupted, using the journal. The source
+        directory is not walked again, and files that were completed are not
+        rendered again.
+        
+        Returns an iterator, just like iterating over the Skeleton.
+        
+        Raises SkeletonJournalError if there is no usable journal.
+        """
+        if not self.journal:
+            raise SkeletonJournalError("No journal configured for this Skeleton")
+        
+        self._check_local_dest()
+        
+        self._journal = Journal(self.journal)
+        index, done, finished = self._journal.load(self.source, self.dest, self.templatematch)
+        
+        # the journaled index was already filtered, and may not have been
+        # expanded
+        index.ignore = self.get_ignore_rules()
+        index.defer_unexpanded(self.get_conditions())
+        self._index = index
+        self._processed = set()
+        for relpath in done:
+            source = os.path.join(self.source, relpath)
+            self._processed.add((source, self.destpath(source)))
+        
+        logger.debug('Resuming from %s, %s of %s paths already done' 
+                     % (self.journal, len(self._processed), len(index)))
+        
+        if finished:
+            self._journal.close()
+            self._journal = None
+            return iter([])
+        
+        return iter(self)
+        
+    def _render_safely(self, source):
+        """
+        Render a template, returning a (content, error) two-tuple instead of 
+        raising, so failures can be handed back from a worker pool.
+        """
+        try:
+            return self.render_template(source), None
+        except Exception:
+            return None, sys.exc_info()
+    
+    def _write_safely(self, task):
+        """
+        Write a single file for process(). task is a (source, dest, content, 
+        error, overwrite, checked) tuple; returns the exc_info of any failure,
+        or None.
+        """
+        source, dest, content, error, overwrite, checked = task
+        
+        if error is not None:
+            return error
+        
+        try:
+            self.write_dest_file(source, dest, overwrite, content, checked)
+        except Exception:
+            return sys.exc_info()
+    
+    def _pools(self, executor, workers):
+        """
+        Return a (render pool, write pool) two-tuple for process().
+        """
+        if executor == 'process':
+            render_pool = multiprocessing.Pool(workers, _init_render_worker, (self,))
+        elif executor == 'thread':
+            render_pool = ThreadPool(workers)
+        else:
+            raise ValueError("Unknown executor %r, expected 'thread' or 'process'" % (executor))
+        
+        return render_pool, ThreadPool(workers)
+    
+    def process(self, executor='thread', workers=None, overwrite=False):
+        """
+        Generator; concurrent version of iterating over the Skeleton.
+        
+        Directories are created first, in order. Templates are then rendered in
+        a pool of workers, and files are written by a pool of threads as soon as 
+        their contents are ready.
+        
+        Yields the same (source, dest) tuples as __iter__(), although files may 
+        be reported in a different order than the directories they belong to.
+        
+        If a file fails, the rest of the files are still written and reported, 
+        then the first error is raised, and retry() will work on the file that
+        failed.
+        
+        @param executor: string, 'thread' to render templates in a pool of 
+                         threads, or 'process' to render them in a pool of 
+                         processes (useful for CPU-bound template engines).
+        @param workers: integer, size of each pool. Defaults to the number of
+                        CPUs.
+        @param overwrite: boolean, passed to write_dest_file()
+        """
+        self._begin()
+        
+        try:
+            for pair in self._process(executor, workers, overwrite):
+                yield pair
+        finally:
+            self._save_manifest()
+        
+        self._finish()
+    
+    def _process(self, executor, workers, overwrite):
+        """
+        Generator; the body of process(), between _begin() and _finish().
+        """
+        files = []
+        
+        for source, dest in self.list_templates():
+            target = self.render_path(dest)
+            kind = self.source_type(source)
+            
+            if kind == 'dir':
+                self._lastpair = (source, dest)
+                self.create_dest_dir(target, self._source_mode(source))
+                self._mark_processed((source, dest))
+                yield (source, dest)
+            elif kind == 'file':
+                checked = None
+                if self.incremental:
+                    # passed on to write_dest_file(), so it isn't done twice
+                    checked = self._check_fingerprint(source, target)
+                
+                if checked is not None and checked[0]:
+                    logger.debug('%s is unchanged since the last run. Skipping.' % (target))
+                    self._count(self.write_stats, 'skipped')
+                    self._mark_processed((source, dest))
+                    yield (source, dest)
+                    continue
+                
+                # big templates are streamed by the writer instead
+                prerender = self.is_template(source) and not self.should_stream(source)
+                files.append((source, dest, target, prerender, checked))
+            else:
+                logger.debug("%s is neither a file or directory" % (source))
+        
+        if not files:
+            for pair in self._run_fanouts(overwrite):
+                yield pair
+            return
         
+        render_pool, write_pool = self._pools(executor, workers)
+        
+        if executor == 'process':
+            render = _render_in_worker
+        else:
+            render = self._render_safely
+        
+        try:
+            rendered = render_pool.imap(render, [f[0] for f in files if f[3]])
+            
+            def tasks():
+                for source, dest, target, prerender, checked in files:
+                    if prerender:
+                        content, error = rendered.next()
+                    else:
+                        content, error = None, None
+                    yield (source, target, content, error, overwrite, checked)
+            
+            results = write_pool.imap(self._write_safely, tasks())
+            
+            failed = None
+            for (source, dest, target, prerender, checked), error in izip(files, results):
+                if error is None:
+                    self._mark_processed((source, dest))
+                    yield (source, dest)
+                elif failed is None:
+                    failed = ((source, dest), error)
+        finally:
+            render_pool.terminate()
+            write_pool.terminate()
+        
+        if failed is not None:
+            self._lastpair, (exc_type, exc_value, exc_tb) = failed
+            raise exc_type, exc_value, exc_tb
+        
+        for pair in self._run_fanouts(overwrite):
+            yield pair
+    
+    def clone(self, **kwargs):
+        """
+        Return a copy of this Skeleton, with fresh processing state, that 
+        shares the source index and template cache with this one.
+        
+        @param kwargs: settings to change on the copy (e.g. params, dest)
+        """
+        self.get_analysis()
+        
+        skeleton = copy.copy(self)
+        skeleton.__dict__.update(kwargs)
+        
+        skeleton._lastpair = None
+        skeleton._journal = None
+        skeleton._manifest = None
+        skeleton.reset()
+        
+        return skeleton
+    
+    def _render_one(self, params, dest_template, overwrite):
+        """
+        Process a single parameter set for render_many(). Returns a BatchResult.
+        """
+        processed = []
+        dest = None
+        
+        try:
+            if callable(dest_template):
+                dest = dest_template(params)
+            else:
+                dest = self.clone(params=params).render_path(dest_template)
+            
+            # journals are per-run, they can't be shared by the batch
+            skeleton = self.clone(params=params, dest=dest, journal=None)
+            
+            # creates dest, after checking params
+            skeleton._begin(revalidate=False)
+            try:
+                for source, target in skeleton.list_templates():
+                    skeleton._lastpair = (source, target)
+                    skeleton.source_to_dest_path(source, target, overwrite)
+                    skeleton._mark_processed((source, target))
+                    processed.append((source, target))
+                processed.extend(skeleton._run_fanouts(overwrite))
+            finally:
+                skeleton._save_manifest()
+            skeleton._finish()
+        except Exception, e:
+            logger.debug('Parameter set for %s failed: %s' % (dest, e))
+            return BatchResult(params, dest, processed, e)
+        
+        return BatchResult(params, dest, processed, None)
+    
+    def render_many(self, param_sets, dest_template, workers=None, overwrite=False):
+        """
+        Generator; render this Skeleton once for each of a number of parameter
+        sets, each into its own destination directory. 
+        
+        The source directory is walked once, and each template is compiled 
+        (and stat'ed and analyzed) once, for the whole batch. 
+        
+        An error in one parameter set doesn't stop the others. Yields a 
+        BatchResult for each parameter set, in order, as soon as it is done.
+        
+        @param param_sets: iterable of params dictionaries
+        @param dest_template: string, destination directory for each parameter
+                              set, with placeholders in the same format as 
+                              file names (e.g. '/projects/+name+'). May also 
+                              be a callable that takes the params and returns
+                              the destination.
+        @param workers: integer, if more than 1, parameter sets are rendered
+                        concurrently in a pool of this many threads.
+        @param overwrite: boolean, passed to write_dest_file()
+        """
+        self.get_index().revalidate()
+        
+        def run(params):
+            return self._render_one(params, dest_template, overwrite)
+        
+        if workers is None or workers <= 1:
+            for params in param_sets:
+                yield run(params)
+            return
+        
+        pool = ThreadPool(workers)
+        try:
+            for result in pool.imap(run, param_sets):
+                yield result
+        finally:
+            pool.terminate()
+    
     def reset(self):
         """
         In the event that you've iterated through all of the templates and
         you want to reset the skeleton.
         """
-        self._processed = []
+        self._processed = set()
+        self._manifest = None
+        self.copy_stats = {}
+        self.write_stats = {'written': 0, 'unchanged': 0, 'skipped': 0}
+        
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
     
     def retry(self, overwrite=True):
         """
@@ -251,9 +1506,10 @@ class Skeleton(object):
         try the last template again, optionally forcing an overwrite.
         """
         self.source_to_dest_path(*self._lastpair, overwrite=overwrite)
+        self._save_manifest()
         
         pair = self._lastpair
-        self._processed.append(pair)
+        self._mark_processed(pair)
         
         self._lastpair = None
         
@@ -0,0 +1,89 @@
+"""
+crushinator.framework.streaming - render PEP 292 templates a piece at a time,
+so very large templates don't have to fit in memory.
+"""
+import re
+
+from string import Template
+
+# how much of a template to read at once
+CHUNK_SIZE = 64 * 1024
+
+def _partial_pattern(template_class):
+    """
+    Return a regular expression matching the text after a delimiter that
+    could still turn into a longer placeholder once more text arrives: a
+    (possibly empty) identifier, or an unclosed brace.
+    """
+    return re.compile(r'(?:%(id)s|\{(?:%(id)s)?)?\Z' % {'id': template_class.idpattern},
+                      re.IGNORECASE)
+
+def _safe_cut(buf, delimiter, partial):
+    """
+    Return the position in buf up to which the text can be rendered on its
+    own, without splitting a placeholder.
+    """
+    last = buf.rfind(delimiter)
+
+    if last == -1:
+        return len(buf)
+
+    if not partial.match(buf, last + len(delimiter)):
+        return len(buf)
+
+    # back up to the start of a run of delimiters, so an escaped delimiter
+    # ($$) is never split either
+    start = last
+    while start >= len(delimiter) and buf[start - len(delimiter):start] == delimiter:
+        start -= len(delimiter)
+
+    return start
+
+def template_chunks(infile, template_class=Template, chunk_size=CHUNK_SIZE):
+    """
+    Generator; read template text from infile, and yield it in pieces that
+    each start and end outside of any placeholder, so each piece can be
+    rendered independently.
+
+    Memory use is bounded by chunk_size plus the length of the longest
+    placeholder.
+
+    @param infile: file-like object, opened for reading
+    @param template_class: string.Template, or a subclass with a different
+                           delimiter or idpattern
+    @param chunk_size: integer, number of bytes to read at a time
+    """
+    delimiter = template_class.delimiter
+    partial = _partial_pattern(template_class)
+    carry = ''
+
+    while True:
+        chunk = infile.read(chunk_size)
+
+        if not chunk:
+            if carry:
+                yield carry
+            return
+
+        buf = carry + chunk
+        cut = _safe_cut(buf, delimiter, partial)
+
+        if cut:
+            yield buf[:cut]
+
+        carry = buf[cut:]
+
+def stream_substitute(infile, outfile, params, template_class=Template, chunk_size=CHUNK_SIZE):
+    """
+    Render the template text in infile with params, writing the result to
+    outfile as it goes. Same semantics as string.Template.substitute(),
+    including KeyError for missing params and ValueError for malformed
+    placeholders (although line numbers in the error are relative to the
+    piece being rendered).
+
+    @param infile: file-like object, opened for reading
+    @param outfile: file-like object, opened for writing
+    @param params: dictionary of template variables
+    """
+    for piece in template_chunks(infile, template_class, chunk_size):
+        outfile.write(template_class(piece).substitute(params))
@@ -0,0 +1,186 @@
+"""
+crushinator.framework.templatecache - process-wide cache of compiled templates.
+"""
+import os, threading, weakref
+
+from collections import OrderedDict
+from string import Template
+
+from crushinator.framework.filesystem import LocalFilesystem, local_filesystem
+
+import logging
+logger = logging.getLogger('crushinator.framework')
+
+class TemplateCache(object):
+    """
+    A bounded, least-recently-used cache of compiled templates.
+
+    Entries are keyed by the absolute path of the template file, along with
+    its modification time and size, so a template that changes on disk is
+    recompiled the next time it is requested. Templates read from a
+    filesystem other than the local disk are also keyed by that filesystem,
+    and templates compiled by a template engine by that engine. These are
+    held by weak references, which only compare equal while the object they
+    refer to is alive, so a new filesystem or engine never picks up the 
+    entries of one that has been garbage collected.
+
+    @ivar maxsize: integer, the maximum number of compiled templates to hold.
+                   None means the cache is unbounded.
+    @ivar validate: boolean, if False, the file is never stat'ed once it has
+                    been compiled. Useful when the template files are known not
+                    to change for the life of the process.
+    @ivar hits: integer, number of lookups served from the cache.
+    @ivar misses: integer, number of lookups that required reading and
+                  compiling the template.
+    @ivar evictions: integer, number of entries dropped to honor maxsize.
+    """
+
+    def __init__(self, maxsize=128, validate=True):
+        self.maxsize = maxsize
+        self.validate = validate
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ref(self, obj):
+        """
+        Return a weak reference to obj for a cache key, or obj itself if it
+        can't be weakly referenced (the cache then keeps it alive).
+        """
+        try:
+            return weakref.ref(obj)
+        except TypeError:
+            return obj
+
+    def _key(self, path, info, fs, fsid, engine):
+        """
+        Build the cache key for path. The first three items identify the file,
+        the rest its version.
+
+        Raises IOError if the file can't be stat'ed, to match the behavior of
+        open().
+        """
+        engineid = engine is not None and self._ref(engine) or None
+
+        if not self.validate:
+            return (fsid, engineid, path)
+
+        if info is not None:
+            return (fsid, engineid, path) + tuple(info)
+
+        try:
+            info = fs.stat(path)
+        except OSError, e:
+            raise IOError(e.errno, e.strerror, path)
+
+        return (fsid, engineid, path, info.st_mtime, info.st_size)
+
+    def _compile(self, path, fs, engine):
+        """
+        Read and compile the template at path.
+        """
+        template_file = fs.open(path, 'rb')
+        try:
+            text = template_file.read()
+        finally:
+            template_file.close()
+
+        if engine is None:
+            return Template(text)
+
+        return engine.compile(text)
+
+    def get(self, path, info=None, fs=None, engine=None):
+        """
+        Return a compiled template for path, reading and compiling the file
+        only if it isn't already cached (or has changed on disk).
+
+        @param path: string, path to a template file
+        @param info: optional (mtime, size) two-tuple for path, if the caller
+                     already knows it (e.g. from a SkeletonIndex). Saves a 
+                     stat() call.
+        @param fs: the Filesystem to read the template from, defaults to the
+                   local disk.
+        @param engine: the crushinator.framework.engine.TemplateEngine to 
+                       compile with. Defaults to plain string.Template.
+        @return: string.Template instance, or the engine's compiled template
+        """
+        if fs is None or isinstance(fs, LocalFilesystem):
+            fs, fsid = local_filesystem, None
+            path = os.path.abspath(path)
+        else:
+            fsid = self._ref(fs)
+
+        key = self._key(path, info, fs, fsid, engine)
+
+        with self._lock:
+            template = self._entries.pop(key, None)
+            if template is not None:
+                # re-insert to mark as most recently used
+                self._entries[key] = template
+                self.hits += 1
+                return template
+
+        logger.debug('Template cache miss for %s' % (path))
+        template = self._compile(path, fs, engine)
+
+        with self._lock:
+            self.misses += 1
+
+            # drop any stale entries for the same file
+            if self.validate:
+                for stale in [k for k in self._entries if k[:3] == key[:3]]:
+                    del self._entries[stale]
+
+            self._entries[key] = template
+
+            while self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return template
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """
+        Return a dictionary of cache statistics.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+def template_identifiers(template):
+    """
+    Return the set of placeholder names a compiled template refers to.
+
+    @param template: string.Template instance
+    """
+    names = set()
+
+    for match in template.pattern.finditer(template.template):
+        name = match.group('named') or match.group('braced')
+        if name is not None:
+            names.add(name)
+
+    return names
+
+# shared by all Skeletons unless they specify their own
+template_cache = TemplateCache()
@@ -0,0 +1,17 @@
+"""
+Helpers shared by the tests
+"""
+from crushinator.framework.filesystem import MemoryFilesystem
+
+class RecordingFilesystem(MemoryFilesystem):
+    """
+    A MemoryFilesystem that records the directories listed with scandir(),
+    in order, in scanned.
+    """
+    def __init__(self):
+        MemoryFilesystem.__init__(self)
+        self.scanned = []
+
+    def scandir(self, path):
+        self.scanned.append(path)
+        return MemoryFilesystem.scandir(self, path)
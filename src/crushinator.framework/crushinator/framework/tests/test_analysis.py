@@ -0,0 +1,175 @@
+"""
+Tests for static placeholder analysis
+"""
+
+import unittest
+
+class TestAnalysis(unittest.TestCase):
+    """
+    Finding the params each path and template refers to
+    """
+    def _sourcefs(self):
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        sourcefs = MemoryFilesystem()
+        sourcefs.add_file('/skel/_partials/header.txt', '# Copyright $author\n')
+        sourcefs.add_file('/skel/+package+/__init__.py_tmpl', '${>header.txt}version = "$version"\n')
+        sourcefs.add_file('/skel/+package+/static.txt', '$not_a_template\n')
+        sourcefs.add_file('/skel/docs+?with_docs+/index.txt_tmpl', '$title\n')
+        sourcefs.add_file('/skel/README.txt_tmpl', '$$escaped ${package}\n')
+
+        return sourcefs
+
+    def _skeleton(self, **params):
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        from crushinator.framework.templatecache import TemplateCache
+        from crushinator.framework.partials import PartialCache
+
+        return Skeleton(source='/skel', dest='/out', params=params,
+                        sourcefs=self._sourcefs(), destfs=MemoryFilesystem(),
+                        template_cache=TemplateCache(), partial_cache=PartialCache())
+
+    def test_analyze(self):
+        """
+        Path placeholders, condition markers and template placeholders
+        (including those in partials) are found for each path
+        """
+        analysis = self._skeleton().get_analysis().analyze()
+
+        init = analysis.get('/skel/+package+/__init__.py_tmpl')
+        self.assertEqual(init.path, frozenset(['package']))
+        self.assertEqual(init.conditions, frozenset())
+        self.assertEqual(init.template, frozenset(['author', 'version']))
+
+        static = analysis.get('/skel/+package+/static.txt')
+        self.assertEqual(static.template, None)
+
+        docs = analysis.get('/skel/docs+?with_docs+')
+        self.assertEqual(docs.path, frozenset())
+        self.assertEqual(docs.conditions, frozenset(['with_docs']))
+
+        self.assertEqual(analysis.required('/skel/README.txt_tmpl'), set(['package']))
+        self.assertEqual(analysis.required('/skel/docs+?with_docs+'), set())
+        self.assertEqual(analysis.names('/skel/docs+?with_docs+'), set(['with_docs']))
+
+    def test_shared(self):
+        """
+        The analysis is kept until the index changes, and shared by clones
+        """
+        skeleton = self._skeleton()
+        analysis = skeleton.get_analysis()
+
+        self.assertTrue(skeleton.get_analysis() is analysis)
+        self.assertTrue(skeleton.clone(params={'a': 1}).get_analysis() is analysis)
+
+        skeleton.pathmatch = '__%s__'
+        self.assertFalse(skeleton.get_analysis() is analysis)
+
+    def test_missing(self):
+        """
+        Missing params are reported with the paths that use them, except in
+        excluded conditional directories
+        """
+        skeleton = self._skeleton(package='pkg')
+
+        self.assertEqual(skeleton.missing_params(),
+                         {'author': ['/skel/+package+/__init__.py_tmpl'],
+                          'version': ['/skel/+package+/__init__.py_tmpl']})
+
+        skeleton = self._skeleton(package='pkg', author='Me', version='1.0', with_docs=True)
+        self.assertEqual(skeleton.missing_params(),
+                         {'title': ['/skel/docs+?with_docs+/index.txt_tmpl']})
+
+    def test_reused(self):
+        """
+        Repeated runs and batches stat each template once per run (or batch),
+        and only analyze templates that changed
+        """
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        skeleton = self._skeleton(package='pkg', author='Me', version='1.0', title='T')
+        sourcefs = skeleton.sourcefs
+        path = '/skel/README.txt_tmpl'
+
+        stats = []
+        def stat(p):
+            stats.append(p)
+            return MemoryFilesystem.stat(sourcefs, p)
+        sourcefs.stat = stat
+
+        analyzed = []
+        template_names = skeleton.template_names
+        def counting(p, stack=()):
+            analyzed.append(p)
+            return template_names(p, stack)
+        skeleton.template_names = counting
+
+        list(skeleton)
+        self.assertEqual((stats.count(path), analyzed.count(path)), (1, 1))
+
+        skeleton.reset()
+        skeleton.dest = '/again'
+        list(skeleton)
+        self.assertEqual((stats.count(path), analyzed.count(path)), (2, 1))
+
+        param_sets = [{'package': name, 'author': 'Me', 'version': '1.0'} for name in 'abc']
+        results = list(skeleton.render_many(param_sets, '/batch/+package+'))
+        self.assertEqual([r.error for r in results], [None] * 3)
+        self.assertEqual((stats.count(path), analyzed.count(path)), (3, 1))
+
+        sourcefs.add_file(path, '$$escaped ${package} ${author}\n')
+        skeleton.reset()
+        skeleton.dest = '/changed'
+        list(skeleton)
+        self.assertEqual((stats.count(path), analyzed.count(path)), (4, 2))
+
+    def test_path_params(self):
+        """
+        Path placeholders are only checked with check_path_params; otherwise 
+        one that isn't set is left in the path
+        """
+        from crushinator.framework.exceptions import SkeletonMissingParams
+
+        skeleton = self._skeleton(package='pkg', author='Me', version='1.0')
+        skeleton.sourcefs.add_file('/skel/notes+draft+.txt', 'notes')
+
+        list(skeleton.process())
+        self.assertEqual(skeleton.destfs.read('/out/notes+draft+.txt'), 'notes')
+
+        skeleton = self._skeleton(package='pkg', author='Me', version='1.0')
+        skeleton.sourcefs.add_file('/skel/notes+draft+.txt', 'notes')
+        skeleton.check_path_params = True
+
+        self.assertEqual(skeleton.missing_params(), {'draft': ['/skel/notes+draft+.txt']})
+        self.assertRaises(SkeletonMissingParams, list, skeleton)
+
+    def test_fail_before_writing(self):
+        """
+        Processing fails before anything is written when params are missing
+        """
+        from crushinator.framework.exceptions import SkeletonMissingParams
+
+        skeleton = self._skeleton(package='pkg', author='Me')
+
+        try:
+            list(skeleton.process())
+        except SkeletonMissingParams, e:
+            self.assertEqual(e.missing.keys(), ['version'])
+            self.assertTrue(isinstance(e, KeyError))
+        else:
+            self.fail('SkeletonMissingParams not raised')
+
+        self.assertFalse(skeleton.destfs.exists('/out'))
+        self.assertEqual(skeleton.destfs._files, {})
+
+    def test_no_check(self):
+        """
+        With check_params off, the first template that needs a missing param
+        fails when it's rendered, after earlier paths were written
+        """
+        skeleton = self._skeleton(package='pkg', author='Me')
+        skeleton.check_params = False
+
+        self.assertRaises(KeyError, list, skeleton.process())
+        self.assertTrue(skeleton.destfs.exists('/out'))
@@ -0,0 +1,89 @@
+"""
+Tests for writing Skeleton output into archives
+"""
+
+import unittest
+
+class TestArchive(unittest.TestCase):
+    """
+    Render the test skeleton into tar and zip archives
+    """
+    def _skeleton(self, destfs):
+        from crushinator.framework.skeleton import Skeleton
+        import os
+        
+        return Skeleton(
+            source=os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates'),
+            dest='/not/a/real/path/project',
+            params={'bar':'myname', 'foo':'dddd', 'baz':'1234'},
+            destfs=destfs,
+        )
+    
+    def test_tar(self):
+        """
+        Render into a tar stream, nothing touches the destination
+        """
+        from crushinator.framework.archive import TarFilesystem
+        from StringIO import StringIO
+        import os, stat, tarfile
+        
+        output = StringIO()
+        
+        with TarFilesystem(output, root='/not/a/real/path') as destfs:
+            list(self._skeleton(destfs))
+        
+        self.assertFalse(os.path.exists('/not/a/real/path'))
+        
+        tar = tarfile.open(fileobj=StringIO(output.getvalue()))
+        members = dict((m.name, m) for m in tar.getmembers())
+        
+        self.assertTrue(members['project'].isdir())
+        self.assertTrue(members['project/dddd/doc'].isdir())
+        self.assertTrue(members['project/dddd/README_1234.txt'].isfile())
+        
+        source = os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates', 'setup.py_tmpl')
+        self.assertEqual(members['project/setup.py'].mode, stat.S_IMODE(os.stat(source).st_mode))
+        
+        self.assertEqual(tar.extractfile('project/setup.py').read(), 
+                         "from someplace import dddd\n\n"
+                         "Some text here, 1234 and some more. $500.00 reward for myname")
+    
+    def test_zip(self):
+        """
+        Render into a zip file
+        """
+        from crushinator.framework.archive import ZipFilesystem
+        from StringIO import StringIO
+        import zipfile
+        
+        output = StringIO()
+        
+        with ZipFilesystem(output) as destfs:
+            list(self._skeleton(destfs))
+        
+        archive = zipfile.ZipFile(StringIO(output.getvalue()))
+        names = archive.namelist()
+        
+        self.assertTrue('not/a/real/path/project/dddd/doc/' in names)
+        self.assertTrue('not/a/real/path/project/dddd/myname.py' in names)
+        self.assertTrue(archive.read('not/a/real/path/project/setup.py').startswith('from someplace import dddd'))
+    
+    def test_exists(self):
+        """
+        Files already written to an archive can't be written again without
+        overwrite
+        """
+        from crushinator.framework.archive import TarFilesystem
+        from crushinator.framework.exceptions import SkeletonFileExists
+        from StringIO import StringIO
+        import os
+        
+        destfs = TarFilesystem(StringIO())
+        skeleton = self._skeleton(destfs)
+        
+        source = os.path.join(skeleton.source, 'setup.py_tmpl')
+        skeleton.write_dest_file(source, '/project/setup.py')
+        
+        self.assertEqual(destfs.getsize('/project/setup.py'), 
+                         len(skeleton.render_template(source)))
+        self.assertRaises(SkeletonFileExists, skeleton.write_dest_file, source, '/project/setup.py')
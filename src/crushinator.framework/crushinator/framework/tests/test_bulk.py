@@ -0,0 +1,155 @@
+"""
+Tests for bulk answer validation
+"""
+
+import unittest
+
+from crushinator.framework.interrogation import Interrogation
+from crushinator.framework.probe import Probe
+from crushinator.framework.exceptions import ProbeValidationError, InterrogationValidation
+
+class Required(Probe):
+    def validate(self):
+        if not self.value:
+            raise ProbeValidationError('%s is required' % (self.name))
+
+class Answers(Interrogation):
+    """
+    At module level, so process pool workers can unpickle it.
+    """
+    author = Required()
+    email = Probe(default='nobody@example.com')
+
+    def validate(self):
+        if self.author.value == self.email.value:
+            raise InterrogationValidation('author and email must differ')
+
+class TestBulk(unittest.TestCase):
+    """
+    Validating streams of answer records
+    """
+    def test_read_jsonl(self):
+        """
+        Records come with their line numbers; bad lines are reported in place
+        """
+        from crushinator.framework.bulk import read_jsonl
+        from StringIO import StringIO
+
+        records = list(read_jsonl(StringIO('{"author": "a"}\n\n{oops\n{"email": "e"}\n')))
+
+        self.assertEqual([line for line, record in records], [1, 3, 4])
+        self.assertEqual(records[0][1], {'author': 'a'})
+        self.assertTrue(isinstance(records[1][1], ValueError))
+
+    def test_read_csv(self):
+        """
+        Empty cells are left out
+        """
+        from crushinator.framework.bulk import read_csv
+        from StringIO import StringIO
+
+        records = list(read_csv(StringIO('author,email\na,\nb,b@example.com\n')))
+
+        self.assertEqual(records, [(2, {'author': 'a'}), (3, {'author': 'b', 'email': 'b@example.com'})])
+
+    def test_validate(self):
+        """
+        Each record gets its values, or all of its errors
+        """
+        from crushinator.framework.bulk import validate_records
+
+        records = [{'author': ' me '}, {'email': 'x'}, {'author': 'same', 'email': 'same'},
+                   {'author': 'me', 'other': 1}, ValueError('bad json'), {'author': 42}]
+        results = list(validate_records(Answers, enumerate(records, 1), batch_size=2))
+
+        self.assertEqual([r.line for r in results], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(results[0].values, {'author': 'me', 'email': 'nobody@example.com'})
+        self.assertEqual(results[0].errors, {})
+        self.assertEqual(results[1].errors, {'author': 'author is required'})
+        self.assertEqual(results[1].values, None)
+        self.assertEqual(results[2].errors, {None: 'author and email must differ'})
+        self.assertEqual(results[3].errors, {'other': 'No such probe'})
+        self.assertEqual(results[4].errors.keys(), [None])
+        self.assertEqual(results[5].values['author'], u'42')
+
+    def test_nested(self):
+        """
+        Probes of nested Interrogations are answered from the record too
+        """
+        from crushinator.framework.bulk import validate_record
+
+        class License(Interrogation):
+            license = Required()
+
+        class Wants(Probe):
+            memoize_next = False
+            def next(self):
+                if self._value == 'yes':
+                    return License('license')
+
+        cls = type('Nested', (Interrogation,), {'want': Wants(), 'after': Probe()})
+
+        result = validate_record(cls, {'want': 'yes', 'license': 'MIT'})
+        self.assertEqual(result.errors, {})
+        self.assertEqual(result.values, {'want': 'yes', 'license': 'MIT', 'after': ''})
+
+        self.assertEqual(validate_record(cls, {'want': 'yes'}).errors,
+                         {'license': 'license is required'})
+        self.assertEqual(validate_record(cls, {'want': 'no', 'license': 'MIT'}).errors,
+                         {'license': 'No such probe'})
+
+    def test_walk_errors(self):
+        """
+        Errors while stepping through the probes are reported for the record
+        they happen in, and the rest of the stream is still validated
+        """
+        from crushinator.framework.bulk import validate_records
+
+        class Picky(Probe):
+            def next(self):
+                if self._value == 'bad':
+                    raise ProbeValidationError('bad is not allowed')
+                if self._value == 'missing':
+                    return 'nowhere'
+                if self._value == 'again':
+                    return 'first'
+
+        cls = type('Walking', (Interrogation,), {'first': Probe(), 'picky': Picky()})
+
+        records = [{'picky': 'bad'}, {'picky': 'missing'}, {'picky': 'again'}, {'picky': 'ok'}]
+        results = list(validate_records(cls, enumerate(records, 1)))
+
+        self.assertEqual(results[0].errors, {'picky': 'bad is not allowed'})
+        self.assertEqual(results[1].errors.keys(), [None])
+        self.assertTrue('first -> picky -> first' in results[2].errors[None])
+        self.assertEqual(results[3].errors, {})
+
+    def test_lazy(self):
+        """
+        Records are only read a batch at a time
+        """
+        from crushinator.framework.bulk import validate_records
+
+        read = []
+        def records():
+            for i in range(1, 1000):
+                read.append(i)
+                yield i, {'author': 'author%s' % (i)}
+
+        results = validate_records(Answers, records(), batch_size=10)
+        results.next()
+
+        self.assertEqual(len(read), 10)
+
+    def test_processes(self):
+        """
+        A process pool gives the same results, in order
+        """
+        from crushinator.framework.bulk import validate_records
+
+        records = [(i, {'author': i % 3 and 'author%s' % (i) or ''}) for i in range(1, 50)]
+
+        expected = list(validate_records(Answers, records, batch_size=4))
+        actual = list(validate_records(Answers, records, batch_size=4, processes=2))
+
+        self.assertEqual(actual, expected)
@@ -0,0 +1,196 @@
+"""
+Tests for conditional files and directories
+"""
+
+import unittest
+
+class TestConditions(unittest.TestCase):
+    """
+    Conditions are checked against params before subtrees are walked
+    """
+    def _sourcefs(self):
+        from crushinator.framework.tests.helpers import RecordingFilesystem
+
+        sourcefs = RecordingFilesystem()
+        sourcefs.add_file('/skel/setup.py_tmpl', '$name')
+        sourcefs.add_file('/skel/docs+?with_docs+/index.rst_tmpl', '$name docs')
+        sourcefs.add_file('/skel/docs+?with_docs+/api/+name+.rst', 'api')
+        sourcefs.add_file('/skel/buildout.cfg+!no_buildout+', '[buildout]')
+        sourcefs.add_file('/skel/+?with_tests+/tests.py', 'tests')
+        sourcefs.scanned = []
+
+        return sourcefs
+
+    def _render(self, sourcefs, **params):
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        params['name'] = 'pkg'
+
+        destfs = MemoryFilesystem()
+        list(Skeleton(source='/skel', dest='/out', params=params,
+                      sourcefs=sourcefs, destfs=destfs))
+
+        return sorted(destfs._files)
+
+    def test_parse(self):
+        """
+        Markers are found, and evaluated
+        """
+        from crushinator.framework.conditions import PathConditions
+
+        conditions = PathConditions()
+
+        self.assertEqual(conditions.parse('docs+?with_docs+'), (('with_docs', False),))
+        self.assertEqual(conditions.parse('a+!b++?c+'), (('b', True), ('c', False)))
+        self.assertEqual(conditions.parse('+name+.py'), ())
+
+        self.assertTrue(conditions.included('a+!b++?c+', {'c': 1}))
+        self.assertFalse(conditions.included('a+!b++?c+', {'b': 1, 'c': 1}))
+        self.assertFalse(conditions.included('a+!b++?c+', {}))
+
+    def test_excluded(self):
+        """
+        Excluded subtrees are never walked
+        """
+        sourcefs = self._sourcefs()
+
+        self.assertEqual(self._render(sourcefs, no_buildout=True), ['/out/setup.py'])
+        self.assertEqual(sourcefs.scanned, ['/skel'])
+
+    def test_included(self):
+        """
+        Included subtrees are walked when they're reached, and the markers are
+        removed from the destination paths
+        """
+        sourcefs = self._sourcefs()
+
+        self.assertEqual(self._render(sourcefs, with_docs=True, with_tests=True), [
+            '/out/buildout.cfg',
+            '/out/docs/api/pkg.rst',
+            '/out/docs/index.rst',
+            '/out/setup.py',
+            '/out/tests.py',
+        ])
+
+    def test_shared_index(self):
+        """
+        Clones with different params share the index, but not the conditions
+        """
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        skeleton = Skeleton(source='/skel', dest='/out', params={'name': 'pkg', 'with_docs': True},
+                            sourcefs=self._sourcefs(), destfs=MemoryFilesystem())
+        list(skeleton)
+
+        destfs = MemoryFilesystem()
+        list(skeleton.clone(params={'name': 'pkg'}, destfs=destfs))
+
+        self.assertEqual(sorted(destfs._files), ['/out/buildout.cfg', '/out/setup.py'])
+
+class TestFanout(unittest.TestCase):
+    """
+    Directories generated once per item of a list param
+    """
+    def _sourcefs(self):
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        sourcefs = MemoryFilesystem()
+        sourcefs.add_file('/skel/+name+/__init__.py', '')
+        sourcefs.add_file('/skel/+name+/+*resources+/__init__.py_tmpl', '# $resources in $name')
+        sourcefs.add_file('/skel/+name+/+*resources+/views.py', 'static')
+        sourcefs.add_file('/skel/+name+/+*resources+/+*verbs+.txt_tmpl', '$verbs $resources')
+
+        return sourcefs
+
+    def _render(self, **kwargs):
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        from crushinator.framework.templatecache import TemplateCache
+
+        destfs = MemoryFilesystem()
+        cache = TemplateCache()
+
+        skeleton = Skeleton(source='/skel', dest='/out', sourcefs=self._sourcefs(), destfs=destfs,
+                            template_cache=cache,
+                            params={'name': 'api', 'resources': ['users', 'groups'], 'verbs': []},
+                            **kwargs)
+        list(skeleton)
+
+        return skeleton, destfs, cache
+
+    def test_fanout(self):
+        """
+        The subtree is generated once per item, reusing compiled templates
+        """
+        skeleton, destfs, cache = self._render()
+
+        self.assertEqual(sorted(destfs._files), [
+            '/out/api/__init__.py',
+            '/out/api/groups/__init__.py',
+            '/out/api/groups/views.py',
+            '/out/api/users/__init__.py',
+            '/out/api/users/views.py',
+        ])
+        self.assertEqual(destfs.read('/out/api/users/__init__.py'), '# users in api')
+        self.assertEqual(destfs.read('/out/api/groups/__init__.py'), '# groups in api')
+
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(skeleton.write_stats['written'], 5)
+
+    def test_parallel(self):
+        """
+        Items can be generated in parallel
+        """
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        destfs = MemoryFilesystem()
+        resources = ['r%s' % i for i in range(20)]
+
+        skeleton = Skeleton(source='/skel', dest='/out', sourcefs=self._sourcefs(), destfs=destfs,
+                            params={'name': 'api', 'resources': resources, 'verbs': ['get', 'put']},
+                            fanout_workers=4)
+        pairs = list(skeleton)
+
+        for resource in resources:
+            self.assertEqual(destfs.read('/out/api/%s/put.txt' % (resource)), 'put %s' % (resource))
+
+        self.assertEqual(skeleton.write_stats['written'], 1 + 20 * 4)
+        self.assertEqual(len(pairs), 2 + 20 * 5)
+
+    def test_resume(self):
+        """
+        Fan-outs that were finished are recorded in the journal, and skipped
+        when the run is resumed
+        """
+        from crushinator.framework.skeleton import Skeleton
+        import os, tempfile, shutil
+
+        tmp = tempfile.mkdtemp()
+        try:
+            sourcefs = self._sourcefs()
+            sourcefs.add_file('/skel/+name+/extras/+*extras+.txt_tmpl', '$extras $missing')
+
+            def skeleton(params):
+                params = dict(params, name='api', resources=['users', 'groups'], verbs=['get'],
+                              extras=['a', 'b'])
+                return Skeleton(source='/skel', dest=os.path.join(tmp, 'out'), sourcefs=sourcefs,
+                                journal=os.path.join(tmp, 'journal'), params=params,
+                                check_params=False)
+
+            # the resources fan-out comes first, and is finished
+            self.assertRaises(KeyError, list, skeleton({}))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'out', 'api', 'users', 'get.txt')))
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'out', 'api', 'extras', 'a.txt')))
+
+            resumed = skeleton({'missing': 'm'})
+            pairs = list(resumed.resume())
+
+            self.assertEqual(sorted(set(source for source, dest in pairs)),
+                             ['/skel/+name+/extras/+*extras+.txt_tmpl'])
+            self.assertEqual(resumed.write_stats['written'], 2)
+            self.assertEqual(open(os.path.join(tmp, 'out', 'api', 'extras', 'b.txt')).read(), 'b m')
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,175 @@
+"""
+Tests for template engines
+"""
+
+import unittest
+
+class TestCompiledEngine(unittest.TestCase):
+    """
+    The compiled engine behaves exactly like string.Template
+    """
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp)
+
+    def _outcome(self, func):
+        try:
+            return ('ok', func())
+        except (KeyError, ValueError), e:
+            return (e.__class__, str(e))
+
+    def test_semantics(self):
+        """
+        Same output, and the same errors, as string.Template.substitute()
+        """
+        from crushinator.framework.engine import CompiledEngine
+        from string import Template
+
+        engine = CompiledEngine(cache_dir=None)
+        params = {'foo': 'FOO', 'bar': 12, 'baz': None, 'u': u'\xe9'}
+
+        for text in ['', 'plain', '$foo', '${foo}bar', '$$foo $$$foo', 'x $bar $baz y',
+                     '$u and $foo', 'a\n$missing', '$foo\n  $ oops', '$missing then $ oops',
+                     '${foo', 'end $', '$$', "quote's \"$foo\" \\n"]:
+            expected = self._outcome(lambda: Template(text).substitute(params))
+            actual = self._outcome(lambda: engine.render(engine.compile(text), params))
+            self.assertEqual(actual, expected, text)
+
+        compiled = engine.compile('$foo $bar')
+        self.assertEqual(compiled.substitute(params, bar='kw'), 'FOO kw')
+        self.assertEqual(compiled.substitute(foo=1, bar=2), '1 2')
+
+    def test_disk_cache(self):
+        """
+        Compiled templates are reused by later engines
+        """
+        from crushinator.framework.engine import CompiledEngine
+        import os
+
+        engine = CompiledEngine(cache_dir=self.tmp)
+        engine.compile('hello $name')
+        engine.compile('hello $name')
+
+        self.assertEqual((engine.hits, engine.misses), (0, 1))
+        self.assertEqual(len(os.listdir(self.tmp)), 1)
+
+        engine = CompiledEngine(cache_dir=self.tmp)
+        self.assertEqual(engine.compile('hello $name').substitute(name='you'), 'hello you')
+        self.assertEqual((engine.hits, engine.misses), (1, 0))
+
+        # a corrupt cache file is ignored
+        for name in os.listdir(self.tmp):
+            open(os.path.join(self.tmp, name), 'wb').write('garbage')
+
+        engine = CompiledEngine(cache_dir=self.tmp)
+        self.assertEqual(engine.compile('hello $name').substitute(name='you'), 'hello you')
+        self.assertEqual((engine.hits, engine.misses), (0, 1))
+
+    def test_failed_save(self):
+        """
+        A compiled template that can't be saved leaves no temporary file
+        behind
+        """
+        from crushinator.framework.engine import CompiledEngine
+        import os
+
+        engine = CompiledEngine(cache_dir=self.tmp)
+
+        # the cache file's name is taken by a directory, so rename() fails
+        os.mkdir(os.path.join(self.tmp, engine._digest('hello $name')))
+        os.mkdir(os.path.join(self.tmp, engine._digest('hello $name'), 'occupied'))
+
+        self.assertEqual(engine.compile('hello $name').substitute(name='you'), 'hello you')
+        self.assertEqual(os.listdir(self.tmp), [engine._digest('hello $name')])
+
+    def test_skeleton(self):
+        """
+        A Skeleton renders the same with either engine
+        """
+        from crushinator.framework.engine import CompiledEngine
+        from crushinator.framework.skeleton import Skeleton
+        import os
+
+        source = os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates')
+        params = {'bar':'myname', 'foo':'dddd', 'baz':'1234'}
+
+        compiled = Skeleton(source=source, params=params, engine=CompiledEngine(cache_dir=self.tmp))
+        plain = Skeleton(source=source, params=params)
+
+        for entry in plain.get_index().templates:
+            self.assertEqual(compiled.render_template(entry.path), plain.render_template(entry.path))
+
+class TestSegmentEngine(unittest.TestCase):
+    """
+    Segment plans render exactly like string.Template
+    """
+    def _outcome(self, func):
+        try:
+            return ('ok', func())
+        except (KeyError, ValueError), e:
+            return (e.__class__, str(e))
+
+    def test_semantics(self):
+        """
+        Same output, and the same errors, as string.Template.substitute()
+        """
+        from crushinator.framework.engine import SegmentEngine
+        from string import Template
+
+        engine = SegmentEngine()
+        params = {'foo': 'FOO', 'bar': 12, 'baz': None, 'u': u'\xe9', 't': (1, 2)}
+
+        for text in ['', 'plain', '$foo', '${foo}bar', '$$foo $$$foo', 'x $bar $baz y',
+                     '$u and $foo', 'a\n$missing', '$foo\n  $ oops', '$missing then $ oops',
+                     '$ oops then $missing', '${foo', 'end $', '$$', '$t', '$foo$foo',
+                     u'unicode $foo']:
+            expected = self._outcome(lambda: Template(text).substitute(params))
+            actual = self._outcome(lambda: engine.render(engine.compile(text), params))
+            self.assertEqual(actual, expected, text)
+            self.assertEqual(type(actual[1]), type(expected[1]), text)
+
+        compiled = engine.compile('$foo $bar')
+        self.assertEqual(compiled.substitute(params, bar='kw'), 'FOO kw')
+        self.assertEqual(compiled.substitute(foo=1, bar=2), '1 2')
+        self.assertEqual(compiled.safe_substitute(foo=1), '1 $bar')
+        self.assertRaises(TypeError, compiled.substitute, params, params)
+
+    def test_template_class(self):
+        """
+        The delimiter and idpattern of template_class are used
+        """
+        from crushinator.framework.engine import SegmentEngine
+        from crushinator.framework.templatecache import template_identifiers
+        from string import Template
+
+        class PercentTemplate(Template):
+            delimiter = '%'
+
+        compiled = SegmentEngine(PercentTemplate).compile('%foo $bar %%')
+        self.assertEqual(compiled.substitute(foo=1), '1 $bar %')
+        self.assertEqual(template_identifiers(compiled), set(['foo']))
+
+    def test_default(self):
+        """
+        Skeletons render with segment plans by default, the same as with
+        string.Template
+        """
+        from crushinator.framework.engine import SegmentTemplate, StringTemplateEngine
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.templatecache import TemplateCache
+        import os
+
+        source = os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates')
+        params = {'bar':'myname', 'foo':'dddd', 'baz':'1234'}
+
+        segments = Skeleton(source=source, params=params, template_cache=TemplateCache())
+        plain = Skeleton(source=source, params=params, template_cache=TemplateCache(),
+                         engine=StringTemplateEngine())
+
+        for entry in plain.get_index().templates:
+            self.assertTrue(isinstance(segments.compile_template(entry.path), SegmentTemplate))
+            self.assertEqual(segments.render_template(entry.path), plain.render_template(entry.path))
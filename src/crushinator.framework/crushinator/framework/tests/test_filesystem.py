@@ -0,0 +1,108 @@
+"""
+Tests for Skeleton sources and destinations
+"""
+
+import unittest
+
+class TestMemoryFilesystem(unittest.TestCase):
+    """
+    Render Skeletons from and to memory
+    """
+    def _source(self):
+        import os
+        return os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates')
+
+    def _params(self):
+        return {'bar':'myname', 'foo':'dddd', 'baz':'1234'}
+
+    def test_memory_dest(self):
+        """
+        Rendering into memory gives the same output as rendering to disk, and
+        nothing is written until commit()
+        """
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        from crushinator.framework.util import listpaths
+        import os, tempfile, shutil
+
+        tmp = tempfile.mkdtemp()
+        try:
+            dest = os.path.join(tmp, 'project')
+            destfs = MemoryFilesystem()
+
+            list(Skeleton(source=self._source(), dest=dest, params=self._params(),
+                          destfs=destfs))
+
+            self.assertFalse(os.path.exists(dest))
+            self.assertTrue(destfs.isdir(os.path.join(dest, 'dddd', 'doc')))
+            self.assertTrue(destfs.read(os.path.join(dest, 'setup.py')).startswith('from someplace import dddd'))
+
+            destfs.commit()
+
+            expected = os.path.join(tmp, 'expected')
+            list(Skeleton(source=self._source(), dest=expected, params=self._params()))
+
+            relative = lambda root: sorted(os.path.relpath(p, root) for p in listpaths(root))
+            self.assertEqual(relative(dest), relative(expected))
+
+            for path in relative(expected):
+                if os.path.isfile(os.path.join(expected, path)):
+                    self.assertEqual(open(os.path.join(dest, path)).read(),
+                                     open(os.path.join(expected, path)).read())
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_memory_source(self):
+        """
+        A skeleton can be read from a MemoryFilesystem
+        """
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        sourcefs = MemoryFilesystem()
+        sourcefs.add_file('/skel/+foo+/README.txt_tmpl', 'Hello $bar')
+        sourcefs.add_file('/skel/+foo+/static.txt', 'Left $alone', 0o600)
+        sourcefs.makedirs('/skel/empty')
+
+        destfs = MemoryFilesystem()
+
+        skeleton = Skeleton(source='/skel', dest='/out', params=self._params(),
+                            sourcefs=sourcefs, destfs=destfs)
+        list(skeleton)
+
+        self.assertEqual(destfs.read('/out/dddd/README.txt'), 'Hello myname')
+        self.assertEqual(destfs.read('/out/dddd/static.txt'), 'Left $alone')
+        self.assertEqual(destfs.stat('/out/dddd/static.txt').st_mode & 0o777, 0o600)
+        self.assertTrue(destfs.isdir('/out/empty'))
+
+    def test_memory_source_changes(self):
+        """
+        Templates in a MemoryFilesystem are recompiled when they change
+        """
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        sourcefs = MemoryFilesystem()
+        sourcefs.add_file('/skel/a.txt_tmpl', 'one $bar')
+
+        skeleton = Skeleton(source='/skel', dest='/out', params=self._params(),
+                            sourcefs=sourcefs)
+
+        self.assertEqual(skeleton.render_template('/skel/a.txt_tmpl'), 'one myname')
+
+        sourcefs.add_file('/skel/a.txt_tmpl', 'two $bar, longer')
+        self.assertEqual(skeleton.render_template('/skel/a.txt_tmpl'), 'two myname, longer')
+
+    def test_missing_parent(self):
+        """
+        Like the local disk, files can't be written into missing directories
+        """
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        fs = MemoryFilesystem()
+
+        self.assertRaises(IOError, fs.open, '/nope/file.txt', 'wb')
+        self.assertRaises(OSError, fs.stat, '/nope')
+
+        fs.makedirs('/nope')
+        self.assertRaises(OSError, fs.makedirs, '/nope')
@@ -0,0 +1,133 @@
+"""
+Tests for interrogation flow graphs
+"""
+
+import unittest
+
+class TestFlowGraph(unittest.TestCase):
+    """
+    Compiling and stepping through an Interrogation's flow
+    """
+    def _class(self, **probes):
+        from crushinator.framework.interrogation import Interrogation
+
+        return type('flowing', (Interrogation,), probes)
+
+    def _branch(self, **targets):
+        """
+        A probe that goes to targets[value], or to the next probe.
+        """
+        from crushinator.framework.probe import Probe
+
+        class branch(Probe):
+            calls = []
+            def next(self):
+                self.calls.append(self._value)
+                return targets.get(self._value)
+
+        return branch
+
+    def test_memoized(self):
+        """
+        next() is only called once per value, across sessions
+        """
+        from crushinator.framework.probe import Probe
+
+        branch = self._branch(yes='c')
+        cls = self._class(a=branch(), b=Probe(), c=Probe())
+        flow = cls._definition.flow
+
+        for answer in ['no', 'yes', 'no', 'yes']:
+            names = []
+            for probe in cls('session'):
+                names.append(probe.name)
+                probe.value = answer
+            self.assertEqual(names, answer == 'yes' and ['a', 'c'] or ['a', 'b', 'c'])
+
+        # the initial value when compiling, then once per answer
+        self.assertEqual(sorted(branch.calls), ['', 'no', 'yes'])
+        self.assertTrue(flow.hits > 0)
+
+        branch.memoize_next = False
+        list(cls('session'))
+        self.assertEqual(len(branch.calls), 4)
+
+    def test_stop(self):
+        """
+        StopIteration from next() ends the Interrogation
+        """
+        from crushinator.framework.probe import Probe
+
+        class stopper(Probe):
+            def next(self):
+                raise StopIteration
+
+        cls = self._class(a=Probe(), b=stopper(), c=Probe())
+        self.assertEqual([p.name for p in cls('stopping')], ['a', 'b'])
+
+    def test_cycle(self):
+        """
+        Cycles are found when the graph is compiled, before any probe is asked
+        """
+        from crushinator.framework.probe import Probe
+        from crushinator.framework.exceptions import InterrogationCycleError
+
+        cls = self._class(a=Probe(), b=Probe(), c=self._branch(**{'': 'b'})())
+
+        try:
+            iter(cls('cycle')).next()
+        except InterrogationCycleError, e:
+            self.assertEqual(e.cycle, ['b', 'c', 'b'])
+        else:
+            self.fail('InterrogationCycleError not raised')
+
+    def test_missing_target(self):
+        """
+        Jumping to a probe that doesn't exist raises ProbeNotFound
+        """
+        from crushinator.framework.probe import Probe
+        from crushinator.framework.exceptions import ProbeNotFound
+
+        cls = self._class(a=self._branch(**{'': 'nowhere'})(), b=Probe())
+
+        self.assertRaises(ProbeNotFound, list, cls('missing'))
+
+    def test_invalid_initial_value(self):
+        """
+        A next() that rejects the initial value doesn't stop the first probe
+        from being asked
+        """
+        from crushinator.framework.probe import Probe
+        from crushinator.framework.exceptions import ProbeValidationError
+
+        class picky(Probe):
+            def next(self):
+                if not self._value:
+                    raise ProbeValidationError('%s is required' % (self.name))
+                return None
+
+        cls = self._class(a=picky(), b=Probe())
+        session = cls('picky')
+        walk = iter(session)
+
+        self.assertEqual(walk.next().name, 'a')
+        session.a.value = 'given'
+        self.assertEqual(walk.next().name, 'b')
+
+    def test_cycle_while_walking(self):
+        """
+        A value that leads back to a probe already asked raises
+        InterrogationCycleError instead of looping forever
+        """
+        from crushinator.framework.probe import Probe
+        from crushinator.framework.exceptions import InterrogationCycleError
+
+        cls = self._class(a=Probe(), b=self._branch(again='a')(), c=Probe())
+
+        try:
+            for probe in cls('again'):
+                probe.value = 'again'
+        except InterrogationCycleError, e:
+            self.assertEqual(e.cycle, ['a', 'b', 'a'])
+        else:
+            self.fail('InterrogationCycleError not raised')
@@ -0,0 +1,78 @@
+"""
+Tests for ignore rules
+"""
+
+import unittest
+
+class TestIgnoreRules(unittest.TestCase):
+    """
+    Pattern matching, and pruning the skeleton walk
+    """
+    def test_patterns(self):
+        """
+        gitignore-style matching
+        """
+        from crushinator.framework.ignore import IgnoreRules
+
+        rules = IgnoreRules([
+            '# a comment',
+            '',
+            '*.pyc',
+            'build/',
+            '/docs/_build',
+            'src/**/generated.py',
+            '*.log',
+            '!keep.log',
+        ])
+
+        self.assertEqual(len(rules), 6)
+
+        self.assertTrue(rules.match('foo.pyc'))
+        self.assertTrue(rules.match('a/b/foo.pyc'))
+        self.assertFalse(rules.match('foo.py'))
+
+        self.assertTrue(rules.match('build', True))
+        self.assertTrue(rules.match('a/build', True))
+        self.assertFalse(rules.match('build'))
+
+        self.assertTrue(rules.match('docs/_build', True))
+        self.assertFalse(rules.match('a/docs/_build', True))
+
+        self.assertTrue(rules.match('src/generated.py'))
+        self.assertTrue(rules.match('src/a/b/generated.py'))
+        self.assertFalse(rules.match('generated.py'))
+
+        self.assertTrue(rules.match('debug.log'))
+        self.assertFalse(rules.match('keep.log'))
+
+    def test_skeleton_prunes(self):
+        """
+        Ignored directories aren't walked, and the skeleton's ignore file is
+        read
+        """
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        from crushinator.framework.tests.helpers import RecordingFilesystem
+
+        sourcefs = RecordingFilesystem()
+        sourcefs.add_file('/skel/.crushignore', '# local rules\nlocal_only/\n*.bak\n')
+        sourcefs.add_file('/skel/setup.py_tmpl', '$foo')
+        sourcefs.add_file('/skel/setup.py_tmpl.swp', 'editor')
+        sourcefs.add_file('/skel/setup.py.bak', 'backup')
+        sourcefs.add_file('/skel/.git/objects/ab/cdef', 'blob')
+        sourcefs.add_file('/skel/local_only/notes.txt', 'notes')
+        sourcefs.add_file('/skel/+foo+/__init__.py', '')
+        sourcefs.add_file('/skel/+foo+/__init__.pyc', 'compiled')
+
+        destfs = MemoryFilesystem()
+        skeleton = Skeleton(source='/skel', dest='/out', params={'foo': 'pkg'},
+                            sourcefs=sourcefs, destfs=destfs)
+        list(skeleton)
+
+        self.assertEqual(sorted(destfs._files), ['/out/pkg/__init__.py', '/out/setup.py'])
+        self.assertEqual(sorted(sourcefs.scanned), ['/skel', '/skel/+foo+'])
+
+        # and with no rules at all, everything comes through
+        everything = Skeleton(source='/skel', dest='/out', params={'foo': 'pkg'},
+                              sourcefs=sourcefs, ignore=None, ignorefile=None)
+        self.assertEqual(len(everything.get_index()), 13)
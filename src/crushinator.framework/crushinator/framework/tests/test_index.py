@@ -0,0 +1,97 @@
+"""
+Tests for the SkeletonIndex
+"""
+
+import unittest
+
+class TestSkeletonIndex(unittest.TestCase):
+    """
+    Basic tests for the SkeletonIndex
+    """
+    def _source(self):
+        import os
+        return os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates')
+
+    def test_matches_listpaths(self):
+        """
+        The index contains the same paths, in the same order, as listpaths()
+        """
+        from crushinator.framework.index import SkeletonIndex
+        from crushinator.framework.util import listpaths
+
+        index = SkeletonIndex(self._source())
+
+        self.assertEqual([e.path for e in index], list(listpaths(self._source())))
+
+    def test_template_split(self):
+        """
+        Templates and static files are classified when the index is built
+        """
+        from crushinator.framework.index import SkeletonIndex
+
+        index = SkeletonIndex(self._source())
+
+        self.assertEqual(sorted(e.relpath for e in index.templates),
+            ['+foo+/README_+baz+.txt_tmpl', '+foo+/doc/README.rst_tmpl', 'setup.py_tmpl'])
+        self.assertEqual(sorted(e.relpath for e in index.static),
+            ['+foo+/+bar+.py', '+foo+/__init__.py'])
+
+    def test_entry_stat(self):
+        """
+        Entries carry their size and type
+        """
+        from crushinator.framework.index import SkeletonIndex
+        import os
+
+        index = SkeletonIndex(self._source())
+        path = os.path.join(self._source(), 'setup.py_tmpl')
+
+        self.assertEqual(index.get(path).size, os.path.getsize(path))
+        self.assertTrue(index.get(os.path.join(self._source(), '+foo+')).isdir)
+        self.assertTrue(index.get(os.path.join(self._source(), 'nope')) is None)
+
+    def test_subtree(self):
+        """
+        A subtree has the same entries, in the same order, as the whole index
+        """
+        from crushinator.framework.index import SkeletonIndex
+        import os
+
+        index = SkeletonIndex(self._source())
+
+        for path in [e.path for e in index]:
+            self.assertEqual([e.path for e in index.subtree(path)],
+                             [e.path for e in index if e.path == path or e.path.startswith(path + os.sep)])
+
+    def test_skeleton_no_restat(self):
+        """
+        Once the index is built, processing the skeleton doesn't stat the source
+        """
+        from crushinator.framework.skeleton import Skeleton
+        import os, tempfile, shutil
+
+        dest = tempfile.mkdtemp()
+
+        skeleton = Skeleton(
+            source=self._source(),
+            dest=dest,
+            params={'bar':'myname', 'foo':'dddd', 'baz':'1234'},
+        )
+        skeleton.get_index()
+
+        original = os.path.isdir
+        calls = []
+
+        def isdir(path):
+            calls.append(path)
+            return original(path)
+
+        os.path.isdir = isdir
+        try:
+            for pair in skeleton:
+                pass
+        finally:
+            os.path.isdir = original
+            shutil.rmtree(dest)
+
+        self.assertEqual([c for c in calls if c.startswith(self._source())], [])
@@ -62,7 +62,9 @@ class TestInterrogation(unittest.TestCase):
         Make sure that looping over the Interrogation produces the probes in the 
         right order
         """
+        intero = self._childclass('hello2')
         
+        self.assertEqual([p.name for p in intero], ['name', 'email', 'email2'])
         
     def test_probe_process(self):
         """
@@ -74,12 +76,49 @@ class TestInterrogation(unittest.TestCase):
         Test what happens when iterating through an Interrogation and a probe 
         returns a different probe.
         """
+        from crushinator.framework.interrogation import Interrogation
+        from crushinator.framework.probe import Probe
+        
+        class skipper(Probe):
+            def next(self):
+                if self.value == 'skip':
+                    return 'last'
+        
+        class jumping(Interrogation):
+            first = skipper()
+            middle = Probe()
+            last = Probe()
+        
+        intero = jumping('jumping')
+        self.assertEqual([p.name for p in intero], ['first', 'middle', 'last'])
+        
+        names = []
+        for probe in intero:
+            names.append(probe.name)
+            probe.value = 'skip'
+        self.assertEqual(names, ['first', 'last'])
         
     def test_interrogation_jump_interrogation_iter(self):
         """
         Test what happens when iterating through an Interrogation and a probe
         returns an interrogation
         """
+        from crushinator.framework.interrogation import Interrogation
+        from crushinator.framework.probe import Probe
+        
+        class inner(Interrogation):
+            one = Probe()
+            two = Probe()
+        
+        class nesting(Probe):
+            def next(self):
+                return inner('inner')
+        
+        class outer(Interrogation):
+            first = nesting()
+            last = Probe()
+        
+        self.assertEqual([p.name for p in outer('outer')], ['first', 'one', 'two', 'last'])
         
     def test_properties(self):
         """
@@ -130,3 +169,143 @@ class TestInterrogation(unittest.TestCase):
         self.assertEqual(interro.mixedin.name, 'mixedin')
            
         
+
+class TestSessions(unittest.TestCase):
+    """
+    Interrogation instances are independent sessions over one shared definition
+    """
+    @property
+    def _class(self):
+        from crushinator.framework.interrogation import Interrogation
+        from crushinator.framework.probe import Probe
+        
+        class upper(Probe):
+            def coerce(self):
+                return self._value.upper()
+        
+        class sessioned(Interrogation):
+            __properties__ = {'title': 'sessions'}
+            
+            author = Probe(label="Author", default='nobody')
+            email = upper()
+            
+        return sessioned
+    
+    def test_values(self):
+        """
+        Probe values are kept per session, and the class's probes aren't changed
+        """
+        cls = self._class
+        first, second = cls('first'), cls('second')
+        
+        first.author.value = '  me  '
+        first.email.value = 'me@example.com'
+        
+        self.assertEqual(first.author.value, 'me')
+        self.assertEqual(first.email.value, 'ME@EXAMPLE.COM')
+        self.assertEqual(second.author.value, 'nobody')
+        self.assertEqual(cls._probes['author']._value, 'nobody')
+        
+        self.assertEqual(first.author.label, 'Author')
+        self.assertTrue(first.author.interrogation is first)
+        
+        del first.author.value
+        self.assertEqual(first.author.value, '')
+        
+        first.reset()
+        self.assertEqual(first.author.value, 'nobody')
+        self.assertEqual([p.name for p in first.probes], ['author', 'email'])
+    
+    def test_properties(self):
+        """
+        Constructor arguments don't leak into the class or other sessions
+        """
+        cls = self._class
+        first = cls('first', extra=1)
+        second = cls('second')
+        
+        self.assertEqual(first.get('name'), 'first')
+        self.assertEqual(second.get('name'), 'second')
+        self.assertEqual(first.get('extra'), 1)
+        self.assertEqual(second.get('extra'), '')
+        self.assertEqual(second.get('title'), 'sessions')
+        self.assertEqual(second.get('defaults'), {})
+        self.assertEqual(cls.__properties__, {'title': 'sessions'})
+    
+    def test_compact(self):
+        """
+        Sessions of classes that declare empty __slots__ (all the way up to
+        Interrogation) have no instance dictionary; other classes can set 
+        attributes
+        """
+        from crushinator.framework.interrogation import Interrogation
+        from crushinator.framework.probe import Probe
+        
+        cls = self._class
+        
+        class compact(Interrogation):
+            __slots__ = ()
+            author = Probe()
+        
+        class attributes(cls):
+            def __init__(self, name, **kwargs):
+                cls.__init__(self, name, **kwargs)
+                self.started = True
+        
+        self.assertFalse(hasattr(compact('compact'), '__dict__'))
+        self.assertTrue(attributes('attributes').started)
+        self.assertTrue(cls('session')._definition is cls('other')._definition)
+    
+    def test_probe_state(self):
+        """
+        Each session keeps its bound probes, so state a probe keeps besides its
+        value lasts too
+        """
+        from crushinator.framework.probe import Probe
+        import copy
+        
+        class raw(Probe):
+            def save(self, value):
+                self.raw = value
+                Probe.save(self, value)
+        
+        cls = type('stateful', (self._class,), {'raw': raw()})
+        session = cls('state')
+        
+        self.assertTrue(session.raw is session.raw)
+        self.assertTrue(session.raw is session._definition.bind('raw', session))
+        
+        session.raw.value = ' typed '
+        self.assertEqual(session.raw.raw, ' typed ')
+        self.assertEqual(session.raw.value, 'typed')
+        self.assertFalse(hasattr(cls('other').raw, 'raw'))
+        
+        duplicate = copy.copy(session)
+        self.assertEqual(duplicate.raw.value, 'typed')
+        self.assertTrue(duplicate.raw.interrogation is duplicate)
+        
+        duplicate.reset()
+        self.assertEqual(session.raw.value, 'typed')
+    
+    def test_accessors(self):
+        """
+        Probes are descriptors: bound on sessions, as declared on the class,
+        and read-only
+        """
+        from crushinator.framework.interrogation import Interrogation
+        from crushinator.framework.probe import Probe
+        
+        cls = self._class
+        session = cls('accessors')
+        
+        self.assertTrue(cls.author is cls._probes['author'])
+        self.assertTrue(session.author._spec is cls.author)
+        self.assertTrue(isinstance(session.author, Probe))
+        self.assertRaises(AttributeError, setattr, session, 'author', Probe())
+        self.assertFalse('__getattribute__' in vars(Interrogation))
+        
+        class renamed(Interrogation):
+            license = Probe(name='crushinator.probes.license')
+        
+        self.assertEqual(getattr(renamed('renamed'), 'crushinator.probes.license').name,
+                         'crushinator.probes.license')
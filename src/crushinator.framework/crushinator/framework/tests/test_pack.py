@@ -0,0 +1,151 @@
+"""
+Tests for packed skeletons
+"""
+
+import unittest
+
+class TestPack(unittest.TestCase):
+    """
+    Pack the test skeleton, and process it from the pack
+    """
+    def _source(self):
+        import os
+        return os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates')
+
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp)
+
+    def test_roundtrip(self):
+        """
+        A packed skeleton renders exactly like the directory it was packed from
+        """
+        from crushinator.framework.pack import pack_skeleton, PackFilesystem
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        import os
+
+        params = {'bar':'myname', 'foo':'dddd', 'baz':'1234'}
+        packed = os.path.join(self.tmp, 'skeleton.crushpack')
+
+        count = pack_skeleton(self._source(), packed)
+
+        expected = MemoryFilesystem()
+        list(Skeleton(source=self._source(), dest='/out', params=params, destfs=expected))
+
+        with PackFilesystem(packed) as sourcefs:
+            self.assertEqual(count, len(Skeleton(source=sourcefs.root, sourcefs=sourcefs).get_index()))
+
+            actual = MemoryFilesystem()
+            list(Skeleton(source=sourcefs.root, sourcefs=sourcefs, dest='/out',
+                          params=params, destfs=actual))
+
+        self.assertEqual(sorted(actual._files), sorted(expected._files))
+        self.assertEqual(sorted(actual._dirs), sorted(expected._dirs))
+
+        for path in expected._files:
+            self.assertEqual(actual.read(path), expected.read(path))
+            self.assertEqual(actual.stat(path).st_mode, expected.stat(path).st_mode)
+
+    def test_no_source_access(self):
+        """
+        Processing a packed skeleton doesn't touch the source directory
+        """
+        from crushinator.framework.pack import pack_skeleton, PackFilesystem
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        import os, shutil
+
+        source = os.path.join(self.tmp, 'source')
+        shutil.copytree(self._source(), source)
+
+        packed = os.path.join(self.tmp, 'skeleton.crushpack')
+        pack_skeleton(source, packed)
+        shutil.rmtree(source)
+
+        with PackFilesystem(packed, root=source) as sourcefs:
+            destfs = MemoryFilesystem()
+            list(Skeleton(source=source, sourcefs=sourcefs, dest='/out',
+                          params={'bar':'myname', 'foo':'dddd', 'baz':'1234'},
+                          destfs=destfs))
+
+        self.assertTrue(destfs.read('/out/setup.py').startswith('from someplace import dddd'))
+
+    def test_open(self):
+        """
+        Files opened from a pack read only their own contents, a piece or a
+        line at a time
+        """
+        from crushinator.framework.pack import pack_skeleton, PackFilesystem
+        import os
+
+        source = os.path.join(self.tmp, 'source')
+        os.mkdir(source)
+        for name, contents in (('a.txt', 'one\ntwo\nthree'), ('b.txt', 'after\n')):
+            f = open(os.path.join(source, name), 'wb')
+            f.write(contents)
+            f.close()
+
+        packed = os.path.join(self.tmp, 'skeleton.crushpack')
+        pack_skeleton(source, packed)
+
+        with PackFilesystem(packed, root=source) as sourcefs:
+            path = os.path.join(source, 'a.txt')
+
+            # not copied out of the mapping whole
+            sourcefs.read = lambda path: self.fail('read() called')
+
+            f = sourcefs.open(path)
+            self.assertEqual(f.read(2), 'on')
+            self.assertEqual(f.readline(), 'e\n')
+            self.assertEqual(list(f), ['two\n', 'three'])
+            self.assertEqual(f.read(), '')
+
+            f.seek(0)
+            self.assertEqual(f.read(), 'one\ntwo\nthree')
+            f.close()
+            self.assertRaises(ValueError, f.read)
+
+            self.assertRaises(IOError, sourcefs.open, os.path.join(source, 'missing.txt'))
+
+    def test_changed_while_packing(self):
+        """
+        A file whose size no longer matches the index is an error, and no 
+        pack is left behind
+        """
+        from crushinator.framework import pack
+        from crushinator.framework.exceptions import SkeletonPackError
+        import os, shutil
+
+        source = os.path.join(self.tmp, 'source')
+        shutil.copytree(self._source(), source)
+        packed = os.path.join(self.tmp, 'skeleton.crushpack')
+
+        original = pack._copy_body
+        def _copy_body(entry, packfile):
+            open(entry.path, 'ab').write('more')
+            return original(entry, packfile, blocksize=4)
+        pack._copy_body = _copy_body
+        try:
+            self.assertRaises(SkeletonPackError, pack.pack_skeleton, source, packed)
+        finally:
+            pack._copy_body = original
+
+        self.assertEqual(os.listdir(self.tmp), ['source'])
+
+    def test_not_a_pack(self):
+        """
+        Other files are rejected
+        """
+        from crushinator.framework.pack import PackFilesystem
+        from crushinator.framework.exceptions import SkeletonPackError
+        import os
+
+        path = os.path.join(self.tmp, 'nope.crushpack')
+        open(path, 'wb').write('this is not a pack file')
+
+        self.assertRaises(SkeletonPackError, PackFilesystem, path)
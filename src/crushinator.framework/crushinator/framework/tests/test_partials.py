@@ -0,0 +1,88 @@
+"""
+Tests for template includes
+"""
+
+import unittest
+
+class TestPartials(unittest.TestCase):
+    """
+    Templates including partials from the skeleton's _partials directory
+    """
+    def _skeleton(self, sourcefs, **params):
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+        from crushinator.framework.templatecache import TemplateCache
+        from crushinator.framework.partials import PartialCache
+
+        return Skeleton(source='/skel', dest='/out', params=params,
+                        sourcefs=sourcefs, destfs=MemoryFilesystem(),
+                        template_cache=TemplateCache(), partial_cache=PartialCache())
+
+    def _sourcefs(self):
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        sourcefs = MemoryFilesystem()
+        sourcefs.add_file('/skel/_partials/header.txt', '# Copyright $author\n')
+        sourcefs.add_file('/skel/_partials/nested.txt', '${>header.txt}# $name\n')
+        sourcefs.add_file('/skel/a.py_tmpl', '${>header.txt}import $name\n')
+        sourcefs.add_file('/skel/b.py_tmpl', '${> nested.txt }$$100 $${>header.txt}\n')
+
+        return sourcefs
+
+    def test_include(self):
+        """
+        Partials are rendered in place, and aren't copied to the destination
+        """
+        skeleton = self._skeleton(self._sourcefs(), author='Me', name='pkg')
+        list(skeleton)
+
+        destfs = skeleton.destfs
+        self.assertEqual(sorted(destfs._files), ['/out/a.py', '/out/b.py'])
+        self.assertEqual(destfs.read('/out/a.py'), '# Copyright Me\nimport pkg\n')
+        self.assertEqual(destfs.read('/out/b.py'), '# Copyright Me\n# pkg\n$100 ${>header.txt}\n')
+
+    def test_memoized(self):
+        """
+        A partial is rendered once per set of values of the params it uses,
+        and again when it changes
+        """
+        import time
+
+        sourcefs = self._sourcefs()
+        skeleton = self._skeleton(sourcefs, author='Me', name='pkg')
+
+        for i in range(3):
+            skeleton.render_template('/skel/a.py_tmpl')
+            skeleton.render_template('/skel/b.py_tmpl')
+
+        self.assertEqual(skeleton.partial_cache.hits, 5)
+        self.assertEqual(skeleton.partial_cache.misses, 1)
+
+        # a param the partial doesn't use doesn't matter
+        skeleton.params = {'author': 'Me', 'name': 'other'}
+        skeleton.render_template('/skel/a.py_tmpl')
+        self.assertEqual(skeleton.partial_cache.misses, 1)
+
+        skeleton.params = {'author': 'You', 'name': 'other'}
+        self.assertEqual(skeleton.render_template('/skel/a.py_tmpl'), '# Copyright You\nimport other\n')
+        self.assertEqual(skeleton.partial_cache.misses, 2)
+
+        sourcefs.add_file('/skel/_partials/header.txt', '# (c) $author, changed\n')
+        sourcefs._files['/skel/_partials/header.txt'][2] = time.time() + 10
+        self.assertEqual(skeleton.render_template('/skel/a.py_tmpl'), '# (c) You, changed\nimport other\n')
+
+    def test_errors(self):
+        """
+        Missing partials and include loops are reported
+        """
+        from crushinator.framework.exceptions import SkeletonIncludeError
+
+        sourcefs = self._sourcefs()
+        sourcefs.add_file('/skel/_partials/loop.txt', 'again ${>loop.txt}')
+        sourcefs.add_file('/skel/missing.py_tmpl', '${>nope.txt}')
+        sourcefs.add_file('/skel/loop.py_tmpl', '${>loop.txt}')
+
+        skeleton = self._skeleton(sourcefs, author='Me', name='pkg')
+
+        self.assertRaises(SkeletonIncludeError, skeleton.render_template, '/skel/missing.py_tmpl')
+        self.assertRaises(SkeletonIncludeError, skeleton.render_template, '/skel/loop.py_tmpl')
@@ -0,0 +1,133 @@
+"""
+Tests for the queued destination filesystem
+"""
+
+import unittest
+
+class TestQueuedFilesystem(unittest.TestCase):
+    """
+    Render through a QueuedFilesystem
+    """
+    def _skeleton(self, dest, destfs=None):
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import local_filesystem
+        import os
+
+        return Skeleton(
+            source=os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates'),
+            dest=dest,
+            params={'bar':'myname', 'foo':'dddd', 'baz':'1234'},
+            destfs=destfs or local_filesystem,
+        )
+
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp)
+
+    def test_same_output(self):
+        """
+        The output is the same as writing directly
+        """
+        from crushinator.framework.queued import QueuedFilesystem
+        from crushinator.framework.util import listpaths
+        import os
+
+        dest = os.path.join(self.tmp, 'queued')
+        expected = os.path.join(self.tmp, 'expected')
+
+        with QueuedFilesystem(dest, workers=3, depth=2) as destfs:
+            list(self._skeleton(dest, destfs))
+
+        list(self._skeleton(expected))
+
+        relative = lambda root: sorted(os.path.relpath(p, root) for p in listpaths(root))
+        self.assertEqual(relative(dest), relative(expected))
+
+        for path in relative(expected):
+            if os.path.isfile(os.path.join(expected, path)):
+                self.assertEqual(open(os.path.join(dest, path)).read(),
+                                 open(os.path.join(expected, path)).read())
+
+    def test_snapshot(self):
+        """
+        Existing files are found in the snapshot, without asking the target
+        """
+        from crushinator.framework.queued import QueuedFilesystem
+        from crushinator.framework.exceptions import SkeletonFileExists
+        import os
+
+        dest = os.path.join(self.tmp, 'project')
+        list(self._skeleton(dest))
+
+        destfs = QueuedFilesystem(dest)
+        destfs._take_snapshot()
+
+        original = os.path.exists
+        calls = []
+
+        def exists(path):
+            calls.append(path)
+            return original(path)
+
+        os.path.exists = exists
+        try:
+            self.assertTrue(destfs.exists(os.path.join(dest, 'dddd', 'myname.py')))
+            self.assertFalse(destfs.exists(os.path.join(dest, 'nope')))
+            self.assertRaises(SkeletonFileExists, list, self._skeleton(dest, destfs))
+        finally:
+            os.path.exists = original
+            destfs.close()
+
+        self.assertEqual(calls, [])
+
+    def test_errors(self):
+        """
+        Errors from queued writes are raised when the filesystem is flushed
+        """
+        from crushinator.framework.queued import QueuedFilesystem
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        target = MemoryFilesystem()
+        destfs = QueuedFilesystem('/out', target=target)
+
+        destfs.makedirs('/out')
+        f = destfs.open('/out/file.txt', 'wb')
+        f.write('hello')
+        f.close()
+
+        destfs.flush()
+        self.assertEqual(target.read('/out/file.txt'), 'hello')
+
+        with destfs.open('/out/missing/file.txt', 'wb') as f:
+            f.write('nope')
+
+        self.assertRaises(IOError, destfs.close)
+
+    def test_incremental(self):
+        """
+        Incremental mode and the journal work through a queued local 
+        destination, but not a queued in-memory one
+        """
+        from crushinator.framework.queued import QueuedFilesystem
+        from crushinator.framework.filesystem import MemoryFilesystem
+        import os
+
+        dest = os.path.join(self.tmp, 'out')
+
+        for expected in ({'written': 5, 'unchanged': 0, 'skipped': 0},
+                         {'written': 0, 'unchanged': 0, 'skipped': 5}):
+            with QueuedFilesystem(dest) as destfs:
+                skeleton = self._skeleton(dest, destfs)
+                skeleton.incremental = True
+                skeleton.journal = os.path.join(self.tmp, 'journal')
+                list(skeleton)
+
+            self.assertEqual(skeleton.write_stats, expected)
+
+        skeleton = self._skeleton('/out', QueuedFilesystem('/out', target=MemoryFilesystem()))
+        skeleton.incremental = True
+        self.assertRaises(ValueError, list, skeleton)
@@ -424,3 +424,460 @@ class TestSkeleton(unittest.TestCase):
         self.assertEqual(len(processed), len([x for x in skeleton.list_templates()]))
         
         
+    def test_process_concurrent(self):
+        """
+        The concurrent process() method reports the same pairs as iterating,
+        in both executor modes.
+        """
+        import os
+        
+        for executor in ('thread', 'process'):
+            skeleton = self._skeleton(
+                params={'bar':'myname', 'foo':'dddd', 'baz':'1234'}, 
+                dest=os.path.join(self._dest, executor),
+            )
+            
+            result = [pair for pair in skeleton.process(executor=executor, workers=2)]
+            
+            skeleton.reset()
+            
+            self.assertEqual(sorted(result), sorted(skeleton.list_templates()))
+            
+            output = open(os.path.join(skeleton.dest, 'setup.py')).read()
+            self.assertTrue(output.startswith('from someplace import dddd'))
+        
+    def test_process_concurrent_retry(self):
+        """
+        A failed file in process() is raised after the rest of the files are
+        written, and can be retried.
+        """
+        import os
+        from crushinator.framework.exceptions import SkeletonFileExists
+        
+        skeleton = self._skeleton(
+            params={'bar':'myname', 'foo':'dddd', 'baz':'1234'}, 
+        )
+        
+        self._makedestfile('setup.py')
+        processed = []
+        
+        try:
+            for pair in skeleton.process(workers=2):
+                processed.append(pair)
+        except SkeletonFileExists:
+            processed.append(skeleton.retry(overwrite=True))
+        else:
+            self.fail("SkeletonFileExists not raised")
+        
+        skeleton.reset()
+        
+        self.assertEqual(sorted(processed), sorted(skeleton.list_templates()))
+        
+    def test_resume_journal(self):
+        """
+        An interrupted run can be resumed from its journal, without redoing
+        finished work.
+        """
+        import os
+        
+        journal = os.path.join(self._dest, 'journal')
+        dest = self._makedestdir('output')
+        params = {'bar':'myname', 'foo':'dddd', 'baz':'1234'}
+        
+        skeleton = self._skeleton(params=params, dest=dest, journal=journal)
+        
+        first = []
+        for pair in skeleton:
+            first.append(pair)
+            if len(first) == 3:
+                # simulate the process being killed
+                break
+        
+        resumed = self._skeleton(params=params, dest=dest, journal=journal)
+        
+        rendered = []
+        def render_template(path):
+            rendered.append(path)
+            return ''
+        resumed.render_template = render_template
+        
+        second = [pair for pair in resumed.resume()]
+        
+        self.assertEqual(set(first) & set(second), set())
+        self.assertEqual(sorted(first + second), sorted(self._skeleton(dest=dest).list_templates()))
+        self.assertEqual(set(rendered) & set(s for s, d in first), set())
+        
+        # the journal records the completed run
+        self.assertEqual(list(self._skeleton(params=params, dest=dest, journal=journal).resume()), [])
+        
+    def test_resume_no_journal(self):
+        """
+        Resuming without a journal raises SkeletonJournalError
+        """
+        import os
+        from crushinator.framework.exceptions import SkeletonJournalError
+        
+        skeleton = self._skeleton(journal=os.path.join(self._dest, 'missing'))
+        
+        self.assertRaises(SkeletonJournalError, skeleton.resume)
+        
+    def _makesource(self, files):
+        """
+        Create a skeleton source directory inside of self._dest, from a 
+        dictionary of relative path: contents. Returns the path.
+        """
+        import os
+        
+        source = self._makedestdir('source')
+        
+        for relpath, contents in files.items():
+            path = os.path.join(source, relpath)
+            
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            
+            f = open(path, 'w')
+            f.write(contents)
+            f.close()
+        
+        return source
+    
+    def test_incremental(self):
+        """
+        In incremental mode, only files whose inputs changed are written again
+        """
+        import os
+        
+        source = self._makesource({
+            'a.txt_tmpl': 'a is ${a}',
+            'b.txt_tmpl': 'b is ${b}',
+            'static.txt': 'static',
+        })
+        dest = self._makedestdir('output')
+        
+        def run(params):
+            skeleton = self._skeleton(source=source, dest=dest, params=params, incremental=True)
+            
+            written = []
+            original = skeleton._write_dest_file
+            def _write_dest_file(source, dest, content=None):
+                written.append(os.path.basename(dest))
+                original(source, dest, content)
+            skeleton._write_dest_file = _write_dest_file
+            
+            list(skeleton)
+            return sorted(written)
+        
+        self.assertEqual(run({'a':'1', 'b':'2'}), ['a.txt', 'b.txt', 'static.txt'])
+        self.assertEqual(run({'a':'1', 'b':'2'}), [])
+        self.assertEqual(run({'a':'1', 'b':'3'}), ['b.txt'])
+        self.assertEqual(open(os.path.join(dest, 'b.txt')).read(), 'b is 3')
+        
+        # deleted outputs are regenerated
+        os.remove(os.path.join(dest, 'a.txt'))
+        self.assertEqual(run({'a':'1', 'b':'3'}), ['a.txt'])
+        
+    def test_incremental_local_only(self):
+        """
+        Incremental mode and the journal are refused, before anything is 
+        written, for destinations that aren't the local disk
+        """
+        import os
+        from crushinator.framework.filesystem import MemoryFilesystem
+        
+        source = self._makesource({'a.txt_tmpl': 'a is ${a}'})
+        
+        for settings in ({'incremental': True}, 
+                         {'journal': os.path.join(self._dest, 'journal')}):
+            skeleton = self._skeleton(source=source, dest='/nonexistent-out', params={'a':'1'},
+                                      destfs=MemoryFilesystem(), **settings)
+            
+            self.assertRaises(ValueError, list, skeleton)
+            self.assertRaises(ValueError, list, skeleton.process(workers=1))
+            self.assertFalse(skeleton.destfs.exists('/nonexistent-out'))
+            self.assertFalse(os.path.exists(os.path.join(self._dest, 'journal')))
+        
+        self.assertRaises(ValueError, skeleton.resume)
+        
+    def test_incremental_failed_run(self):
+        """
+        The fingerprints of the files written before a run failed are saved,
+        so the next run treats them as generated
+        """
+        import os
+        
+        # sub/ comes after the files next to it
+        source = self._makesource({
+            'a.txt_tmpl': 'a is ${a}',
+            'sub/b.txt_tmpl': 'b is ${b}',
+        })
+        dest = self._makedestdir('output')
+        
+        for run in (iter, lambda skeleton: skeleton.process(workers=1)):
+            skeleton = self._skeleton(source=source, dest=dest, params={'a':'1'}, 
+                                      incremental=True, check_params=False)
+            self.assertRaises(KeyError, list, run(skeleton))
+            self.assertTrue(os.path.exists(os.path.join(dest, 'a.txt')))
+            
+            skeleton = self._skeleton(source=source, dest=dest, params={'a':'2', 'b':'1'},
+                                      incremental=True)
+            list(run(skeleton))
+            
+            self.assertEqual(open(os.path.join(dest, 'a.txt')).read(), 'a is 2')
+            self.assertEqual(open(os.path.join(dest, 'sub', 'b.txt')).read(), 'b is 1')
+            
+            os.remove(os.path.join(dest, 'a.txt'))
+            os.remove(os.path.join(dest, 'sub', 'b.txt'))
+        
+    def test_incremental_edited(self):
+        """
+        A generated file that was edited since isn't replaced when its inputs
+        change, unless overwrite is set
+        """
+        import os
+        from crushinator.framework.exceptions import SkeletonFileExists
+        
+        source = self._makesource({'a.txt_tmpl': 'a is ${a}'})
+        dest = self._makedestdir('output')
+        target = os.path.join(dest, 'a.txt')
+        
+        def skeleton(a):
+            return self._skeleton(source=source, dest=dest, params={'a':a}, incremental=True)
+        
+        list(skeleton('1'))
+        
+        f = open(target, 'w')
+        f.write('my own a')
+        f.close()
+        
+        self.assertRaises(SkeletonFileExists, list, skeleton('2'))
+        self.assertEqual(open(target).read(), 'my own a')
+        
+        list(skeleton('2').process(workers=1, overwrite=True))
+        self.assertEqual(open(target).read(), 'a is 2')
+        
+    def test_incremental_process_fingerprints_once(self):
+        """
+        process() fingerprints each file once
+        """
+        source = self._makesource({
+            'a.txt_tmpl': 'a is ${a}',
+            'static.txt': 'static',
+        })
+        dest = self._makedestdir('output')
+        
+        skeleton = self._skeleton(source=source, dest=dest, params={'a':'1'}, incremental=True)
+        
+        fingerprinted = []
+        original = skeleton.fingerprint
+        def fingerprint(source):
+            fingerprinted.append(source)
+            return original(source)
+        skeleton.fingerprint = fingerprint
+        
+        list(skeleton.process(workers=2))
+        
+        self.assertEqual(len(fingerprinted), 2)
+        self.assertEqual(len(set(fingerprinted)), 2)
+        
+    def test_copy_strategy(self):
+        """
+        Non-template files are put into place with the preferred strategy, and
+        the strategy used is reported.
+        """
+        import os
+        
+        source = self._makesource({'static.txt': 'static'})
+        
+        for strategy in ('hardlink', 'symlink', 'copy'):
+            dest = self._makedestdir(strategy)
+            skeleton = self._skeleton(source=source, dest=dest, params={},
+                                      copy_strategy=(strategy, 'copy'))
+            
+            list(skeleton)
+            
+            target = os.path.join(dest, 'static.txt')
+            
+            self.assertEqual(skeleton.copy_stats, {strategy: 1})
+            self.assertEqual(open(target).read(), 'static')
+            self.assertEqual(os.path.islink(target), strategy == 'symlink')
+    
+    def test_copy_strategy_fallback(self):
+        """
+        When a strategy isn't available, the next one is used
+        """
+        import os
+        from crushinator.framework import materialize
+        
+        source = self._makesource({'static.txt': 'static'})
+        dest = self._makedestdir('output')
+        
+        def unavailable(source, dest):
+            raise materialize.StrategyUnavailable('not here')
+        
+        original = materialize.strategies['reflink']
+        materialize.strategies['reflink'] = unavailable
+        try:
+            skeleton = self._skeleton(source=source, dest=dest, params={},
+                                      copy_strategy=('reflink', 'hardlink'))
+            list(skeleton)
+        finally:
+            materialize.strategies['reflink'] = original
+        
+        self.assertEqual(skeleton.copy_stats, {'hardlink': 1})
+    
+    def test_copy_strategy_rerun(self):
+        """
+        A file linked by an earlier run is replaced by a plain copy, without
+        writing into the source
+        """
+        import os
+        
+        source = self._makesource({'static.txt': 'static'})
+        
+        for strategy in ('hardlink', 'symlink'):
+            dest = self._makedestdir(strategy)
+            target = os.path.join(dest, 'static.txt')
+            
+            list(self._skeleton(source=source, dest=dest, params={}, copy_strategy=strategy))
+            self.assertTrue(os.path.samefile(target, os.path.join(source, 'static.txt')))
+            
+            skeleton = self._skeleton(source=source, dest=dest, params={})
+            list(skeleton.process(workers=1, overwrite=True))
+            
+            self.assertEqual(skeleton.copy_stats, {'copy': 1})
+            self.assertFalse(os.path.islink(target))
+            self.assertFalse(os.path.samefile(target, os.path.join(source, 'static.txt')))
+            self.assertEqual(open(target).read(), 'static')
+
+    def test_render_many(self):
+        """
+        Render one skeleton for several parameter sets, with per-set errors
+        collected instead of stopping the batch.
+        """
+        import os
+        from crushinator.framework.templatecache import TemplateCache
+        
+        cache = TemplateCache()
+        skeleton = self._skeleton(template_cache=cache)
+        
+        param_sets = [
+            {'bar':'one', 'foo':'pkg', 'baz':'1'},
+            {'bar':'two', 'foo':'pkg'},
+            {'bar':'three', 'foo':'pkg', 'baz':'3'},
+        ]
+        
+        for workers in (None, 2):
+            dest = os.path.join(self._dest, 'batch%s' % workers, '+bar+')
+            
+            results = list(skeleton.render_many(param_sets, dest, workers=workers))
+            
+            self.assertEqual([r.dest for r in results], 
+                [os.path.join(self._dest, 'batch%s' % workers, name) for name in ('one', 'two', 'three')])
+            
+            self.assertEqual(results[0].error, None)
+            self.assertTrue(isinstance(results[1].error, KeyError))
+            self.assertEqual(results[2].error, None)
+            
+            self.assertEqual(len(results[2].processed), len(skeleton.get_index()))
+            
+            output = open(os.path.join(results[2].dest, 'setup.py')).read()
+            self.assertTrue(output.endswith('reward for three'))
+        
+        # each template was only read and compiled once
+        self.assertEqual(cache.misses, len(skeleton.get_index().templates))
+        
+    def test_skip_unchanged(self):
+        """
+        With skip_unchanged, identical destination files are not rewritten
+        """
+        import os, time
+        
+        source = self._makesource({
+            'a.txt_tmpl': 'a is ${a}',
+            'big.txt_tmpl': 'big is ${a}',
+            'static.txt': 'static',
+        })
+        dest = self._makedestdir('output')
+        
+        def run(params):
+            skeleton = self._skeleton(source=source, dest=dest, params=params,
+                                      skip_unchanged=True, stream_threshold=10)
+            for source_path, dest_path in skeleton.list_templates():
+                skeleton.source_to_dest_path(source_path, dest_path, overwrite=True)
+            return skeleton.write_stats
+        
+        run({'a':'1'})
+        
+        past = int(time.time()) - 1000
+        for name in ('a.txt', 'big.txt', 'static.txt'):
+            os.utime(os.path.join(dest, name), (past, past))
+        
+        self.assertEqual(run({'a':'1'}), {'written': 0, 'unchanged': 3, 'skipped': 0})
+        self.assertEqual(os.path.getmtime(os.path.join(dest, 'a.txt')), past)
+        
+        self.assertEqual(run({'a':'2'}), {'written': 2, 'unchanged': 1, 'skipped': 0})
+        self.assertEqual(open(os.path.join(dest, 'big.txt')).read(), 'big is 2')
+        self.assertEqual(os.path.getmtime(os.path.join(dest, 'static.txt')), past)
+        
+    def test_skip_unchanged_no_overwrite(self):
+        """
+        With skip_unchanged, identical destination files aren't an error when
+        overwrite is off; changed ones still are
+        """
+        import os
+        from crushinator.framework.exceptions import SkeletonFileExists
+        
+        source = self._makesource({
+            'a.txt_tmpl': 'a is ${a}',
+            'big.txt_tmpl': 'big is ${a}',
+            'static.txt': 'static',
+        })
+        dest = self._makedestdir('output')
+        
+        def skeleton(params):
+            return self._skeleton(source=source, dest=dest, params=params,
+                                  skip_unchanged=True, stream_threshold=10)
+        
+        list(skeleton({'a':'1'}).process(workers=2))
+        
+        again = skeleton({'a':'1'})
+        self.assertEqual(len(list(again.process(workers=2))), 3)
+        self.assertEqual(again.write_stats, {'written': 0, 'unchanged': 3, 'skipped': 0})
+        
+        self.assertRaises(SkeletonFileExists, list, skeleton({'a':'2'}).process(workers=2))
+        self.assertEqual(open(os.path.join(dest, 'a.txt')).read(), 'a is 1')
+        
+    def test_render_path_single_pass(self):
+        """
+        Substituted values are not scanned for placeholders again, and a 
+        newly assigned params dictionary is picked up.
+        """
+        skeleton = self._skeleton(params={'name':'+foo+', 'foo':'bar'})
+        
+        self.assertEqual(skeleton.render_path('/my/+name+/+foo+.py'), '/my/+foo+/bar.py')
+        
+        skeleton.params = dict(skeleton.params, foo='baz')
+        
+        self.assertEqual(skeleton.render_path('/my/+name+/+foo+.py'), '/my/+foo+/baz.py')
+    
+    def test_render_path_params_changed(self):
+        """
+        Params changed in place between runs are used for paths as well as 
+        for contents
+        """
+        import os
+        
+        source = self._makesource({'+name+/x.txt_tmpl': 'hi ${name}'})
+        dest = self._makedestdir('output')
+        
+        skeleton = self._skeleton(source=source, dest=dest, params={'name':'one'})
+        list(skeleton)
+        
+        skeleton.params['name'] = 'two'
+        skeleton.reset()
+        list(skeleton)
+        
+        self.assertEqual(open(os.path.join(dest, 'two', 'x.txt')).read(), 'hi two')
+        self.assertEqual(open(os.path.join(dest, 'one', 'x.txt')).read(), 'hi one')
+
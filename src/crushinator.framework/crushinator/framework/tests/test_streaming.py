@@ -0,0 +1,84 @@
+"""
+Tests for streaming template rendering
+"""
+
+import unittest
+
+class TestStreaming(unittest.TestCase):
+    """
+    Streaming must give the same results as string.Template, wherever the
+    chunk boundaries happen to fall.
+    """
+    params = {'foo':'FOO', 'foobar':'FOOBAR', 'baz':'', 'x':'$x'}
+    
+    templates = [
+        'plain text, no placeholders',
+        '$foo $foobar ${foo}bar $$foo $$$foo',
+        'start $foo middle ${foobar} end $foobar',
+        '$$$$ $$ cost $$500 and $$${foo}',
+        '$foo$foobar$baz${x}$$',
+        'trailing $foobar',
+    ]
+    
+    def _stream(self, text, chunk_size):
+        from crushinator.framework.streaming import stream_substitute
+        from StringIO import StringIO
+        
+        output = StringIO()
+        stream_substitute(StringIO(text), output, self.params, chunk_size=chunk_size)
+        
+        return output.getvalue()
+    
+    def test_same_as_substitute(self):
+        """
+        Every chunk size gives the same output as Template.substitute()
+        """
+        from string import Template
+        
+        for text in self.templates:
+            expected = Template(text).substitute(self.params)
+            
+            for chunk_size in range(1, len(text) + 2):
+                self.assertEqual(self._stream(text, chunk_size), expected,
+                                 "%r with chunk size %s" % (text, chunk_size))
+    
+    def test_errors(self):
+        """
+        Missing params and malformed placeholders raise the same errors
+        """
+        for chunk_size in (1, 3, 1024):
+            self.assertRaises(KeyError, self._stream, 'a ${unknown} b', chunk_size)
+            self.assertRaises(ValueError, self._stream, 'a ${foo b', chunk_size)
+            self.assertRaises(ValueError, self._stream, 'trailing $', chunk_size)
+    
+    def test_skeleton_stream(self):
+        """
+        A Skeleton streams templates over its stream_threshold
+        """
+        from crushinator.framework.skeleton import Skeleton
+        import os, tempfile, shutil
+        
+        source = os.path.join(os.path.dirname(__file__), 'data', 'skeleton_templates')
+        dest = tempfile.mkdtemp()
+        
+        try:
+            skeleton = Skeleton(
+                source=source, 
+                dest=dest, 
+                params={'bar':'myname', 'foo':'dddd', 'baz':'1234'},
+                stream_threshold=0,
+            )
+            
+            # (empty templates aren't over the threshold)
+            calls = []
+            skeleton.render_template = lambda path: calls.append(path) or ''
+            
+            list(skeleton)
+            
+            output = open(os.path.join(dest, 'setup.py')).read()
+        finally:
+            shutil.rmtree(dest)
+        
+        self.assertFalse(os.path.join(source, 'setup.py_tmpl') in calls)
+        self.assertEqual(output, "from someplace import dddd\n\n"
+                                 "Some text here, 1234 and some more. $500.00 reward for myname")
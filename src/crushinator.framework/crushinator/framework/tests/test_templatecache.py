@@ -0,0 +1,215 @@
+"""
+Tests for the compiled template cache.
+"""
+
+import unittest
+
+class TestTemplateCache(unittest.TestCase):
+    """
+    Basic tests for the TemplateCache
+    """
+    def setUp(self):
+        import tempfile
+        self._working = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self._working)
+
+    def _maketemplate(self, name, contents):
+        """
+        Write a template file into the working directory, return its path
+        """
+        import os
+
+        path = os.path.join(self._working, name)
+
+        f = open(path, 'w')
+        f.write(contents)
+        f.close()
+
+        return path
+
+    def test_hit_miss(self):
+        """
+        The second lookup for the same file comes from the cache
+        """
+        from crushinator.framework.templatecache import TemplateCache
+
+        cache = TemplateCache()
+        path = self._maketemplate('a_tmpl', 'hello ${name}')
+
+        first = cache.get(path)
+        second = cache.get(path)
+
+        self.assertTrue(first is second)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(second.substitute({'name':'world'}), 'hello world')
+
+    def test_changed_file(self):
+        """
+        A template that changes size on disk is recompiled
+        """
+        from crushinator.framework.templatecache import TemplateCache
+
+        cache = TemplateCache()
+        path = self._maketemplate('a_tmpl', 'hello ${name}')
+
+        cache.get(path)
+
+        self._maketemplate('a_tmpl', 'goodbye ${name}')
+
+        template = cache.get(path)
+
+        self.assertEqual(template.substitute({'name':'world'}), 'goodbye world')
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_lru_eviction(self):
+        """
+        The least recently used entry is dropped when the cache is full
+        """
+        from crushinator.framework.templatecache import TemplateCache
+
+        cache = TemplateCache(maxsize=2)
+        a = self._maketemplate('a_tmpl', 'a')
+        b = self._maketemplate('b_tmpl', 'b')
+        c = self._maketemplate('c_tmpl', 'c')
+
+        cache.get(a)
+        cache.get(b)
+        # a is now the most recently used
+        cache.get(a)
+        cache.get(c)
+
+        self.assertEqual(cache.evictions, 1)
+
+        cache.get(a)
+        self.assertEqual(cache.info()['hits'], 2)
+
+        cache.get(b)
+        self.assertEqual(cache.info()['misses'], 4)
+
+    def test_not_found(self):
+        """
+        A missing template raises IOError, like open() would
+        """
+        from crushinator.framework.templatecache import TemplateCache
+        import os
+
+        cache = TemplateCache()
+
+        self.assertRaises(IOError, cache.get, os.path.join(self._working, 'nope'))
+
+    def test_skeleton_uses_cache(self):
+        """
+        Rendering the same template twice only compiles it once
+        """
+        from crushinator.framework.templatecache import TemplateCache
+        from crushinator.framework.skeleton import Skeleton
+
+        cache = TemplateCache()
+        path = self._maketemplate('a_tmpl', 'hello ${name}')
+
+        skeleton = Skeleton(template_cache=cache, params={'name':'world'})
+        self.assertEqual(skeleton.render_template(path), 'hello world')
+
+        skeleton.params = {'name':'there'}
+        self.assertEqual(skeleton.render_template(path), 'hello there')
+
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_skeleton_changed_file(self):
+        """
+        A Skeleton that is reused after one of its templates changes renders
+        (and analyzes) the new template, even though the index was built
+        before the change
+        """
+        from crushinator.framework.templatecache import TemplateCache
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        path = self._maketemplate('a_tmpl', 'hello ${name}')
+
+        skeleton = Skeleton(source=self._working, template_cache=TemplateCache(),
+                            params={'name':'world', 'other':'you'}, 
+                            dest='/out', destfs=MemoryFilesystem())
+        skeleton.get_index()
+
+        self.assertEqual(skeleton.render_template(path), 'hello world')
+        self.assertEqual(skeleton.get_analysis().required(path), set(['name']))
+
+        self._maketemplate('a_tmpl', 'goodbye ${other}')
+        
+        # checked again on the next run
+        self.assertEqual(skeleton.render_template(path), 'hello world')
+        list(skeleton)
+        self.assertEqual(skeleton.destfs.read('/out/a'), 'goodbye you')
+
+        self.assertEqual(skeleton.render_template(path), 'goodbye you')
+        self.assertEqual(skeleton.missing_params(), {})
+        self.assertEqual(skeleton.get_analysis().required(path), set(['other']))
+        self.assertEqual(skeleton.get_index().get(path).size, len('goodbye ${other}'))
+
+    def test_skeleton_stat_once_per_run(self):
+        """
+        A Skeleton stats each template once per run, however many times it's 
+        rendered
+        """
+        from crushinator.framework.templatecache import TemplateCache
+        from crushinator.framework.skeleton import Skeleton
+        from crushinator.framework.filesystem import MemoryFilesystem
+
+        stats = []
+
+        class CountingFilesystem(MemoryFilesystem):
+            def stat(self, path):
+                stats.append(path)
+                return MemoryFilesystem.stat(self, path)
+
+        sourcefs = CountingFilesystem()
+        sourcefs.add_file('/skel/+*item+/a.txt_tmpl', 'item ${item}')
+        path = '/skel/+*item+/a.txt_tmpl'
+
+        skeleton = Skeleton(source='/skel', sourcefs=sourcefs, template_cache=TemplateCache(),
+                            params={'item': ['x', 'y', 'z']}, 
+                            dest='/out', destfs=MemoryFilesystem())
+
+        list(skeleton)
+        self.assertEqual(skeleton.destfs.read('/out/z/a.txt'), 'item z')
+        self.assertEqual(stats.count(path), 1)
+
+        skeleton.reset()
+        skeleton.dest = '/again'
+        list(skeleton)
+        self.assertEqual(stats.count(path), 2)
+
+    def test_collected_filesystem(self):
+        """
+        A filesystem created after another one was garbage collected (which
+        may well be given the same id()) doesn't get its templates
+        """
+        from crushinator.framework.templatecache import TemplateCache
+        from crushinator.framework.filesystem import Filesystem
+        from crushinator.framework.engine import SegmentEngine
+        from StringIO import StringIO
+
+        class TextFilesystem(Filesystem):
+            def __init__(self, text):
+                self.text = text
+
+            def open(self, path, mode='rb', perms=None):
+                return StringIO(self.text)
+
+        cache = TemplateCache(validate=False)
+        engine = SegmentEngine()
+
+        fs = TextFilesystem('first')
+        self.assertEqual(engine.render(cache.get('/a_tmpl', fs=fs, engine=engine), {}), 'first')
+
+        del fs
+        fs = TextFilesystem('second')
+        self.assertEqual(engine.render(cache.get('/a_tmpl', fs=fs, engine=engine), {}), 'second')
+        self.assertEqual(cache.hits, 0)
@@ -1,9 +1,19 @@
 """
 crushinator.framework.util - common utility functions
 """
-import os
+import os, stat, hashlib
 
-def listpaths(start):
+# python pre-3.5 compatibility - use the scandir backport if it's installed,
+# otherwise fall back to listdir() and stat()
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+def listpaths(start, ignore=None):
     """
     Starting at a root directory, return a list of absolute paths for 
     all files in that directory and all of its subdirectories.
@@ -13,10 +23,114 @@ def listpaths(start):
     @param start: string, path to starting directory (assumed to be 
                   absolute... paths to be returned will also be relative if
                   a relative path is provided)
+    @param ignore: crushinator.framework.ignore.IgnoreRules, paths to leave 
+                   out. Ignored directories are not walked.
     """
     templates = os.walk(start)
 
     for dirpath, dirnames, filenames in templates:
+        if ignore is not None:
+            relative = lambda name: os.path.relpath(os.path.join(dirpath, name), start)
+            # pruning dirnames in place stops os.walk() from descending
+            dirnames[:] = [d for d in dirnames if not ignore.match(relative(d), True)]
+            filenames = [f for f in filenames if not ignore.match(relative(f))]
+        
         for name in dirnames+filenames:
             yield os.path.join(dirpath, name)
             
+
+class _DirEntry(object):
+    """
+    Minimal stand-in for os.DirEntry, used when scandir() isn't available.
+    
+    The stat() result is fetched once and cached.
+    """
+    def __init__(self, dirpath, name):
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+        self._stat = None
+        self._lstat = None
+    
+    def stat(self, follow_symlinks=True):
+        if not follow_symlinks:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+        
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+    
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+    
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+    
+    def is_symlink(self):
+        try:
+            return stat.S_ISLNK(self.stat(False).st_mode)
+        except OSError:
+            return False
+
+def iterdir(path):
+    """
+    Return an iterator of os.DirEntry-like objects for the contents of path,
+    in the same order as os.listdir().
+    
+    @param path: string, path to a directory
+    """
+    if scandir is not None:
+        return scandir(path)
+    
+    return (_DirEntry(path, name) for name in os.listdir(path))
+
+def fileobj_digest(f, blocksize=64 * 1024):
+    """
+    Return the SHA-1 hex digest of the rest of an open file, read a block at
+    a time.
+    
+    @param f: file-like object, opened for reading
+    """
+    digest = hashlib.sha1()
+    
+    block = f.read(blocksize)
+    while block:
+        digest.update(block)
+        block = f.read(blocksize)
+    
+    return digest.hexdigest()
+
+def file_digest(path, blocksize=64 * 1024):
+    """
+    Return the SHA-1 hex digest of a file's contents, read a block at a time.
+    
+    @param path: string, path to a file
+    """
+    f = open(path, 'rb')
+    try:
+        return fileobj_digest(f, blocksize)
+    finally:
+        f.close()
+
+class DigestWriter(object):
+    """
+    A write-only file-like object that discards what is written to it,
+    keeping only its length and SHA-1 digest.
+    """
+    def __init__(self):
+        self.size = 0
+        self._digest = hashlib.sha1()
+    
+    def write(self, data):
+        self.size += len(data)
+        self._digest.update(data)
+    
+    def hexdigest(self):
+        return self._digest.hexdigest()